@@ -1,6 +1,8 @@
+from .content_types import *
 from .exceptions import *
 from .meta import *
 from .model import *
+from .patch import *
 from .service import *
 from .service_models import *
 from .validation import *
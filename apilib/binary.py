@@ -0,0 +1,542 @@
+# A compact, schema-driven binary encoding for models, for service-to-service
+# calls where both sides share the model definitions.
+#
+# A model is encoded as a sequence of fields, each prefixed by a varint key
+# of (field number << 3 | wire type). Field numbers are given by
+# Model.get_numbered_fields(): explicit Field tags, or else declaration order.
+# Fields with a None value are omitted. The wire type allows a decoder to skip
+# fields it doesn't know about:
+#
+#   VARINT            integers (zigzag encoded), booleans, dates, encrypted ids, enums
+#                     (by their codes, see model.Enum)
+#   FIXED64           floats, as little-endian IEEE 754 doubles
+#   LENGTH_DELIMITED  a varint byte length followed by the payload. Used for strings,
+#                     bytes, decimals, datetimes, nested models, lists and dicts.
+#
+# Lists are encoded as a varint count followed by the items, dicts as a varint count
+# followed by key/value pairs with string keys. Since items may be None, each item
+# is preceded by a presence byte.
+
+from __future__ import absolute_import
+
+import datetime
+import decimal
+import struct
+import threading
+
+from dateutil import tz
+import six
+
+from . import model
+from .validation import ErrorContext
+
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+
+_DOUBLE = struct.Struct('<d')
+_EPOCH = datetime.datetime(1970, 1, 1)
+_UTC = tz.tzutc()
+
+def encode_model(model_obj):
+    out = bytearray()
+    get_model_codec(type(model_obj)).write_fields(out, model_obj)
+    return bytes(out)
+
+def decode_model(model_class, data):
+    buf = data if isinstance(data, bytearray) else bytearray(data)
+    try:
+        model_obj, pos = get_model_codec(model_class).read_fields(buf, 0, len(buf))
+    except (IndexError, KeyError, OverflowError, UnicodeDecodeError, struct.error) as e:
+        raise ValueError('Malformed binary data: %s' % e)
+    return model_obj
+
+# Varints
+
+def _write_varint(out, n):
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _read_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+
+def _zigzag(n):
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+def _unzigzag(n):
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+def _write_signed(out, n):
+    _write_varint(out, _zigzag(n))
+
+def _read_signed(buf, pos):
+    n, pos = _read_varint(buf, pos)
+    return _unzigzag(n), pos
+
+def _write_bytes(out, value):
+    _write_varint(out, len(value))
+    out += value
+
+def _read_bytes(buf, pos):
+    length, pos = _read_varint(buf, pos)
+    end = pos + length
+    if end > len(buf):
+        raise ValueError('Malformed binary data: length %d at position %d exceeds the data' % (length, pos))
+    return buf[pos:end], end
+
+def _skip(buf, pos, wire_type):
+    if wire_type == VARINT:
+        return _read_varint(buf, pos)[1]
+    elif wire_type == FIXED64:
+        return pos + 8
+    elif wire_type == LENGTH_DELIMITED:
+        return _read_bytes(buf, pos)[1]
+    raise ValueError('Malformed binary data: unknown wire type %d' % wire_type)
+
+# Field type codecs. Each codec writes and reads a single non-None value.
+
+class Codec(object):
+    wire_type = LENGTH_DELIMITED
+
+    def write(self, out, value):
+        raise NotImplementedError()
+
+    def read(self, buf, pos):
+        raise NotImplementedError()
+
+class IntegerCodec(Codec):
+    wire_type = VARINT
+
+    def write(self, out, value):
+        _write_varint(out, _zigzag(int(value)))
+
+    def read(self, buf, pos):
+        return _read_signed(buf, pos)
+
+class BooleanCodec(Codec):
+    wire_type = VARINT
+
+    def write(self, out, value):
+        out.append(1 if value else 0)
+
+    def read(self, buf, pos):
+        n, pos = _read_varint(buf, pos)
+        return bool(n), pos
+
+class FloatCodec(Codec):
+    wire_type = FIXED64
+
+    def write(self, out, value):
+        out += _DOUBLE.pack(value)
+
+    def read(self, buf, pos):
+        return _DOUBLE.unpack_from(buf, pos)[0], pos + 8
+
+class StringCodec(Codec):
+    def write(self, out, value):
+        _write_bytes(out, value.encode('utf-8'))
+
+    def read(self, buf, pos):
+        value, pos = _read_bytes(buf, pos)
+        return value.decode('utf-8'), pos
+
+class InterningStringCodec(StringCodec):
+    '''Strings of String(intern=True) field types, shared by way of the field type.'''
+
+    def __init__(self, field_type):
+        self.field_type = field_type
+
+    def read(self, buf, pos):
+        value, pos = _read_bytes(buf, pos)
+        return self.field_type.normalize(value.decode('utf-8')), pos
+
+class EnumCodec(Codec):
+    wire_type = VARINT
+
+    def __init__(self, field_type):
+        self.codes = field_type.codes
+        self.values_by_code = field_type.values_by_code
+
+    def write(self, out, value):
+        code = self.codes.get(value)
+        if code is None:
+            raise ValueError('"%s" is not a valid enum value' % value)
+        _write_varint(out, code)
+
+    def read(self, buf, pos):
+        code, pos = _read_varint(buf, pos)
+        return self.values_by_code[code], pos
+
+class BytesCodec(Codec):
+    def write(self, out, value):
+        _write_bytes(out, value)
+
+    def read(self, buf, pos):
+        value, pos = _read_bytes(buf, pos)
+        return bytes(value), pos
+
+class DateCodec(Codec):
+    wire_type = VARINT
+
+    def write(self, out, value):
+        _write_signed(out, value.toordinal())
+
+    def read(self, buf, pos):
+        ordinal, pos = _read_signed(buf, pos)
+        return datetime.date.fromordinal(ordinal), pos
+
+class DateTimeCodec(Codec):
+    '''Microseconds since the epoch, followed by the UTC offset in seconds for aware datetimes.'''
+
+    def write(self, out, value):
+        offset = value.utcoffset()
+        payload = bytearray()
+        if offset is None:
+            payload.append(0)
+            _write_signed(payload, _timedelta_to_micros(value - _EPOCH))
+        else:
+            payload.append(1)
+            _write_signed(payload, _timedelta_to_micros(value.replace(tzinfo=None) - offset - _EPOCH))
+            _write_signed(payload, offset.days * 86400 + offset.seconds)
+        _write_bytes(out, payload)
+
+    def read(self, buf, pos):
+        length, pos = _read_varint(buf, pos)
+        end = pos + length
+        is_aware = buf[pos]
+        micros, pos = _read_signed(buf, pos + 1)
+        value = _EPOCH + datetime.timedelta(microseconds=micros)
+        if is_aware:
+            offset, pos = _read_signed(buf, pos)
+            tzinfo = _UTC if offset == 0 else tz.tzoffset(None, offset)
+            value = (value + datetime.timedelta(seconds=offset)).replace(tzinfo=tzinfo)
+        return value, end
+
+def _timedelta_to_micros(delta):
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+class DecimalCodec(Codec):
+    '''A flags varint (bit 0 is the sign, the rest the kind of number), then for finite
+    numbers the exponent and the coefficient.'''
+
+    _FINITE = 0
+    _SPECIAL_KINDS = {'F': 1, 'n': 2, 'N': 3}
+    _SPECIAL_EXPONENTS = {v: k for k, v in six.iteritems(_SPECIAL_KINDS)}
+
+    def write(self, out, value):
+        sign, digits, exponent = value.as_tuple()
+        payload = bytearray()
+        if exponent in self._SPECIAL_KINDS:
+            _write_varint(payload, self._SPECIAL_KINDS[exponent] << 1 | sign)
+        else:
+            _write_varint(payload, self._FINITE << 1 | sign)
+            _write_signed(payload, exponent)
+            coefficient = 0
+            for digit in digits:
+                coefficient = coefficient * 10 + digit
+            _write_varint(payload, coefficient)
+        _write_bytes(out, payload)
+
+    def read(self, buf, pos):
+        length, pos = _read_varint(buf, pos)
+        end = pos + length
+        flags, pos = _read_varint(buf, pos)
+        sign, kind = flags & 1, flags >> 1
+        if kind == self._FINITE:
+            exponent, pos = _read_signed(buf, pos)
+            coefficient, pos = _read_varint(buf, pos)
+            digits = tuple(int(c) for c in str(coefficient))
+        else:
+            exponent = self._SPECIAL_EXPONENTS[kind]
+            digits = ()
+        return decimal.Decimal((sign, digits, exponent)), end
+
+class EncryptedIdCodec(Codec):
+    '''Ids are encoded as plain integers, there is no need to obfuscate them between services.'''
+    wire_type = VARINT
+
+    def write(self, out, value):
+        _write_varint(out, _zigzag(value))
+
+    def read(self, buf, pos):
+        return _read_signed(buf, pos)
+
+class RawJsonCodec(Codec):
+    def write(self, out, value):
+        _write_bytes(out, value.text.encode('utf-8'))
+
+    def read(self, buf, pos):
+        value, pos = _read_bytes(buf, pos)
+        return model.RawJsonValue(value.decode('utf-8')), pos
+
+class AnyPrimitiveCodec(Codec):
+    '''Self-describing values: a type byte followed by the value.'''
+
+    _NONE, _FALSE, _TRUE, _INT, _FLOAT, _STRING, _LIST, _DICT = range(8)
+
+    def write(self, out, value):
+        payload = bytearray()
+        self._write_value(payload, value)
+        _write_bytes(out, payload)
+
+    def read(self, buf, pos):
+        length, pos = _read_varint(buf, pos)
+        value, _ = self._read_value(buf, pos)
+        return value, pos + length
+
+    def _write_value(self, out, value):
+        if value is None:
+            out.append(self._NONE)
+        elif value is True:
+            out.append(self._TRUE)
+        elif value is False:
+            out.append(self._FALSE)
+        elif isinstance(value, six.integer_types):
+            out.append(self._INT)
+            _write_signed(out, value)
+        elif isinstance(value, float):
+            out.append(self._FLOAT)
+            out += _DOUBLE.pack(value)
+        elif isinstance(value, six.string_types):
+            out.append(self._STRING)
+            _write_bytes(out, six.text_type(value).encode('utf-8'))
+        elif isinstance(value, (list, tuple)):
+            out.append(self._LIST)
+            _write_varint(out, len(value))
+            for item in value:
+                self._write_value(out, item)
+        elif isinstance(value, dict):
+            out.append(self._DICT)
+            _write_varint(out, len(value))
+            for k, v in six.iteritems(value):
+                _write_bytes(out, six.text_type(k).encode('utf-8'))
+                self._write_value(out, v)
+        else:
+            raise TypeError('%r is not a primitive value' % value)
+
+    def _read_value(self, buf, pos):
+        value_type = buf[pos]
+        pos += 1
+        if value_type == self._NONE:
+            return None, pos
+        elif value_type == self._TRUE:
+            return True, pos
+        elif value_type == self._FALSE:
+            return False, pos
+        elif value_type == self._INT:
+            return _read_signed(buf, pos)
+        elif value_type == self._FLOAT:
+            return _DOUBLE.unpack_from(buf, pos)[0], pos + 8
+        elif value_type == self._STRING:
+            value, pos = _read_bytes(buf, pos)
+            return value.decode('utf-8'), pos
+        elif value_type == self._LIST:
+            count, pos = _read_varint(buf, pos)
+            items = []
+            for _ in range(count):
+                item, pos = self._read_value(buf, pos)
+                items.append(item)
+            return items, pos
+        elif value_type == self._DICT:
+            count, pos = _read_varint(buf, pos)
+            items = {}
+            for _ in range(count):
+                key, pos = _read_bytes(buf, pos)
+                items[key.decode('utf-8')], pos = self._read_value(buf, pos)
+            return items, pos
+        raise ValueError('Malformed binary data: unknown value type %d' % value_type)
+
+class JsonFallbackCodec(AnyPrimitiveCodec):
+    '''Encodes field types without a dedicated codec through their JSON representation.'''
+
+    def __init__(self, field_type):
+        self.field_type = field_type
+
+    def write(self, out, value):
+        AnyPrimitiveCodec.write(self, out, self.field_type.to_json(value))
+
+    def read(self, buf, pos):
+        json_value, pos = AnyPrimitiveCodec.read(self, buf, pos)
+        error_context = ErrorContext()
+        value = self.field_type.from_json(json_value, error_context)
+        if error_context.has_errors():
+            raise ValueError('Malformed binary data: %s' % error_context)
+        return value, pos
+
+class _NullableItems(object):
+    def _write_item(self, out, item_codec, item):
+        if item is None:
+            out.append(0)
+        else:
+            out.append(1)
+            item_codec.write(out, item)
+
+    def _read_item(self, buf, pos, item_codec):
+        if not buf[pos]:
+            return None, pos + 1
+        return item_codec.read(buf, pos + 1)
+
+class ListCodec(Codec, _NullableItems):
+    def __init__(self, item_codec):
+        self.item_codec = item_codec
+
+    def write(self, out, value):
+        payload = bytearray()
+        _write_varint(payload, len(value))
+        for item in value:
+            self._write_item(payload, self.item_codec, item)
+        _write_bytes(out, payload)
+
+    def read(self, buf, pos):
+        length, pos = _read_varint(buf, pos)
+        end = pos + length
+        count, pos = _read_varint(buf, pos)
+        items = []
+        for _ in range(count):
+            item, pos = self._read_item(buf, pos, self.item_codec)
+            items.append(item)
+        return items, end
+
+class DictCodec(Codec, _NullableItems):
+    def __init__(self, item_codec):
+        self.item_codec = item_codec
+
+    def write(self, out, value):
+        payload = bytearray()
+        _write_varint(payload, len(value))
+        for k, v in six.iteritems(value):
+            _write_bytes(payload, six.text_type(k).encode('utf-8'))
+            self._write_item(payload, self.item_codec, v)
+        _write_bytes(out, payload)
+
+    def read(self, buf, pos):
+        length, pos = _read_varint(buf, pos)
+        end = pos + length
+        count, pos = _read_varint(buf, pos)
+        items = {}
+        for _ in range(count):
+            key, pos = _read_bytes(buf, pos)
+            items[key.decode('utf-8')], pos = self._read_item(buf, pos, self.item_codec)
+        return items, end
+
+class ModelCodec(Codec):
+    def __init__(self, model_class):
+        self.model_class = model_class
+        self._fields = None
+        self._fields_by_key = None
+
+    def init(self):
+        '''Builds the codecs of the fields up front rather than on first use. Returns the codec.'''
+        if self._fields is None:
+            self._init_fields()
+        return self
+
+    def _init_fields(self):
+        fields = []
+        fields_by_key = {}
+        for number, field in self.model_class.get_numbered_fields():
+            codec = get_codec(field.get_type())
+            key = number << 3 | codec.wire_type
+            key_bytes = bytearray()
+            _write_varint(key_bytes, key)
+            fields.append((field.get_name(), bytes(key_bytes), codec))
+            fields_by_key[key] = (field.get_name(), codec)
+        self._fields_by_key = fields_by_key
+        self._fields = fields
+
+    def write(self, out, value):
+        payload = bytearray()
+        self.write_fields(payload, value)
+        _write_bytes(out, payload)
+
+    def read(self, buf, pos):
+        length, pos = _read_varint(buf, pos)
+        return self.read_fields(buf, pos, pos + length)
+
+    def write_fields(self, out, model_obj):
+        if self._fields is None:
+            self._init_fields()
+        if model_obj._has_lazy_values:
+            model_obj._decode_lazy_values()
+        data = model_obj._data
+        for name, key_bytes, codec in self._fields:
+            value = data.get(name)
+            if value is not None:
+                out += key_bytes
+                codec.write(out, value)
+
+    def read_fields(self, buf, pos, end):
+        if self._fields is None:
+            self._init_fields()
+        kwargs = {name: None for name, _, _ in self._fields}
+        fields_by_key = self._fields_by_key
+        while pos < end:
+            key, pos = _read_varint(buf, pos)
+            field = fields_by_key.get(key)
+            if field:
+                kwargs[field[0]], pos = field[1].read(buf, pos)
+            else:
+                pos = _skip(buf, pos, key & 0x7)
+        if pos != end:
+            raise ValueError('Malformed binary data: field overruns its model at position %d' % pos)
+        return self.model_class(**kwargs), end
+
+_SIMPLE_CODECS = (
+    (model.String, StringCodec()),
+    (model.Bytes, BytesCodec()),
+    (model.Integer, IntegerCodec()),
+    (model.Float, FloatCodec()),
+    (model.Boolean, BooleanCodec()),
+    (model.DateTime, DateTimeCodec()),
+    (model.Date, DateCodec()),
+    (model.Decimal, DecimalCodec()),
+    (model.EncryptedId, EncryptedIdCodec()),
+    (model.RawJson, RawJsonCodec()),
+    (model.AnyPrimitive, AnyPrimitiveCodec()),
+)
+
+_codecs_lock = threading.Lock()
+_codecs_by_field_type = {}
+_model_codecs = {}
+
+def get_codec(field_type):
+    codec = _codecs_by_field_type.get(field_type)
+    if codec is None:
+        codec = _codecs_by_field_type[field_type] = _make_codec(field_type)
+    return codec
+
+def get_model_codec(model_class):
+    codec = _model_codecs.get(model_class)
+    if codec is None:
+        # Model codecs are shared so that self-referential models terminate.
+        with _codecs_lock:
+            codec = _model_codecs.setdefault(model_class, ModelCodec(model_class))
+    return codec
+
+def _make_codec(field_type):
+    if isinstance(field_type, model.ModelType):
+        return get_model_codec(field_type.get_model_class())
+    elif isinstance(field_type, model.ListType):
+        return ListCodec(get_codec(field_type.get_item_type()))
+    elif isinstance(field_type, model.DictType):
+        return DictCodec(get_codec(field_type.get_item_type()))
+    # Only use a built in codec for the exact type, since subclasses may
+    # change the representation of values.
+    if type(field_type) is model.Enum:
+        return EnumCodec(field_type)
+    if type(field_type) is model.String and field_type.intern:
+        return InterningStringCodec(field_type)
+    for type_, codec in _SIMPLE_CODECS:
+        if type(field_type) is type_:
+            return codec
+    return JsonFallbackCodec(field_type)
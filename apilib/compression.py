@@ -0,0 +1,98 @@
+# Compression of request and response bodies, negotiated with the standard
+# Accept-Encoding and Content-Encoding headers.
+#
+# Servers compress responses for clients that accept it, and advertise the encodings
+# they accept for requests by including an Accept-Encoding header in responses.
+# RemoteServiceStub compresses requests once a server has advertised support.
+
+from __future__ import absolute_import
+
+import zlib
+
+from . import content_types
+from . import exceptions
+
+# Bodies smaller than this many bytes are sent uncompressed.
+COMPRESSION_THRESHOLD = 1024
+# The zlib compression level, from 1 (fastest) to 9 (smallest).
+COMPRESSION_LEVEL = 6
+# Size of the chunks yielded by compress_stream().
+STREAMING_CHUNK_SIZE = 64 * 1024
+# Decompressed bodies larger than this many bytes are rejected.
+MAX_DECOMPRESSED_SIZE = 64 * 1024 * 1024
+
+GZIP = 'gzip'
+DEFLATE = 'deflate'
+IDENTITY = 'identity'
+
+# In order of preference.
+SUPPORTED_ENCODINGS = (GZIP, DEFLATE)
+
+_WBITS = {
+    GZIP: 16 + zlib.MAX_WBITS,
+    DEFLATE: zlib.MAX_WBITS,
+}
+
+def negotiate_encoding(accept_encoding):
+    '''Returns the supported encoding preferred by an Accept-Encoding header, or None.'''
+    for value in content_types.parse_accept_header(accept_encoding):
+        if value in _WBITS:
+            return value
+        if value == '*':
+            return SUPPORTED_ENCODINGS[0]
+        if value == IDENTITY:
+            return None
+    return None
+
+def should_compress(body):
+    return len(body) >= COMPRESSION_THRESHOLD
+
+def compress(data, encoding, level=None):
+    compressor = _compressobj(encoding, level)
+    return compressor.compress(data) + compressor.flush()
+
+def compress_stream(data, encoding, level=None, chunk_size=None):
+    '''Yields the compressed data in chunks, so sending can start before compression finishes.'''
+    compressor = _compressobj(encoding, level)
+    chunk_size = chunk_size or STREAMING_CHUNK_SIZE
+    view = memoryview(data)
+    for start in range(0, len(data), chunk_size):
+        chunk = compressor.compress(view[start:start + chunk_size])
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+def decompress(data, encoding):
+    '''Decompresses a body sent with the given Content-Encoding.
+
+    Raises ValueError for malformed data or data that decompresses to more than
+    MAX_DECOMPRESSED_SIZE bytes.
+    '''
+    if not encoding or encoding == IDENTITY:
+        return data
+    decompressor = zlib.decompressobj(_wbits(encoding))
+    try:
+        result = decompressor.decompress(data, MAX_DECOMPRESSED_SIZE + 1)
+    except zlib.error as e:
+        raise ValueError('Malformed %s data: %s' % (encoding, e))
+    if len(result) > MAX_DECOMPRESSED_SIZE:
+        raise ValueError('Decompressed data exceeds %d bytes' % MAX_DECOMPRESSED_SIZE)
+    if not decompressor.eof:
+        raise ValueError('Truncated %s data' % encoding)
+    return result
+
+def check_encoding(encoding):
+    '''Raises UnsupportedContentEncodingException unless the Content-Encoding can be decompressed.'''
+    if encoding and encoding != IDENTITY:
+        _wbits(encoding)
+
+def _compressobj(encoding, level):
+    if level is None:
+        level = COMPRESSION_LEVEL
+    return zlib.compressobj(level, zlib.DEFLATED, _wbits(encoding))
+
+def _wbits(encoding):
+    wbits = _WBITS.get(encoding.strip().lower())
+    if wbits is None:
+        raise exceptions.UnsupportedContentEncodingException('Unsupported content encoding "%s"' % encoding)
+    return wbits
@@ -0,0 +1,130 @@
+# Encodings of request and response bodies, selected by content type.
+
+from __future__ import absolute_import
+
+from . import exceptions
+from . import msgpack_encoding
+from .validation import CommonErrorCodes
+from .validation import ValidationError
+
+JSON_CONTENT_TYPE = 'application/json'
+BINARY_CONTENT_TYPE = 'application/x-apilib-binary'
+MSGPACK_CONTENT_TYPE = 'application/msgpack'
+
+class ContentCodec(object):
+    '''Encodes models into request and response bodies and back.
+
+    To support a new content type, subclass this and call register_content_codec().
+    '''
+    content_type = None
+    # True for encodings that rely on client and server sharing the same schema.
+    requires_matching_schema = False
+
+    def encode(self, model_obj):
+        raise NotImplementedError()
+
+    def decode(self, model_class, body, error_context=None, context=None, lazy=False):
+        '''Decodes and validates a model, reporting malformed bodies as errors.
+
+        As with Model.from_json(), errors are raised as a DeserializationError
+        if no error context is given.
+        '''
+        try:
+            return self._decode(model_class, body, error_context, context, lazy)
+        except ValueError as e:
+            error = ValidationError('', CommonErrorCodes.INVALID_VALUE, 'Unable to decode %s body: %s' % (self.content_type, e))
+            if error_context is None:
+                raise exceptions.DeserializationError([error])
+            error_context.errors.append(error)
+            return None
+
+    def _decode(self, model_class, body, error_context, context, lazy):
+        raise NotImplementedError()
+
+class JsonContentCodec(ContentCodec):
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, model_obj):
+        return model_obj.to_json_str().encode('utf-8')
+
+    def _decode(self, model_class, body, error_context, context, lazy):
+        return model_class.from_json(model_class.parse_json_str(body), error_context, context, lazy=lazy)
+
+class BinaryContentCodec(ContentCodec):
+    '''The compact encoding of apilib.binary. Lazy decoding is not supported.'''
+    content_type = BINARY_CONTENT_TYPE
+    requires_matching_schema = True
+
+    def encode(self, model_obj):
+        return model_obj.to_bytes()
+
+    def _decode(self, model_class, body, error_context, context, lazy):
+        return model_class.from_bytes(body, error_context, context)
+
+class MsgpackContentCodec(ContentCodec):
+    '''MessagePack, see apilib.msgpack_encoding. Lazy decoding is not supported.'''
+    content_type = MSGPACK_CONTENT_TYPE
+
+    def encode(self, model_obj):
+        return msgpack_encoding.encode_model(model_obj)
+
+    def _decode(self, model_class, body, error_context, context, lazy):
+        return msgpack_encoding.decode_model(model_class, body, error_context, context)
+
+_content_codecs = {}
+
+def register_content_codec(codec, aliases=()):
+    for content_type in (codec.content_type,) + tuple(aliases):
+        _content_codecs[content_type] = codec
+
+def get_content_codec(content_type):
+    '''Returns the codec for a Content-Type header value, which may include parameters.'''
+    media_type = _media_type(content_type or JSON_CONTENT_TYPE)
+    codec = _content_codecs.get(media_type)
+    if not codec:
+        raise exceptions.UnsupportedContentTypeException('Unsupported content type "%s"' % content_type)
+    return codec
+
+def negotiate_content_codec(accept, default=None):
+    '''Picks the codec to use for a response given the Accept header of the request.
+
+    Falls back to the default codec (JSON if not given) if the header is absent,
+    accepts anything, or names no supported content type.
+    '''
+    default = default or _content_codecs[JSON_CONTENT_TYPE]
+    for media_type in parse_accept_header(accept):
+        if media_type in ('*/*', 'application/*') or media_type == default.content_type:
+            return default
+        if media_type in _content_codecs:
+            return _content_codecs[media_type]
+    return default
+
+def parse_accept_header(header):
+    '''Returns the values of an Accept-style header in order of preference.
+
+    Parameters are dropped, as are values with a quality of zero.
+    '''
+    if not header:
+        return []
+    candidates = []
+    for i, part in enumerate(header.split(',')):
+        params = part.split(';')
+        quality = 1.0
+        for param in params[1:]:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, i, _media_type(params[0])))
+    return [value for _, _, value in sorted(candidates)]
+
+def _media_type(content_type):
+    return content_type.split(';', 1)[0].strip().lower()
+
+register_content_codec(JsonContentCodec())
+register_content_codec(BinaryContentCodec())
+if msgpack_encoding.msgpack:
+    register_content_codec(MsgpackContentCodec(), aliases=['application/x-msgpack'])
@@ -21,8 +21,20 @@ class DeserializationError(ApilibException):
     def __str__(self):
         return 'DeserializationError:\n  %s' % '\n  '.join(str(e) for e in self.errors)
 
+class InvalidFieldTagException(ApilibException):
+    pass
+
+class SchemaMismatchException(ApilibException):
+    pass
+
 class MethodNotFoundException(ApilibException):
     pass
 
 class MethodNotImplementedException(ApilibException):
     pass
+
+class UnsupportedContentTypeException(ApilibException):
+    pass
+
+class UnsupportedContentEncodingException(ApilibException):
+    pass
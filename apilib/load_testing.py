@@ -0,0 +1,249 @@
+# Load testing of service implementations, entirely in process.
+#
+# Workers call a service method as fast as they can with a cycle of request
+# payloads, through invoke_with_json() or through invoke_with_body() as server
+# adapters do, and the run reports throughput, latency percentiles and errors:
+#
+#   payloads = load_testing.generate_payloads(StudentServiceImpl(), 'create', count=100)
+#   result = load_testing.run(StudentServiceImpl, 'create', payloads, concurrency=8, duration=10)
+#   print(result.format_report())
+#
+# Workers are threads, processes, or callbacks on an asyncio event loop that run
+# calls on a thread pool, as an asynchronous server would. With threads, the GIL
+# limits throughput to what one core can do, while processes show how the service
+# scales across cores.
+
+from __future__ import absolute_import
+
+import json
+import timeit
+
+import six
+
+from . import content_types
+from . import exceptions
+from . import payloads as payloads_module
+from .service import ResponseCode
+from .validation import ValidationContext
+
+THREAD = 'thread'
+PROCESS = 'process'
+ASYNCIO = 'asyncio'
+WORKER_TYPES = (THREAD, PROCESS, ASYNCIO)
+
+# Calls invoke_with_json() with the payload.
+JSON_TRANSPORT = 'json'
+# Calls invoke_with_body() with the payload encoded as JSON, as server adapters do.
+BODY_TRANSPORT = 'body'
+TRANSPORTS = (JSON_TRANSPORT, BODY_TRANSPORT)
+
+# How long runs take if neither a duration nor a number of requests is given, in seconds.
+DEFAULT_DURATION = 10.0
+
+_clock = timeit.default_timer
+
+class LoadTestResult(object):
+    '''The outcome of a load test.
+
+    latencies holds the duration of every call in seconds, response_codes counts
+    responses by response code, and exceptions counts calls that raised, by
+    exception type. elapsed is the time the longest-running worker took.
+    '''
+
+    def __init__(self):
+        self.latencies = []
+        self.response_codes = {}
+        self.exceptions = {}
+        self.elapsed = 0.0
+
+    @property
+    def num_requests(self):
+        return len(self.latencies)
+
+    @property
+    def num_errors(self):
+        '''The number of calls that raised or got a response code other than SUCCESS.'''
+        failed = sum(count for code, count in six.iteritems(self.response_codes) if code != ResponseCode.SUCCESS)
+        return failed + sum(self.exceptions.values())
+
+    @property
+    def error_rate(self):
+        return float(self.num_errors) / self.num_requests if self.num_requests else 0.0
+
+    @property
+    def throughput(self):
+        '''Calls per second.'''
+        return self.num_requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, percent):
+        '''Returns the latency that percent percent of calls took at most, in seconds.'''
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100.0))]
+
+    def merge(self, other):
+        '''Adds the calls of another worker, which ran concurrently with this one.'''
+        self.latencies.extend(other.latencies)
+        for counts, other_counts in [(self.response_codes, other.response_codes), (self.exceptions, other.exceptions)]:
+            for key, count in six.iteritems(other_counts):
+                counts[key] = counts.get(key, 0) + count
+        self.elapsed = max(self.elapsed, other.elapsed)
+
+    def format_report(self):
+        lines = [
+            'Requests:   %d in %.2fs' % (self.num_requests, self.elapsed),
+            'Throughput: %.1f requests/s' % self.throughput,
+        ]
+        if self.latencies:
+            lines.append('Latency:    p50 %.2fms, p95 %.2fms, p99 %.2fms, max %.2fms' % tuple(
+                latency * 1000 for latency in [self.percentile(50), self.percentile(95), self.percentile(99),
+                    max(self.latencies)]))
+        lines.append('Errors:     %d (%.2f%%)' % (self.num_errors, self.error_rate * 100))
+        for code, count in sorted(six.iteritems(self.response_codes)):
+            if code != ResponseCode.SUCCESS:
+                lines.append('  %s: %d' % (code, count))
+        for name, count in sorted(six.iteritems(self.exceptions)):
+            lines.append('  %s raised: %d' % (name, count))
+        return '\n'.join(lines)
+
+    def _record(self, latency, response_code, exception):
+        self.latencies.append(latency)
+        if exception is not None:
+            name = type(exception).__name__
+            self.exceptions[name] = self.exceptions.get(name, 0) + 1
+        else:
+            self.response_codes[response_code] = self.response_codes.get(response_code, 0) + 1
+
+def generate_payloads(service, method_name, count=100, seed=None, **generator_args):
+    '''Returns count request payloads for a method, see payloads.PayloadGenerator.'''
+    request_class = service.resolve_method(method_name).request_class
+    context = ValidationContext(service=service.get_name(), method=method_name)
+    generator = payloads_module.PayloadGenerator(seed=seed, context=context, **generator_args)
+    return [generator.generate(request_class) for _ in range(count)]
+
+def run(service_factory, method_name, payloads, concurrency=4, duration=None, num_requests=None,
+        workers=THREAD, transport=JSON_TRANSPORT):
+    '''Calls a service method from concurrency workers, cycling through payloads.
+
+    service_factory returns the ServiceImplementation to call, and is called once
+    per worker. Pass the service class itself for services without arguments. For
+    process workers it must be picklable, e.g. a module-level class or function.
+
+    Runs for duration seconds, or until num_requests calls were made in total, or
+    DEFAULT_DURATION seconds if neither is given.
+    '''
+    if workers not in WORKER_TYPES:
+        raise ValueError('Unknown worker type "%s", must be one of %s' % (workers, ', '.join(WORKER_TYPES)))
+    if transport not in TRANSPORTS:
+        raise ValueError('Unknown transport "%s", must be one of %s' % (transport, ', '.join(TRANSPORTS)))
+    if not payloads:
+        raise ValueError('At least one payload is required')
+    if duration is None and num_requests is None:
+        duration = DEFAULT_DURATION
+    if transport == BODY_TRANSPORT:
+        payloads = [json.dumps(payload).encode('utf-8') for payload in payloads]
+    # Workers start at different payloads, so they don't all send the same one at once.
+    worker_args = [(service_factory, method_name, payloads[i % len(payloads):] + payloads[:i % len(payloads)],
+            transport, duration, _share(num_requests, concurrency, i))
+        for i in range(concurrency)]
+    if workers == ASYNCIO:
+        return _run_asyncio(worker_args)
+
+    from concurrent import futures
+    executor_class = futures.ProcessPoolExecutor if workers == PROCESS else futures.ThreadPoolExecutor
+    result = LoadTestResult()
+    with executor_class(concurrency) as executor:
+        for worker_result in [executor.submit(_run_worker, *args) for args in worker_args]:
+            result.merge(worker_result.result())
+    return result
+
+def _run_worker(service_factory, method_name, payloads, transport, duration, num_requests):
+    call = _make_call(service_factory(), method_name, transport)
+    result = LoadTestResult()
+    start = _clock()
+    deadline = start + duration if duration is not None else None
+    i = 0
+    while (num_requests is None or i < num_requests) and (deadline is None or _clock() < deadline):
+        result._record(*_timed_call(call, payloads[i % len(payloads)]))
+        i += 1
+    result.elapsed = _clock() - start
+    return result
+
+def _run_asyncio(worker_args):
+    try:
+        import asyncio
+    except ImportError:
+        raise exceptions.ModuleRequired('Load testing with asyncio workers requires Python 3')
+    from concurrent import futures
+
+    loop = asyncio.new_event_loop()
+    executor = futures.ThreadPoolExecutor(len(worker_args))
+    result = LoadTestResult()
+    done = []
+    finished = loop.create_future()
+    start = _clock()
+
+    def start_worker(service_factory, method_name, payloads, transport, duration, num_requests):
+        call = _make_call(service_factory(), method_name, transport)
+        deadline = start + duration if duration is not None else None
+        state = {'count': 0, 'submitted': None}
+
+        def next_call(future=None):
+            # Results are recorded here, on the event loop's thread. Anything raised
+            # here would be lost and leave the run waiting forever, so failures of the
+            # call itself count as failed calls.
+            if future is not None:
+                try:
+                    result._record(*future.result())
+                except Exception as e:
+                    result._record(_clock() - state['submitted'], None, e)
+            if (num_requests is not None and state['count'] >= num_requests) or (
+                    deadline is not None and _clock() >= deadline):
+                done.append(True)
+                if len(done) == len(worker_args):
+                    finished.set_result(None)
+                return
+            payload = payloads[state['count'] % len(payloads)]
+            state['count'] += 1
+            state['submitted'] = _clock()
+            loop.run_in_executor(executor, _timed_call, call, payload).add_done_callback(next_call)
+        next_call()
+
+    try:
+        for args in worker_args:
+            start_worker(*args)
+        loop.run_until_complete(finished)
+    finally:
+        executor.shutdown()
+        loop.close()
+    result.elapsed = _clock() - start
+    return result
+
+def _make_call(service, method_name, transport):
+    if transport == BODY_TRANSPORT:
+        headers = {'Content-Type': content_types.JSON_CONTENT_TYPE}
+        def call(body):
+            response = service.invoke_with_body(method_name, body, headers)
+            return lambda: json.loads(response.body.decode('utf-8'))['response_code'] if response.body else None
+    else:
+        def call(json_request):
+            response = service.invoke_with_json(method_name, json_request)
+            return lambda: response['response_code']
+    return call
+
+def _timed_call(call, payload):
+    '''Returns the latency of a call along with its response code or exception.'''
+    start = _clock()
+    try:
+        get_response_code = call(payload)
+    except Exception as e:
+        return _clock() - start, None, e
+    latency = _clock() - start
+    # Response bodies are decoded outside of the timing, since that's the client's work.
+    return latency, get_response_code(), None
+
+def _share(total, parts, i):
+    if total is None:
+        return None
+    return total // parts + (1 if i < total % parts else 0)
@@ -0,0 +1,153 @@
+# Compact, size-bounded representations of models for logging.
+#
+# Model.to_string() renders every value of a model across many lines, which for
+# large requests is slow and floods the logs. LogRepr renders a single line instead,
+# going no deeper than MAX_DEPTH nested values, showing no more than MAX_ITEMS items
+# of each list and dict, and stopping after MAX_LENGTH characters:
+#
+#   <GetOrdersResponse: {orders: [<Order: {id: 1, tags: ['a', 'b']}>, ... 98 more], response_code: 'SUCCESS'}>
+#
+# Rendering happens only when the log record is formatted, so nothing is rendered
+# for records that are filtered out.
+
+from __future__ import absolute_import
+
+import itertools
+
+import six
+
+from . import model
+
+# How many levels of nested models, lists and dicts to render.
+MAX_DEPTH = 4
+# How many items of each list and dict to render.
+MAX_ITEMS = 10
+# The length after which rendering stops.
+MAX_LENGTH = 2000
+
+class LogRepr(object):
+    '''Wraps a value to be rendered with format_for_log() when converted to a string.
+
+    Usage: logger.debug('Request: %s', LogRepr(request))
+    '''
+    __slots__ = ('value', 'max_depth', 'max_items', 'max_length')
+
+    def __init__(self, value, max_depth=None, max_items=None, max_length=None):
+        self.value = value
+        self.max_depth = max_depth
+        self.max_items = max_items
+        self.max_length = max_length
+
+    def __str__(self):
+        return format_for_log(self.value, self.max_depth, self.max_items, self.max_length)
+
+    __unicode__ = __str__
+
+    def __repr__(self):
+        return self.__str__()
+
+def format_for_log(value, max_depth=None, max_items=None, max_length=None):
+    '''Renders a model, or any value of a field, on a single line within the given limits.
+
+    Values that have not been decoded yet (see lazy decoding) are rendered from their
+    JSON form rather than being decoded. Unset limits default to the module settings.
+    '''
+    writer = _Writer(
+        MAX_DEPTH if max_depth is None else max_depth,
+        MAX_ITEMS if max_items is None else max_items,
+        MAX_LENGTH if max_length is None else max_length)
+    try:
+        writer.write_value(value, 0)
+    except _Truncated:
+        pass
+    return writer.get_text()
+
+class _Truncated(Exception):
+    pass
+
+class _Writer(object):
+    def __init__(self, max_depth, max_items, max_length):
+        self.max_depth = max_depth
+        self.max_items = max_items
+        self.max_length = max_length
+        self.parts = []
+        self.length = 0
+        self.truncated = False
+
+    def get_text(self):
+        text = u''.join(self.parts)
+        return text + u'...' if self.truncated else text
+
+    def write(self, text):
+        remaining = self.max_length - self.length
+        if len(text) > remaining:
+            self.parts.append(text[:remaining])
+            self.length = self.max_length
+            self.truncated = True
+            raise _Truncated()
+        self.parts.append(text)
+        self.length += len(text)
+
+    def write_value(self, value, depth):
+        if type(value) is model._LazyValue:
+            value = value.value
+        if isinstance(value, model.Model):
+            self.write_model(value, depth)
+        elif isinstance(value, (list, tuple)):
+            self.write_items(u'[', u']', value, len(value), depth, self.write_list_item)
+        elif isinstance(value, dict):
+            items = sorted(six.iteritems(value), key=lambda item: six.text_type(item[0])) \
+                if len(value) <= self.max_items else itertools.islice(six.iteritems(value), self.max_items)
+            self.write_items(u'{', u'}', items, len(value), depth, self.write_dict_item)
+        elif isinstance(value, six.text_type):
+            self.write_string(value)
+        elif isinstance(value, (bytes, bytearray)):
+            self.write(u'<%d bytes>' % len(value))
+        elif isinstance(value, model.RawJsonValue):
+            self.write(u'<raw json: ')
+            self.write(six.text_type(value.text))
+            self.write(u'>')
+        else:
+            self.write(six.text_type(value))
+
+    def write_model(self, model_obj, depth):
+        name = type(model_obj).__name__
+        if depth >= self.max_depth:
+            self.write(u'<%s>' % name)
+            return
+        self.write(u'<%s: {' % name)
+        data = model_obj._data
+        for i, key in enumerate(sorted(data)):
+            if i:
+                self.write(u', ')
+            self.write(u'%s: ' % key)
+            self.write_value(data[key], depth + 1)
+        self.write(u'}>')
+
+    def write_items(self, start, end, items, count, depth, write_item):
+        if depth >= self.max_depth and count:
+            self.write(u'%s... %d items%s' % (start, count, end))
+            return
+        self.write(start)
+        for i, item in enumerate(items):
+            if i == self.max_items:
+                break
+            if i:
+                self.write(u', ')
+            write_item(item, depth)
+        if count > self.max_items:
+            self.write(u', ... %d more' % (count - self.max_items))
+        self.write(end)
+
+    def write_list_item(self, item, depth):
+        self.write_value(item, depth + 1)
+
+    def write_dict_item(self, item, depth):
+        self.write_value(item[0], depth + 1)
+        self.write(u': ')
+        self.write_value(item[1], depth + 1)
+
+    def write_string(self, value):
+        # Avoid copying more of a long string than can be written.
+        value = value[:self.max_length - self.length + 1]
+        self.write(u"'%s'" % value.replace(u"'", u"\\'"))
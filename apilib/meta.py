@@ -1,11 +1,18 @@
 # Utilities for inspecting model and service objects. Can be used
 # to find the transitive closure of all objects used by a service,
-# for example when generating API documentation.
+# for example when generating API documentation. ModelGraph exposes
+# which fields reference which models, for tooling that needs more.
 
 from __future__ import absolute_import
 
+import collections
+import hashlib
+import threading
+
 import six
 
+from . import model
+
 def get_model_classes_from_services(service_classes, public_only=False):
     model_classes = set()
     for service_class in service_classes:
@@ -15,26 +22,10 @@ def get_model_classes_from_services(service_classes, public_only=False):
     return model_classes
 
 def get_model_classes_from_service(service_class, public_only=False):
-    model_classes = set()
-    for descriptor in six.itervalues(service_class.methods):
-        if public_only and not descriptor.public:
-            continue
-        for model_class in [descriptor.request_class, descriptor.response_class]:
-            model_classes.add(model_class)
-            model_classes.update(get_model_classes_from_model(model_class))
-    return model_classes
+    return get_service_model_graph(service_class, public_only).model_classes
 
 def get_model_classes_from_model(model_class):
-    model_classes = set()
-    model_class.init()
-    for field in model_class.get_fields():
-        # This is only non-null if this is a complex type, like a List of a Model.
-        field_model_class = get_model_class_from_field_type(field.get_type())
-        if field_model_class:
-            field_model_class.init()
-            model_classes.add(field_model_class)
-            model_classes.update(get_model_classes_from_model(field_model_class))
-    return model_classes
+    return set(_model_graph.get_referenced_models(model_class))
 
 def get_model_class_from_field_type(field_type):
     if hasattr(field_type, 'get_model_class'):
@@ -42,3 +33,172 @@ def get_model_class_from_field_type(field_type):
     elif hasattr(field_type, 'get_item_type'):
         return get_model_class_from_field_type(field_type.get_item_type())
     return None
+
+class Edge(collections.namedtuple('Edge', ['source', 'field_name', 'target'])):
+    '''A field of the source model holding target models, directly or in lists or dicts.'''
+    __slots__ = ()
+
+class ModelGraph(object):
+    '''The models reachable from some root models, and the fields that reference them.
+
+    Models are walked once each, with an explicit stack rather than recursion, so
+    self-referential models and long chains of models are fine. Usage:
+
+    graph = ModelGraph([FooRequest, FooResponse])
+    for edge in graph.get_edges(FooRequest):
+        print('%s.%s -> %s' % (edge.source.__name__, edge.field_name, edge.target.__name__))
+    '''
+
+    def __init__(self, model_classes=()):
+        # Maps each model class to the edges of its fields that reference models.
+        self.edges = {}
+        self._closures = {}
+        self._lock = threading.Lock()
+        for model_class in model_classes:
+            self.add(model_class)
+
+    @property
+    def model_classes(self):
+        return set(self.edges)
+
+    def add(self, model_class):
+        '''Adds a model class and all models it references.'''
+        if model_class in self.edges:
+            return
+        with self._lock:
+            # The new models are walked into a local dict and published in one step,
+            # so that readers without the lock never see a model whose targets are
+            # still missing, and never see self.edges change while they iterate it.
+            new_edges = {}
+            stack = [model_class]
+            while stack:
+                current = stack.pop()
+                if current in self.edges or current in new_edges:
+                    continue
+                current.init()
+                edges = []
+                for field in current.get_fields():
+                    # This is only non-null if this is a complex type, like a List of a Model.
+                    target = get_model_class_from_field_type(field.get_type())
+                    if target:
+                        edges.append(Edge(current, field.get_name(), target))
+                        if target not in self.edges and target not in new_edges:
+                            stack.append(target)
+                new_edges[current] = sorted(edges, key=lambda edge: edge.field_name)
+            if new_edges:
+                all_edges = dict(self.edges)
+                all_edges.update(new_edges)
+                self.edges = all_edges
+
+    def get_edges(self, model_class):
+        '''Returns the edges of the fields of model_class that reference models.'''
+        self.add(model_class)
+        return list(self.edges[model_class])
+
+    def get_referencing_edges(self, model_class):
+        '''Returns the edges of the fields of models in the graph that reference model_class.'''
+        return [edge for edges in six.itervalues(self.edges) for edge in edges if edge.target is model_class]
+
+    def get_referenced_models(self, model_class):
+        '''Returns the models reachable from the fields of model_class, as a frozenset.
+
+        This includes model_class itself only if it references itself, directly or
+        through other models. Results are cached.
+        '''
+        closure = self._closures.get(model_class)
+        if closure is None:
+            self.add(model_class)
+            # Every model reachable from one in the graph is in it, see add().
+            all_edges = self.edges
+            reachable = set()
+            stack = [edge.target for edge in all_edges[model_class]]
+            while stack:
+                current = stack.pop()
+                if current not in reachable:
+                    reachable.add(current)
+                    stack.extend(edge.target for edge in all_edges[current] if edge.target not in reachable)
+            closure = self._closures[model_class] = frozenset(reachable)
+        return closure
+
+def get_service_model_graph(service_class, public_only=False):
+    '''Returns the ModelGraph of the requests and responses of a service's methods.
+
+    Graphs are cached per service class, so treat them as read-only.
+    '''
+    key = (service_class, public_only)
+    graph = _service_graphs.get(key)
+    if graph is None:
+        graph = _service_graphs[key] = ModelGraph(
+            model_class for descriptor in six.itervalues(service_class.methods)
+            if not public_only or descriptor.public
+            for model_class in [descriptor.request_class, descriptor.response_class] if model_class)
+    return graph
+
+# Shared by get_model_classes_from_model(), which only ever adds to it.
+_model_graph = ModelGraph()
+_service_graphs = {}
+
+# Schema fingerprints are short hashes of the layout of models, for cheaply checking
+# that a client and server agree on a schema, as the binary encoding requires.
+# A model's fingerprint covers the names, numbers and types of its fields and those
+# of all models it references.
+
+_fingerprints = {}
+_method_fingerprints = {}
+_state_fingerprints = {}
+
+def get_model_fingerprint(model_class):
+    fingerprint = _fingerprints.get(model_class)
+    if fingerprint is None:
+        fingerprint = _fingerprints[model_class] = _hash(describe_schema(model_class))
+    return fingerprint
+
+def get_method_fingerprint(method_descriptor):
+    fingerprint = _method_fingerprints.get(method_descriptor)
+    if fingerprint is None:
+        fingerprint = _method_fingerprints[method_descriptor] = _hash('%s(%s) -> %s' % (
+            method_descriptor.name,
+            get_model_fingerprint(method_descriptor.request_class) if method_descriptor.request_class else None,
+            get_model_fingerprint(method_descriptor.response_class) if method_descriptor.response_class else None))
+    return fingerprint
+
+def get_service_fingerprint(service_class):
+    return _hash('\n'.join(sorted(
+        get_method_fingerprint(descriptor) for descriptor in six.itervalues(service_class.methods))))
+
+def get_state_fingerprint(model_class):
+    '''Like get_model_fingerprint(), but covering fields in declaration order, as pickled models are laid out.'''
+    fingerprint = _state_fingerprints.get(model_class)
+    if fingerprint is None:
+        model_classes = get_model_classes_from_model(model_class) - set([model_class])
+        fingerprint = _state_fingerprints[model_class] = _hash('\n'.join(
+            [_describe_state_layout(model_class)] + sorted(_describe_state_layout(m) for m in model_classes)))
+    return fingerprint
+
+def describe_schema(model_class):
+    '''The canonical description of a model's schema that its fingerprint is computed from.'''
+    model_classes = get_model_classes_from_model(model_class) - set([model_class])
+    return '\n'.join([_describe_model(model_class)] + sorted(_describe_model(m) for m in model_classes))
+
+def _describe_model(model_class):
+    return '%s {%s}' % (model_class.__name__, ', '.join('%d: %s %s' % (
+        number, field.get_name(), _describe_field_type(field.get_type()))
+        for number, field in model_class.get_numbered_fields()))
+
+def _describe_state_layout(model_class):
+    field_name_to_field = model_class._field_name_to_field
+    return '%s(%s)' % (model_class.__name__, ', '.join('%s %s' % (
+        name, _describe_field_type(field_name_to_field[name].get_type()))
+        for name in model_class._get_state_layout()[0]))
+
+def _describe_field_type(field_type):
+    if isinstance(field_type, model.ModelType):
+        return 'ModelType(%s)' % field_type.get_model_class().__name__
+    elif isinstance(field_type, (model.ListType, model.DictType)):
+        return '%s(%s)' % (type(field_type).__name__, _describe_field_type(field_type.get_item_type()))
+    elif isinstance(field_type, model.Enum):
+        return 'Enum(%s)' % ', '.join('%s=%d' % (value, field_type.codes[value]) for value in sorted(field_type.values))
+    return type(field_type).__name__
+
+def _hash(description):
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,236 @@
+# Per-method metrics of services, exported in the Prometheus text format.
+#
+# When ENABLED, ServiceImplementation records for each service and method the time
+# spent decoding requests, in field validators while decoding (except for methods
+# with decode_in_process, where it counts as decoding), in the handler and encoding
+# responses, the sizes of encoded requests and responses, and the number of
+# responses by response code. Serve get_prometheus_text() from a metrics endpoint:
+#
+#   @app.route('/metrics')
+#   def metrics():
+#       return apilib.metrics.get_prometheus_text(), 200, {'Content-Type': apilib.metrics.PROMETHEUS_CONTENT_TYPE}
+
+from __future__ import absolute_import
+
+import bisect
+import threading
+import timeit
+import weakref
+
+import six
+
+# Set this to record metrics.
+ENABLED = False
+
+# Upper bounds of the histogram buckets, in seconds and bytes respectively.
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DECODE = 'decode'
+VALIDATE = 'validate'
+HANDLER = 'handler'
+ENCODE = 'encode'
+STAGES = (DECODE, VALIDATE, HANDLER, ENCODE)
+
+# A monotonic clock where available.
+clock = timeit.default_timer
+_bisect_left = bisect.bisect_left
+
+class Histogram(object):
+    '''Counts observations in fixed buckets, along with their sum.
+
+    Histograms aren't thread-safe, see MetricsRegistry.
+    '''
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        # Non-cumulative counts, with a last bucket for values above all bounds.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[_bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def copy(self):
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.sum = self.sum
+        return histogram
+
+    def merge(self, other):
+        for i, count in enumerate(list(other.counts)):
+            self.counts[i] += count
+        self.sum += other.sum
+
+class MethodMetrics(object):
+    '''The metrics of one method of a service.'''
+
+    def __init__(self, service, method):
+        self.service = service
+        self.method = method
+        self.durations = {stage: Histogram(DURATION_BUCKETS) for stage in STAGES}
+        self.request_size = Histogram(SIZE_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.responses = {}
+
+    def observe_duration(self, stage, seconds):
+        # Histogram.observe() inlined, since this runs several times per call.
+        histogram = self.durations[stage]
+        histogram.counts[_bisect_left(histogram.buckets, seconds)] += 1
+        histogram.sum += seconds
+
+    def count_response(self, response_code):
+        self.responses[response_code] = self.responses.get(response_code, 0) + 1
+
+    def copy(self):
+        method_metrics = MethodMetrics(self.service, self.method)
+        method_metrics.durations = {stage: histogram.copy() for stage, histogram in six.iteritems(self.durations)}
+        method_metrics.request_size = self.request_size.copy()
+        method_metrics.response_size = self.response_size.copy()
+        method_metrics.responses = dict(self.responses)
+        return method_metrics
+
+    def merge(self, other):
+        for stage, histogram in six.iteritems(self.durations):
+            histogram.merge(other.durations[stage])
+        self.request_size.merge(other.request_size)
+        self.response_size.merge(other.response_size)
+        for code, count in list(other.responses.items()):
+            self.responses[code] = self.responses.get(code, 0) + count
+
+class MetricsRegistry(object):
+    '''Holds the metrics of all methods.
+
+    To keep recording cheap, each thread records into metrics of its own, without
+    locking, and these are merged when the metrics are read. When a thread exits, its
+    metrics are merged into those of the threads that exited before it, so memory
+    doesn't grow with the number of threads a server ever started.
+    '''
+
+    def __init__(self):
+        self._local = threading.local()
+        # The metrics of live threads by (service, method), keyed by a weak reference
+        # to an object only the thread's local storage refers to.
+        self._threads = {}
+        # The merged metrics of threads that exited, by (service, method).
+        self._exited = {}
+        # Incremented by reset(), to have threads start over with new metrics.
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_method_metrics(self, service, method):
+        '''Returns the metrics the current thread records a method's calls into.'''
+        local = self._local
+        if getattr(local, 'generation', None) != self._generation:
+            self._start_thread()
+        key = (service, method)
+        method_metrics = local.methods.get(key)
+        if method_metrics is None:
+            method_metrics = MethodMetrics(service, method)
+            # Other threads iterate over the dict in get_totals().
+            with self._lock:
+                local.methods[key] = method_metrics
+        return method_metrics
+
+    def get_totals(self):
+        '''Returns the metrics of all threads merged, by (service, method).'''
+        with self._lock:
+            totals = {key: method_metrics.copy() for key, method_metrics in six.iteritems(self._exited)}
+            shards = [method_metrics for methods in six.itervalues(self._threads)
+                for method_metrics in six.itervalues(methods)]
+        for shard in shards:
+            key = (shard.service, shard.method)
+            if key in totals:
+                totals[key].merge(shard)
+            else:
+                totals[key] = shard.copy()
+        return totals
+
+    def reset(self):
+        with self._lock:
+            self._threads = {}
+            self._exited = {}
+            self._generation += 1
+
+    def _start_thread(self):
+        local = self._local
+        # The thread's local storage is cleared when it exits, which drops the last
+        # reference to the token and calls _thread_exited().
+        token = local.token = _ThreadToken()
+        local.methods = {}
+        with self._lock:
+            local.generation = self._generation
+            self._threads[weakref.ref(token, self._thread_exited)] = local.methods
+
+    def _thread_exited(self, token_ref):
+        with self._lock:
+            # Threads that started before the last reset() are no longer listed.
+            methods = self._threads.pop(token_ref, None)
+            if not methods:
+                return
+            for key, method_metrics in six.iteritems(methods):
+                if key in self._exited:
+                    self._exited[key].merge(method_metrics)
+                else:
+                    self._exited[key] = method_metrics
+
+    def to_prometheus(self):
+        methods = [method_metrics for _, method_metrics in sorted(self.get_totals().items())]
+        lines = []
+        _add_histograms(lines, 'apilib_stage_duration_seconds',
+            'Time spent in each stage of handling requests.', ('service', 'method', 'stage'),
+            [((m.service, m.method, stage), m.durations[stage]) for m in methods for stage in STAGES])
+        _add_histograms(lines, 'apilib_request_size_bytes',
+            'Size of encoded requests, before decompression.', ('service', 'method'),
+            [((m.service, m.method), m.request_size) for m in methods])
+        _add_histograms(lines, 'apilib_response_size_bytes',
+            'Size of encoded responses, before compression.', ('service', 'method'),
+            [((m.service, m.method), m.response_size) for m in methods])
+        lines.append('# HELP apilib_responses_total Responses by response code.')
+        lines.append('# TYPE apilib_responses_total counter')
+        for m in methods:
+            for code, count in sorted(m.responses.items(), key=lambda item: six.text_type(item[0])):
+                lines.append('apilib_responses_total%s %d' % (
+                    _labels(('service', 'method', 'code'), (m.service, m.method, code)), count))
+        return '\n'.join(lines) + '\n'
+
+class _ThreadToken(object):
+    pass
+
+registry = MetricsRegistry()
+
+def get_prometheus_text():
+    return registry.to_prometheus()
+
+def _add_histograms(lines, name, help_text, label_names, histograms):
+    lines.append('# HELP %s %s' % (name, help_text))
+    lines.append('# TYPE %s histogram' % name)
+    for key, histogram in histograms:
+        if not histogram.count:
+            continue
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+            cumulative += count
+            labels = _labels(label_names + ('le',), key + (_format_number(bound),))
+            lines.append('%s_bucket%s %d' % (name, labels, cumulative))
+        labels = _labels(label_names, key)
+        lines.append('%s_sum%s %s' % (name, labels, _format_number(histogram.sum)))
+        lines.append('%s_count%s %d' % (name, labels, cumulative))
+
+def _labels(names, values):
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in zip(names, values))
+
+def _escape(value):
+    return six.text_type(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_number(value):
+    if isinstance(value, six.string_types):
+        return value
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -1,26 +1,72 @@
 from __future__ import absolute_import
+import copy
 import datetime
 import decimal
+import importlib
 import inspect
+import itertools
 import json
 import re
 import threading
+import timeit
+import uuid
 
-from dateutil import parser as dateutil_parser
 import six
 
-try:
-    import hashids
-except ImportError:
-    hashids = None
-
 from .validation import CommonErrorCodes
 from .validation import ErrorContext
+from .validation import ValidationContext
 from . import exceptions
 from . import validators as vals
 
 ID_ENCRYPTION_KEY = None  # Set this to encrypt ids
 ID_HASHER = None
+# Set this to decode large lists on a pool of this many threads, see ListType. This only
+# pays off when decoding items releases the GIL, e.g. on free-threaded Python builds.
+PARALLEL_DECODING_WORKERS = 0
+# Lists with fewer items than this are always decoded sequentially.
+PARALLEL_DECODING_THRESHOLD = 1000
+# The number of distinct values each String(intern=True) field type keeps for interning.
+STRING_INTERN_TABLE_SIZE = 10000
+
+class _LazyModule(object):
+    '''Stands in for a module that is only imported when one of its attributes is used.
+
+    Evaluates as false if the module can't be imported.
+    '''
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, name):
+        # Keep introspection, e.g. by hasattr(), from importing the module.
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+    def __bool__(self):
+        try:
+            self._load()
+        except ImportError:
+            return False
+        return True
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return '<lazily imported module %r>' % self._name
+
+# dateutil and hashids take a while to import, so they are only imported once
+# DateTime values are decoded or EncryptedId fields are declared. They used to be
+# imported eagerly, and so are still attributes of this module.
+dateutil_parser = _LazyModule('dateutil.parser')
+hashids = _LazyModule('hashids')
 
 def _create_id_hasher():
     global ID_HASHER
@@ -28,9 +74,55 @@ def _create_id_hasher():
         raise exceptions.ConfigurationRequired('You must set apilib.ID_ENCRYPTION_KEY prior to using EncryptedId fields')
     ID_HASHER = hashids.Hashids(salt=ID_ENCRYPTION_KEY, min_length=8)
 
+def _parse_datetime(value):
+    return dateutil_parser.parse(value)
+
+_clock = timeit.default_timer
+
 _field_lock = threading.Lock()
+# Guards creating and clearing the tables of String(intern=True) field types.
+_intern_lock = threading.Lock()
+# Records the order in which fields are declared.
+_field_counter = itertools.count()
+
+_decoding_executor = None
+_decoding_executor_workers = None
+_decoding_executor_lock = threading.Lock()
+_decoding_thread_state = threading.local()
+
+def _submit_decoding_tasks(workers, func, args_list):
+    '''Submits func(*args) for each args to the decoding pool, returning the futures.
+
+    Tasks are submitted under the lock that guards replacing the pool when the number
+    of workers changes, so they never reach a pool that was shut down. Tasks already
+    submitted to a replaced pool still run.
+    '''
+    global _decoding_executor, _decoding_executor_workers
+    with _decoding_executor_lock:
+        if _decoding_executor_workers != workers:
+            from concurrent import futures
+            if _decoding_executor is not None:
+                _decoding_executor.shutdown(wait=False)
+            _decoding_executor = futures.ThreadPoolExecutor(workers)
+            _decoding_executor_workers = workers
+        return [_decoding_executor.submit(_run_decoding_task, func, args) for args in args_list]
+
+def _run_decoding_task(func, args):
+    # Lists nested in items are decoded sequentially, since waiting on the pool from
+    # one of its own threads could exhaust it.
+    _decoding_thread_state.in_pool = True
+    return func(*args)
 
 class Model(object):
+    # True if any field values are still undecoded JSON, see from_json(lazy=True).
+    _has_lazy_values = False
+    # The names of fields set since mark_clean(), or None if changes aren't tracked.
+    _dirty = None
+    # The names of the fields that were set, and the values of fields of mutable types
+    # along with a shallow copy of their contents, as of mark_clean().
+    _clean_names = None
+    _clean_values = None
+
     def __init__(self, **kwargs):
         self._data = {}
         self._populate_fields()
@@ -40,6 +132,8 @@ class Model(object):
             setattr(self, key, value)
 
     def to_dict(self):
+        if self._has_lazy_values:
+            self._decode_lazy_values()
         return {key: self._field_name_to_field[key].to_json(value) for key, value in six.iteritems(self._data)}
 
     # Deprecated. Use to_dict(), which is a better name.
@@ -47,20 +141,41 @@ class Model(object):
         return self.to_dict()
 
     def to_json_str(self):
+        if self._contains_raw_json():
+            return _dumps_with_raw_json(self._to_dict_with_raw_json())
         return json.dumps(self.to_json())
 
+    def _to_dict_with_raw_json(self):
+        if self._has_lazy_values:
+            self._decode_lazy_values()
+        return {key: _to_json_with_raw_json(self._field_name_to_field[key].get_type(), value)
+            for key, value in six.iteritems(self._data)}
+
     @classmethod
-    def from_json(cls, obj, error_context=None, context=None):
+    def from_json(cls, obj, error_context=None, context=None, lazy=False):
+        '''Deserializes a JSON object into a model.
+
+        With lazy=True, values of fields that contain nested models are fully
+        validated up front but only converted into model objects the first time
+        the field is accessed. Fields with validators of their own are always
+        decoded eagerly, since validators operate on decoded values.
+        '''
         cls._populate_fields()
         if obj is None:
             return None
 
         kwargs = {}
+        lazy_values = {} if lazy else None
         is_root = not error_context
         error_context = error_context or ErrorContext()
         context = cls.make_parent_context(obj, context) if context else None
         for key, field in six.iteritems(cls._field_name_to_field):
-            kwargs[key] = field.from_json(obj.get(key), error_context.extend(field=key), context)
+            value = obj.get(key)
+            if lazy and value is not None and field.is_lazy_decodable(context):
+                checked = field.check_json(value, error_context.extend(field=key), context)
+                lazy_values[key] = _LazyValue(field, value, checked)
+            else:
+                kwargs[key] = field.from_json(value, error_context.extend(field=key), context)
         for key in six.iterkeys(obj):
             if key not in cls._field_name_to_field:
                 error_context.extend(field=key).add_error(CommonErrorCodes.UNKNOWN_FIELD, 'Unknown field "%s"' % key)
@@ -68,15 +183,122 @@ class Model(object):
             if is_root:
                 raise exceptions.DeserializationError(error_context.all_errors())
             return None
-        return cls(**kwargs)
+        instance = cls(**kwargs)
+        if lazy_values:
+            instance._data.update(lazy_values)
+            instance._has_lazy_values = True
+        return instance
+
+    @classmethod
+    def check_json(cls, obj, error_context, context=None):
+        '''Reports the same errors as from_json() without constructing any models.
+
+        Returns the checked values by field name, which _from_checked() turns into a
+        model without decoding them again.
+        '''
+        cls._populate_fields()
+        if obj is None:
+            return None
+        context = cls.make_parent_context(obj, context) if context else None
+        checked = {key: field.check_json(obj.get(key), error_context.extend(field=key), context)
+            for key, field in six.iteritems(cls._field_name_to_field)}
+        cls._check_unknown_fields(obj, error_context)
+        return checked
+
+    @classmethod
+    def _from_checked(cls, checked):
+        fields = cls._field_name_to_field
+        return cls(**{key: fields[key].get_type().from_checked(value) for key, value in six.iteritems(checked)})
+
+    @classmethod
+    def _check_unknown_fields(cls, obj, error_context):
+        for key in six.iterkeys(obj):
+            if key not in cls._field_name_to_field:
+                error_context.extend(field=key).add_error(CommonErrorCodes.UNKNOWN_FIELD, 'Unknown field "%s"' % key)
 
     @classmethod
     def make_parent_context(cls, obj, context):
         return context.for_parent(obj)
 
+    def to_bytes(self):
+        '''Encodes this model in the compact binary format of apilib.binary.'''
+        from . import binary
+        return binary.encode_model(self)
+
+    @classmethod
+    def from_bytes(cls, data, error_context=None, context=None):
+        '''Decodes a model from the binary format of apilib.binary.
+
+        Raises ValueError if the data is malformed. If a validation context is given,
+        field validators are run as they would be by from_json().
+        '''
+        from . import binary
+        model = binary.decode_model(cls, data)
+        if context:
+            return model.validate(error_context, context)
+        return model
+
+    def to_msgpack(self):
+        '''Encodes this model as MessagePack, see apilib.msgpack_encoding.'''
+        from . import msgpack_encoding
+        return msgpack_encoding.encode_model(self)
+
+    @classmethod
+    def from_msgpack(cls, data, error_context=None, context=None):
+        '''Decodes a model from MessagePack, reporting errors as from_json() does.'''
+        from . import msgpack_encoding
+        return msgpack_encoding.decode_model(cls, data, error_context, context)
+
+    def validate(self, error_context=None, context=None):
+        '''Runs field validators over an already constructed model, as from_json() would.
+
+        Values are replaced by what the validators return. Returns the model, or None
+        if there were errors. As with from_json(), errors are raised as a
+        DeserializationError if no error context is given.
+
+        As with from_json(), validators see the parent as a JSON dict. This model is
+        encoded once up front, and nested models are given their part of the result.
+        '''
+        is_root = not error_context
+        error_context = error_context or ErrorContext()
+        model = self._validate_json(self.to_json(), error_context, context or ValidationContext())
+        if model is None and is_root:
+            raise exceptions.DeserializationError(error_context.all_errors())
+        return model
+
+    def _validate_json(self, obj, error_context, context):
+        # obj is this model encoded as JSON, see validate().
+        context = self.make_parent_context(obj, context)
+        for key, field in six.iteritems(self._field_name_to_field):
+            value = field.validate_value(field.__get__(self), error_context.extend(field=key), context, obj.get(key))
+            if value is not None or key in self._data:
+                self._data[key] = value
+        if error_context.has_errors():
+            return None
+        return self
+
     @classmethod
     def from_json_str(cls, json_str):
-        return cls.from_json(json.loads(json_str))
+        return cls.from_json(cls.parse_json_str(json_str))
+
+    @classmethod
+    def parse_json_str(cls, json_str):
+        '''Parses a JSON string into plain values, keeping the text of RawJson fields as is.'''
+        if not cls._contains_raw_json():
+            return json.loads(json_str)
+        if isinstance(json_str, bytes):
+            json_str = json_str.decode('utf-8')
+        value, end = _parse_with_raw_json(json_str, _skip_whitespace(json_str, 0), ModelType(cls))
+        if _skip_whitespace(json_str, end) != len(json_str):
+            raise ValueError('Extra data at position %d' % end)
+        return value
+
+    @classmethod
+    def _contains_raw_json(cls):
+        if '_has_raw_json' not in cls.__dict__:
+            cls._has_raw_json = False
+            cls._has_raw_json = any(_contains_raw_json(field.get_type()) for field in cls.get_fields())
+        return cls._has_raw_json
 
     @classmethod
     def init(cls):
@@ -92,6 +314,17 @@ class Model(object):
         cls.init()
         return list(cls._field_name_to_field.keys())
 
+    @classmethod
+    def get_numbered_fields(cls):
+        '''Returns (number, field) pairs ordered by number, as used by the binary encoding.
+
+        Fields with an explicit tag use it as their number. The remaining fields are
+        numbered in declaration order, skipping numbers that are already taken.
+        '''
+        if '_numbered_fields' not in cls.__dict__:
+            cls._numbered_fields = _number_fields(cls.__name__, cls.get_fields())
+        return cls._numbered_fields
+
     @classmethod
     def _populate_fields(cls):
         # Check cls.__dict__ instead of calling hasattr, because we only
@@ -123,6 +356,8 @@ class Model(object):
         return hash(_dict_to_tuples(d))
 
     def to_string(self, indent=''):
+        if self._has_lazy_values:
+            self._decode_lazy_values()
         parts = ['<%s: {' % type(self).__name__]
         for key in sorted(six.iterkeys(self._data)):
             formatted_value = self._field_name_to_field[key].to_string(self._data[key], indent)
@@ -130,11 +365,359 @@ class Model(object):
         parts.append('%s}>' % indent)
         return '\n'.join(parts)
 
+    def _decode_lazy_values(self):
+        for key, value in list(six.iteritems(self._data)):
+            if type(value) is _LazyValue:
+                self._data[key] = value.decode()
+        self._has_lazy_values = False
+
+    def mark_clean(self):
+        '''Starts tracking changes to this model and the models nested in it, see get_dirty_fields().
+
+        Calling it again forgets the changes made so far. Returns the model.
+        '''
+        if self._has_lazy_values:
+            self._decode_lazy_values()
+        data = self._data
+        self._dirty = set()
+        self._clean_names = frozenset(data)
+        clean_values = self._clean_values = {}
+        for name in type(self)._get_mutable_field_names():
+            value = data.get(name)
+            if value is not None:
+                clean_values[name] = (value, _mark_clean(value))
+        return self
+
+    def get_dirty_fields(self):
+        '''Returns the names of the fields changed since mark_clean() was called.
+
+        Besides fields that were set or unset, this includes fields holding models
+        with changes of their own, and lists and dicts that had items added, removed
+        or replaced, or that hold models with changes. Changes inside lists or dicts
+        nested in lists or dicts are not detected. Before mark_clean() is called, all
+        fields that are set count as changed.
+        '''
+        data = self._data
+        if self._dirty is None:
+            return set(data)
+        dirty = set(self._dirty)
+        if len(data) != len(self._clean_names) or not self._clean_names.issuperset(data):
+            dirty.update(self._clean_names.symmetric_difference(data))
+        for name, (value, contents) in six.iteritems(self._clean_values):
+            if name not in dirty and _is_changed(data.get(name), value, contents):
+                dirty.add(name)
+        return dirty
+
+    def is_dirty(self):
+        return bool(self.get_dirty_fields())
+
+    def evolve(self, **changes):
+        '''Returns a copy of this model with the given fields changed.
+
+        Unchanged values, including nested models, are shared with this model rather
+        than copied, so the cost depends only on the number of changes. Nested values
+        are changed with paths separated by double underscores, which copies just the
+        values along the path: evolve(address__city='Paris') copies this model and
+        its address. Path segments index into lists if they are integers and into
+        dicts otherwise.
+        '''
+        new = copy.copy(self)
+        fields = type(self)._field_name_to_field
+        nested_changes = {}
+        for key, value in six.iteritems(changes):
+            name, separator, rest = key.partition('__')
+            if name not in fields:
+                raise exceptions.UnknownFieldException('Unknown field "%s"' % name)
+            if separator:
+                nested_changes.setdefault(name, {})[rest] = value
+            else:
+                setattr(new, name, value)
+        for name, value_changes in six.iteritems(nested_changes):
+            if name in changes:
+                raise ValueError('Field "%s" is both replaced and changed' % name)
+            new._data[name] = _evolve_value(getattr(self, name), value_changes, name)
+        return new
+
+    def diff(self, other):
+        '''Returns an apilib.Patch with the changes from this model to another of the same class.
+
+        Values that are the same object in both models, such as those shared by
+        evolve(), are skipped without being compared.
+        '''
+        from . import patch
+        return patch.diff_models(self, other)
+
+    def apply_patch(self, patch):
+        '''Returns a copy of this model with the changes of a patch applied, see diff().
+
+        Like evolve(), this only copies models along the paths that are patched.
+        '''
+        return patch.apply(self)
+
+    def __reduce__(self):
+        if self._dirty is not None:
+            # The compact state would lose the identity of values shared with the
+            # snapshot taken by mark_clean(), so pickle the attributes as they are.
+            return (_new_model, (type(self),), dict(self.__dict__))
+        cls = type(self)
+        # The fingerprint catches fields that were added, removed or reordered since
+        # the model was pickled, which would otherwise restore values into the wrong fields.
+        args = (cls, self._get_state(), cls._get_state_fingerprint())
+        extra = {key: value for key, value in six.iteritems(self.__dict__) if key not in _MODEL_INSTANCE_ATTRS}
+        if extra:
+            return (_model_from_state, args, extra)
+        return (_model_from_state, args)
+
+    def __copy__(self):
+        cls = type(self)
+        new = cls.__new__(cls)
+        new.__dict__.update(self.__dict__)
+        new._data = dict(self._data)
+        if self._dirty is not None:
+            new._dirty = set(self._dirty)
+        return new
+
+    def __deepcopy__(self, memo):
+        '''Copies nested models and containers, sharing values of immutable field types.'''
+        cls = type(self)
+        new = cls.__new__(cls)
+        memo[id(self)] = new
+        for key, value in six.iteritems(self.__dict__):
+            if key != '_data':
+                new.__dict__[key] = copy.deepcopy(value, memo)
+        data = new._data = dict(self._data)
+        for name in cls._get_mutable_field_names():
+            value = data.get(name)
+            if value is not None:
+                data[name] = _deepcopy_value(value, memo)
+        return new
+
+    @classmethod
+    def _get_mutable_field_names(cls):
+        if '_mutable_field_names' not in cls.__dict__:
+            cls._mutable_field_names = tuple(field.get_name() for field in cls.get_fields()
+                if type(field.get_type()) not in _IMMUTABLE_FIELD_TYPES)
+        return cls._mutable_field_names
+
+    def _get_state(self):
+        '''Returns the field values as a tuple in declaration order, see _from_state().
+
+        Nested models are converted to tuples as well, so the state pickles compactly
+        and can be restored without normalizing or validating any values. The last
+        item is a bitmask of the fields that are unset.
+        '''
+        if self._has_lazy_values:
+            self._decode_lazy_values()
+        data = self._data
+        names, converted_fields = self._get_state_layout()
+        state = list(map(data.get, names))
+        unset = 0
+        if len(data) != len(names):
+            for i, name in enumerate(names):
+                if name not in data:
+                    unset |= 1 << i
+        for i, _, to_state, _ in converted_fields:
+            value = state[i]
+            if value is not None:
+                state[i] = to_state(value)
+        state.append(unset)
+        return tuple(state)
+
+    @classmethod
+    def _from_state(cls, state):
+        obj = cls.__new__(cls)
+        names, converted_fields = cls._get_state_layout()
+        # The trailing bitmask is left out, since there is one more item than names.
+        data = obj._data = dict(zip(names, state))
+        for i, name, _, from_state in converted_fields:
+            value = state[i]
+            if value is not None:
+                data[name] = from_state(value)
+        unset = state[-1]
+        if unset:
+            for i, name in enumerate(names):
+                if unset & (1 << i):
+                    del data[name]
+        return obj
+
+    @classmethod
+    def _get_state_fingerprint(cls):
+        if '_state_fingerprint' not in cls.__dict__:
+            from . import meta
+            cls._state_fingerprint = meta.get_state_fingerprint(cls)
+        return cls._state_fingerprint
+
+    @classmethod
+    def _get_state_layout(cls):
+        '''Returns the names of fields in declaration order, along with (index, name,
+        to_state, from_state) tuples for the fields whose values need converting.
+        '''
+        if '_state_layout' not in cls.__dict__:
+            fields = sorted(cls.get_fields(), key=lambda field: field._creation_index)
+            converted_fields = []
+            for i, field in enumerate(fields):
+                to_state, from_state = _state_converters(field.get_type())
+                if to_state:
+                    converted_fields.append((i, field.get_name(), to_state, from_state))
+            cls._state_layout = (tuple(field.get_name() for field in fields), tuple(converted_fields))
+        return cls._state_layout
+
+def _evolve_value(value, changes, path):
+    if isinstance(value, Model):
+        return value.evolve(**changes)
+    if isinstance(value, (list, dict)):
+        new = list(value) if isinstance(value, list) else dict(value)
+        nested_changes = {}
+        for key, item in six.iteritems(changes):
+            segment, separator, rest = key.partition('__')
+            if isinstance(new, list):
+                try:
+                    segment = int(segment)
+                    new[segment]
+                except (ValueError, IndexError):
+                    raise ValueError('Invalid index "%s" into list "%s"' % (segment, path))
+            if separator:
+                nested_changes.setdefault(segment, {})[rest] = item
+            else:
+                new[segment] = item
+        for segment, item_changes in six.iteritems(nested_changes):
+            if segment in changes or six.text_type(segment) in changes:
+                raise ValueError('Item "%s" of "%s" is both replaced and changed' % (segment, path))
+            new[segment] = _evolve_value(new[segment] if isinstance(new, list) else new.get(segment),
+                item_changes, '%s__%s' % (path, segment))
+        return new
+    raise ValueError('Cannot change the contents of "%s", which is %r' % (path, value))
+
+# Instance attributes that are part of the state of a model.
+_MODEL_INSTANCE_ATTRS = frozenset(['_data', '_has_lazy_values'])
+
+def _mark_clean(value):
+    # Returns a shallow copy of the contents of lists and dicts, to compare against later.
+    if isinstance(value, Model):
+        value.mark_clean()
+        return None
+    if type(value) is list:
+        for item in value:
+            if isinstance(item, Model):
+                item.mark_clean()
+        return list(value)
+    if type(value) is dict:
+        for item in six.itervalues(value):
+            if isinstance(item, Model):
+                item.mark_clean()
+        return dict(value)
+    return None
+
+def _is_changed(value, clean_value, clean_contents):
+    if value is not clean_value:
+        return True
+    if isinstance(value, Model):
+        return value.is_dirty()
+    if type(value) is list:
+        return len(value) != len(clean_contents) or any(_is_item_changed(item, clean_item)
+            for item, clean_item in zip(value, clean_contents))
+    if type(value) is dict:
+        return len(value) != len(clean_contents) or any(key not in clean_contents
+            or _is_item_changed(item, clean_contents[key]) for key, item in six.iteritems(value))
+    return False
+
+def _is_item_changed(item, clean_item):
+    return item is not clean_item or (isinstance(item, Model) and item.is_dirty())
+
+def _model_from_state(cls, state, fingerprint):
+    if fingerprint != cls._get_state_fingerprint():
+        raise exceptions.SchemaMismatchException(
+            'Cannot unpickle %s, since its fields or those of models it references changed since it was pickled'
+            % cls.__name__)
+    return cls._from_state(state)
+
+def _new_model(cls):
+    return cls.__new__(cls)
+
+def _deepcopy_value(value, memo):
+    type_ = type(value)
+    if type_ in _IMMUTABLE_VALUE_TYPES:
+        return value
+    copied = memo.get(id(value))
+    if copied is not None:
+        return copied
+    if isinstance(value, Model):
+        return value.__deepcopy__(memo)
+    if type_ is list:
+        copied = memo[id(value)] = []
+        copied.extend(_deepcopy_value(item, memo) for item in value)
+        return copied
+    if type_ is dict:
+        copied = memo[id(value)] = {}
+        for k, v in six.iteritems(value):
+            copied[k] = _deepcopy_value(v, memo)
+        return copied
+    return copy.deepcopy(value, memo)
+
+def _state_converters(field_type):
+    '''Returns functions converting values of a field type to and from model state.
+
+    Both are None for types whose values are stored in the state as is. The functions
+    of model types pass None through, so they can be applied to list and dict items.
+    '''
+    if isinstance(field_type, ModelType):
+        model_class = field_type.get_model_class()
+        restore = model_class._from_state
+        # Instances of subclasses have different fields, so they are stored as is.
+        to_state = lambda value: value._get_state() if type(value) is model_class else value
+        from_state = lambda state: restore(state) if type(state) is tuple else state
+        return to_state, from_state
+    if isinstance(field_type, ListType) and isinstance(field_type.get_item_type(), ModelType):
+        # Inlined, since these are the most common lists by far.
+        model_class = field_type.get_item_type().get_model_class()
+        restore = model_class._from_state
+        return (lambda value: [item._get_state() if type(item) is model_class else item for item in value],
+            lambda state: [restore(item) if type(item) is tuple else item for item in state])
+    if isinstance(field_type, (ListType, DictType)):
+        item_to_state, item_from_state = _state_converters(field_type.get_item_type())
+        if not item_to_state:
+            return None, None
+        if not isinstance(field_type.get_item_type(), ModelType):
+            item_to_state, item_from_state = _none_safe(item_to_state), _none_safe(item_from_state)
+        if isinstance(field_type, ListType):
+            return (lambda value: [item_to_state(item) for item in value],
+                lambda state: [item_from_state(item) for item in state])
+        return (lambda value: {k: item_to_state(v) for k, v in six.iteritems(value)},
+            lambda state: {k: item_from_state(v) for k, v in six.iteritems(state)})
+    return None, None
+
+def _none_safe(convert):
+    return lambda value: convert(value) if value is not None else None
+
+class _LazyValue(object):
+    '''A JSON value that has already been validated but not yet decoded.
+
+    checked holds what Field.check_json() returned, so that decoding only has to
+    construct the models.
+    '''
+    __slots__ = ('field', 'value', 'checked')
+
+    def __init__(self, field, value, checked):
+        self.field = field
+        self.value = value
+        self.checked = checked
+
+    def decode(self):
+        # Any errors were already reported when the value was checked.
+        return self.field.get_type().from_checked(self.checked)
+
 class Field(object):
-    def __init__(self, field_type, validators=(), required=None, readonly=None, description=None, **kwargs):
+    def __init__(self, field_type, validators=(), required=None, readonly=None, description=None, tag=None, **kwargs):
         self._type = field_type
         # Will be populated when the model is instantiated
         self._name = None
+        self._creation_index = next(_field_counter)
+        # The field number used by the binary encoding. If not given, fields are
+        # numbered in declaration order. Give explicit tags to fields of models whose
+        # encoded form must stay compatible as fields are added or removed.
+        if tag is not None and (not isinstance(tag, six.integer_types) or tag < 1):
+            raise ValueError('Field tags must be positive integers, got %r' % tag)
+        self.tag = tag
         self._validators = self._implicit_validators(required, readonly) + list(validators or [])
         self.description = description
         for key, value in six.iteritems(kwargs):
@@ -151,14 +734,40 @@ class Field(object):
             return self._validate(parsed_value, error_context, context)
         return parsed_value
 
+    def check_json(self, value, error_context, context=None):
+        '''Returns the checked value, see FieldType.check_json().'''
+        if context and self._validators and _contains_model(self._type):
+            # Validators operate on decoded values, so decode these eagerly.
+            return self.from_json(value, error_context, context)
+        checked_value = self._type.check_json(value, error_context, context)
+        if error_context.has_errors():
+            return None
+        if context:
+            return self._validate(checked_value, error_context, context)
+        return checked_value
+
+    def validate_value(self, value, error_context, context, json_value=None):
+        value = self._type.validate_value(value, error_context, context, json_value)
+        if error_context.has_errors():
+            return None
+        return self._validate(value, error_context, context)
+
+    def is_lazy_decodable(self, context=None):
+        return _contains_model(self._type) and not (context and self._validators)
+
     def __get__(self, instance, type=None):
         if instance:
-            return instance._data.get(self._name)
+            value = instance._data.get(self._name)
+            if value.__class__ is _LazyValue:
+                value = instance._data[self._name] = value.decode()
+            return value
         else:
             return self
 
     def __set__(self, instance, value):
         instance._data[self._name] = self._type.normalize(value)
+        if instance._dirty is not None:
+            instance._dirty.add(self._name)
 
     def to_string(self, value, indent):
         return self._type.to_string(value, indent)
@@ -179,10 +788,18 @@ class Field(object):
         return self.description
 
     def _validate(self, value, error_context, context=None):
+        if not self._validators:
+            return value
+        timer = context.timer if context is not None else None
+        if timer is not None:
+            start = _clock()
         for validator in self._validators:
             value = validator.validate(value, error_context, context)
             if error_context.has_errors():
-                return None
+                value = None
+                break
+        if timer is not None:
+            timer.seconds += _clock() - start
         return value
 
     def _implicit_validators(self, required, readonly):
@@ -204,6 +821,25 @@ class FieldType(object):
     def from_json(self, value, error_context, context=None):
         return value
 
+    def check_json(self, value, error_context, context=None):
+        '''Validates a JSON value without building any models, see Model.from_json(lazy=True).
+
+        Returns the checked value, which from_checked() turns into the decoded value.
+        For types that don't contain models, that is the decoded value itself.
+        '''
+        return self.from_json(value, error_context, context)
+
+    def from_checked(self, value):
+        '''Returns the decoded value for a value returned by check_json().'''
+        return value
+
+    def validate_value(self, value, error_context, context, json_value=None):
+        '''Validates a decoded value, see Model.validate().
+
+        json_value is the value encoded as JSON, if the caller has already encoded it.
+        '''
+        return value
+
     def normalize(self, value):
         return value
 
@@ -230,17 +866,51 @@ def _validate_types(value, types, error_context, type_message):
     return True
 
 class String(FieldType):
+    '''Usage: Field(String()) or Field(String(intern=True))
+
+    With intern=True, equal values share a single string object, which saves memory
+    when many models hold the same few values, like country codes. Up to
+    STRING_INTERN_TABLE_SIZE distinct values are kept, after which the table is
+    cleared, so only use it for fields with a limited number of distinct values.
+    '''
     type_name = 'string'
     json_type = 'string'
+    # Class attributes, so subclasses that don't call String.__init__() still work.
+    intern = False
+    _intern_table = None
+
+    def __init__(self, intern=False):
+        self.intern = intern
 
     def to_json(self, value):
         return six.text_type(value) if value is not None else None
 
     def from_json(self, value, error_context, context=None):
         if _validate_types(value, (str, six.text_type), error_context, self.type_name):
-            return six.text_type(value) if value is not None else None
+            if value is None:
+                return None
+            value = six.text_type(value)
+            return self.normalize(value) if self.intern else value
         return None
 
+    def normalize(self, value):
+        if not self.intern or type(value) is not six.text_type:
+            return value
+        table = self._intern_table
+        interned = table.get(value) if table is not None else None
+        if interned is None:
+            # Lookups of values already in the table don't need the lock.
+            with _intern_lock:
+                table = self._intern_table
+                if table is None:
+                    table = self._intern_table = {}
+                interned = table.get(value)
+                if interned is None:
+                    if len(table) >= STRING_INTERN_TABLE_SIZE:
+                        table.clear()
+                    interned = table[value] = value
+        return interned
+
     def to_string(self, value, indent):
         return (u"'%s'" % value.replace("'", "\\'")) if value is not None else six.text_type(None)
 
@@ -314,6 +984,22 @@ class ModelType(FieldType):
     def from_json(self, value, error_context, context=None):
         return self.model_class.from_json(value, error_context, context) if value is not None else None
 
+    def check_json(self, value, error_context, context=None):
+        if value is None:
+            return None
+        return self.model_class.check_json(value, error_context, context)
+
+    def from_checked(self, value):
+        # Fields with validators are decoded while checking, see Field.check_json().
+        if value is None or isinstance(value, Model):
+            return value
+        return self.model_class._from_checked(value)
+
+    def validate_value(self, value, error_context, context, json_value=None):
+        if value is None:
+            return None
+        return value._validate_json(json_value if json_value is not None else value.to_json(), error_context, context)
+
     def get_model_class(self):
         return self.model_class
 
@@ -324,13 +1010,21 @@ class ModelType(FieldType):
         return value.to_string(indent + '  ') if value is not None else six.text_type(None)
 
 class ListType(FieldType):
+    '''A list of values of one type.
+
+    Lists of at least PARALLEL_DECODING_THRESHOLD items are decoded in chunks on a
+    shared thread pool when PARALLEL_DECODING_WORKERS is set. Pass parallel=False
+    to always decode sequentially, or parallel=True to decode in parallel even if
+    PARALLEL_DECODING_WORKERS isn't set, using a single worker by default.
+    '''
     json_type = 'list'
 
-    def __init__(self, field_type_or_model_class):
+    def __init__(self, field_type_or_model_class, parallel=None):
         if inspect.isclass(field_type_or_model_class) and issubclass(field_type_or_model_class, Model):
             self._type = ModelType(field_type_or_model_class)
         else:
             self._type = field_type_or_model_class
+        self._parallel = parallel
 
     def to_json(self, value):
         if value is None:
@@ -340,7 +1034,53 @@ class ListType(FieldType):
     def from_json(self, value, error_context, context=None):
         if value is None:
             return None
-        value = [self._type.from_json(item, error_context.extend(index=i), context) for i, item in enumerate(value)]
+        # Checked inline first, since most lists are never decoded in parallel.
+        if (self._parallel or PARALLEL_DECODING_WORKERS) and self._should_decode_in_parallel(value):
+            value = self._from_json_parallel(value, error_context, context)
+        else:
+            value = [self._type.from_json(item, error_context.extend(index=i), context) for i, item in enumerate(value)]
+        return value if not error_context.has_errors() else None
+
+    def _should_decode_in_parallel(self, value):
+        if self._parallel is False or not (self._parallel or PARALLEL_DECODING_WORKERS):
+            return False
+        return len(value) >= PARALLEL_DECODING_THRESHOLD and not getattr(_decoding_thread_state, 'in_pool', False)
+
+    def _from_json_parallel(self, value, error_context, context):
+        # Child contexts are created up front so errors are reported in index order.
+        item_contexts = [error_context.extend(index=i) for i in range(len(value))]
+        item_type = self._type
+
+        def decode_chunk(start, end):
+            return [item_type.from_json(value[i], item_contexts[i], context) for i in range(start, end)]
+
+        workers = PARALLEL_DECODING_WORKERS or 1
+        # A few chunks per worker evens out differences in decoding time.
+        chunk_size = -(-len(value) // (workers * 4))
+        chunks = _submit_decoding_tasks(workers, decode_chunk,
+            [(start, min(start + chunk_size, len(value))) for start in range(0, len(value), chunk_size)])
+        result = []
+        for chunk in chunks:
+            result.extend(chunk.result())
+        return result
+
+    def check_json(self, value, error_context, context=None):
+        if value is None:
+            return None
+        return [self._type.check_json(item, error_context.extend(index=i), context) for i, item in enumerate(value)]
+
+    def from_checked(self, value):
+        if value is None:
+            return None
+        from_checked = self._type.from_checked
+        return [from_checked(item) for item in value]
+
+    def validate_value(self, value, error_context, context, json_value=None):
+        if value is None:
+            return None
+        json_items = json_value if json_value is not None else [None] * len(value)
+        value = [self._type.validate_value(item, error_context.extend(index=i), context, json_item)
+            for i, (item, json_item) in enumerate(zip(value, json_items))]
         return value if not error_context.has_errors() else None
 
     def normalize(self, value):
@@ -382,6 +1122,28 @@ class DictType(FieldType):
         value = {k: self._type.from_json(v, error_context.extend(key=k), context) for k,v in six.iteritems(value)}
         return value if not error_context.has_errors() else None
 
+    def check_json(self, value, error_context, context=None):
+        if value is None:
+            return None
+        if not isinstance(value, dict):
+            error_context.add_error(CommonErrorCodes.INVALID_TYPE, 'Value %s is not a dict' % value)
+            return None
+        return {k: self._type.check_json(v, error_context.extend(key=k), context) for k, v in six.iteritems(value)}
+
+    def from_checked(self, value):
+        if value is None:
+            return None
+        from_checked = self._type.from_checked
+        return {k: from_checked(v) for k, v in six.iteritems(value)}
+
+    def validate_value(self, value, error_context, context, json_value=None):
+        if value is None:
+            return None
+        json_value = json_value or {}
+        value = {k: self._type.validate_value(v, error_context.extend(key=k), context, json_value.get(k))
+            for k, v in six.iteritems(value)}
+        return value if not error_context.has_errors() else None
+
     def normalize(self, value):
         return dict(value) if value is not None else None
 
@@ -417,7 +1179,7 @@ class DateTime(FieldType):
             return None
         if self.ISO_8601_RE.match(value):
             try:
-                dt = dateutil_parser.parse(six.text_type(value))
+                dt = _parse_datetime(six.text_type(value))
             except ValueError:
                 dt = None
         else:
@@ -478,10 +1240,36 @@ class Decimal(FieldType):
         return None
 
 class Enum(FieldType):
+    '''Usage: Field(Enum(['RED', 'GREEN'])) or Field(Enum({'RED': 1, 'GREEN': 2}))
+
+    Each value has a small integer code, used by the binary encoding. Codes are
+    assigned in the order values are given, or in sorted order if they are given
+    as a set. Give explicit codes as a dict from value to code for enums whose
+    encoded form must stay compatible as values are added or removed.
+    '''
     json_type = 'string'
 
     def __init__(self, values):
-        self.values = set(values)
+        if isinstance(values, dict):
+            codes = dict(values)
+        else:
+            codes = {}
+            for value in (sorted(values) if isinstance(values, (set, frozenset)) else values):
+                codes.setdefault(value, len(codes))
+        self.values = set(codes)
+        # Lookup tables between values and their codes.
+        self.codes = codes
+        self.values_by_code = {code: value for value, code in six.iteritems(codes)}
+        if len(self.values_by_code) != len(codes) or not all(
+                isinstance(code, six.integer_types) and code >= 0 for code in self.values_by_code):
+            raise ValueError('Enum codes must be distinct non-negative integers, got %r' % codes)
+        # Values are replaced by the equal value given here, so that all models
+        # share the same few string objects.
+        self._canonical_values = {value: value for value in self.values}
+        sorted_values = ', '.join(sorted(self.values))
+        self._invalid_value_message = '"%%s" is not a valid enum for this type. Valid values are %s' % (
+            sorted_values.replace('%', '%%'))
+        self._type_name = 'enum(%s)' % sorted_values
 
     def to_json(self, value):
         return six.text_type(value) if value is not None else None
@@ -494,15 +1282,23 @@ class Enum(FieldType):
                 CommonErrorCodes.INVALID_TYPE,
                 'Value %s is invalid for enums. Enum values must be passed as strings' % value)
             return None
-        if value not in self.values:
+        canonical_value = self._canonical_values.get(value)
+        if canonical_value is None:
             error_context.add_error(
                 CommonErrorCodes.INVALID_VALUE,
-               '"%s" is not a valid enum for this type. Valid values are %s' % (value, ', '.join(sorted(self.values))))
+                self._invalid_value_message % value)
             return None
-        return value
+        return canonical_value
+
+    def normalize(self, value):
+        try:
+            return self._canonical_values.get(value, value)
+        except TypeError:
+            # Unhashable values are invalid, which validation reports.
+            return value
 
     def get_type_name(self):
-        return 'enum(%s)' % ', '.join(sorted(self.values))
+        return self._type_name
 
     def to_string(self, value, indent):
         return six.text_type(value)
@@ -572,9 +1368,183 @@ class AnyPrimitive(FieldType):
     def to_string(self, value, indent):
         return six.text_type(value)
 
+class RawJsonValue(object):
+    '''JSON text that is passed through without being decoded and re-encoded.'''
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+    def loads(self):
+        return json.loads(self.text)
+
+    def __eq__(self, other):
+        return type(self) == type(other) and self.text == other.text
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.text)
+
+    def __repr__(self):
+        return 'RawJsonValue(%r)' % self.text
+
+class RawJson(FieldType):
+    '''Usage: Field(RawJson())
+
+    Values are held as RawJsonValue objects. Model.from_json_str() keeps the original
+    text of the value and Model.to_json_str() writes it back out verbatim.
+    '''
+    type_name = 'json'
+    json_type = 'any'
+    description = 'Arbitrary JSON, passed through as is'
+
+    def to_json(self, value):
+        return value.loads() if value is not None else None
+
+    def from_json(self, value, error_context, context=None):
+        return self.normalize(value)
+
+    def normalize(self, value):
+        if value is None or isinstance(value, RawJsonValue):
+            return value
+        return RawJsonValue(json.dumps(value))
+
+    def to_string(self, value, indent):
+        return six.text_type(value.text) if value is not None else six.text_type(None)
+
+_json_decoder = json.JSONDecoder()
+_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+
+def _skip_whitespace(json_str, idx):
+    return _WHITESPACE_RE.match(json_str, idx).end()
+
+def _parse_with_raw_json(json_str, idx, field_type):
+    '''Parses the JSON value starting at idx, returning the value and the index after it.
+
+    Values of RawJson fields are sliced out of json_str rather than decoded. Anything that
+    cannot contain a RawJson field is handed to the regular decoder in one go.
+    '''
+    if isinstance(field_type, RawJson):
+        value, end = _json_decoder.raw_decode(json_str, idx)
+        return RawJsonValue(json_str[idx:end]), end
+    if _contains_raw_json(field_type):
+        if isinstance(field_type, ModelType):
+            fields = field_type.get_model_class()._field_name_to_field
+            return _parse_object_with_raw_json(json_str, idx, lambda k: fields[k].get_type() if k in fields else None)
+        elif isinstance(field_type, DictType):
+            return _parse_object_with_raw_json(json_str, idx, lambda k: field_type.get_item_type())
+        elif isinstance(field_type, ListType) and json_str.startswith('[', idx):
+            values = []
+            idx = _skip_whitespace(json_str, idx + 1)
+            if json_str.startswith(']', idx):
+                return values, idx + 1
+            while True:
+                value, idx = _parse_with_raw_json(json_str, idx, field_type.get_item_type())
+                values.append(value)
+                idx = _skip_whitespace(json_str, idx)
+                if json_str.startswith(']', idx):
+                    return values, idx + 1
+                idx = _skip_whitespace(json_str, _expect(json_str, idx, ','))
+    return _json_decoder.raw_decode(json_str, idx)
+
+def _parse_object_with_raw_json(json_str, idx, get_value_type):
+    if not json_str.startswith('{', idx):
+        # Not an object, from_json() will report the error.
+        return _json_decoder.raw_decode(json_str, idx)
+    obj = {}
+    idx = _skip_whitespace(json_str, idx + 1)
+    if json_str.startswith('}', idx):
+        return obj, idx + 1
+    while True:
+        key, idx = json.decoder.scanstring(json_str, _expect(json_str, idx, '"'))
+        idx = _skip_whitespace(json_str, _expect(json_str, _skip_whitespace(json_str, idx), ':'))
+        value_type = get_value_type(key)
+        if value_type is not None:
+            obj[key], idx = _parse_with_raw_json(json_str, idx, value_type)
+        else:
+            obj[key], idx = _json_decoder.raw_decode(json_str, idx)
+        idx = _skip_whitespace(json_str, idx)
+        if json_str.startswith('}', idx):
+            return obj, idx + 1
+        idx = _skip_whitespace(json_str, _expect(json_str, idx, ','))
+
+def _expect(json_str, idx, char):
+    if not json_str.startswith(char, idx):
+        raise ValueError('Expecting \'%s\' at position %d' % (char, idx))
+    return idx + 1
+
+def _to_json_with_raw_json(field_type, value):
+    if value is None or not _contains_raw_json(field_type):
+        return field_type.to_json(value)
+    if isinstance(field_type, RawJson):
+        return value
+    elif isinstance(field_type, ModelType):
+        return value._to_dict_with_raw_json()
+    elif isinstance(field_type, ListType):
+        return [_to_json_with_raw_json(field_type.get_item_type(), item) for item in value]
+    elif isinstance(field_type, DictType):
+        return {k: _to_json_with_raw_json(field_type.get_item_type(), v) for k, v in six.iteritems(value)}
+    return field_type.to_json(value)
+
+def _dumps_with_raw_json(obj):
+    # RawJsonValues are encoded as unique placeholder strings, which are then
+    # replaced by the raw text in the encoded output.
+    texts = []
+    placeholder = 'rawjson-%s-' % uuid.uuid4().hex
+
+    def encode_raw_json(value):
+        if isinstance(value, RawJsonValue):
+            texts.append(value.text)
+            return '%s%d' % (placeholder, len(texts) - 1)
+        raise TypeError('%r is not JSON serializable' % value)
+
+    encoded = json.dumps(obj, default=encode_raw_json)
+    if not texts:
+        return encoded
+    return re.sub('"%s(\\d+)"' % placeholder, lambda match: texts[int(match.group(1))], encoded)
+
+def _contains_raw_json(field_type):
+    if isinstance(field_type, RawJson):
+        return True
+    if isinstance(field_type, ModelType):
+        return field_type.get_model_class()._contains_raw_json()
+    if isinstance(field_type, (ListType, DictType)):
+        return _contains_raw_json(field_type.get_item_type())
+    return False
+
+def _number_fields(model_name, fields):
+    numbered_fields = {}
+    for field in fields:
+        if field.tag is not None:
+            if field.tag in numbered_fields:
+                raise exceptions.InvalidFieldTagException('Fields "%s" and "%s" of %s both have tag %d' % (
+                    numbered_fields[field.tag].get_name(), field.get_name(), model_name, field.tag))
+            numbered_fields[field.tag] = field
+    number = 1
+    for field in sorted(fields, key=lambda f: f._creation_index):
+        if field.tag is None:
+            while number in numbered_fields:
+                number += 1
+            numbered_fields[number] = field
+    return sorted(six.iteritems(numbered_fields), key=lambda item: item[0])
+
+def _contains_model(field_type):
+    if isinstance(field_type, ModelType):
+        return True
+    if isinstance(field_type, (ListType, DictType)):
+        return _contains_model(field_type.get_item_type())
+    return False
+
 def _dict_to_tuples(value):
     if isinstance(value, dict):
         return tuple((k, _dict_to_tuples(value[k])) for k in sorted(value))
     elif isinstance(value, list):
         return tuple(_dict_to_tuples(v) for v in value)
     return value
+
+# Field types whose values are immutable, so copies of models can share them.
+_IMMUTABLE_FIELD_TYPES = frozenset([String, Integer, Float, Boolean, DateTime, Date, Decimal, Enum, EncryptedId, RawJson])
+_IMMUTABLE_VALUE_TYPES = frozenset([type(None), bool, float, bytes, six.text_type, decimal.Decimal,
+    datetime.date, datetime.datetime, RawJsonValue, _LazyValue] + list(six.integer_types) + list(six.string_types))
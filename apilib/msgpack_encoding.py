@@ -0,0 +1,118 @@
+# Encoding of models as MessagePack. Requires the msgpack module, which can be
+# installed with the msgpack extra: pip install apilib[msgpack]
+#
+# Values use native MessagePack types where there is one: Bytes fields are encoded
+# as binary and DateTime fields as timestamps. Other types use their JSON
+# representation, so encrypted ids stay encrypted. Timestamps are instants, so decoded
+# datetimes are in UTC, and naive datetimes are encoded as ISO 8601 strings.
+
+from __future__ import absolute_import
+
+import datetime
+
+import six
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from . import exceptions
+from . import model
+from .validation import CommonErrorCodes
+from .validation import ErrorContext
+
+def encode_model(model_obj):
+    _check_module()
+    return msgpack.packb(_model_to_native(model_obj), use_bin_type=True)
+
+def decode_model(model_class, data, error_context=None, context=None):
+    '''Decodes a model, reporting errors like Model.from_json() does.
+
+    Raises ValueError if the data isn't valid MessagePack.
+    '''
+    _check_module()
+    try:
+        obj = msgpack.unpackb(data, raw=False, timestamp=3, strict_map_key=False)
+    except (ValueError, msgpack.UnpackException) as e:
+        raise ValueError('Malformed MessagePack data: %s' % e)
+    is_root = not error_context
+    error_context = error_context or ErrorContext()
+    model_obj = _model_from_native(model_class, obj, error_context)
+    if model_obj is not None and context:
+        model_obj = model_obj.validate(error_context, context)
+    if error_context.has_errors():
+        if is_root:
+            raise exceptions.DeserializationError(error_context.all_errors())
+        return None
+    return model_obj
+
+def _check_module():
+    if not msgpack:
+        raise exceptions.ModuleRequired('You must install the msgpack module in order to use MessagePack encoding')
+
+def _model_to_native(model_obj):
+    if model_obj._has_lazy_values:
+        model_obj._decode_lazy_values()
+    fields = model_obj._field_name_to_field
+    return {key: _to_native(fields[key].get_type(), value) for key, value in six.iteritems(model_obj._data)}
+
+def _to_native(field_type, value):
+    if value is None:
+        return None
+    type_ = type(field_type)
+    if type_ is model.ModelType:
+        return _model_to_native(value)
+    elif type_ is model.ListType:
+        item_type = field_type.get_item_type()
+        return [_to_native(item_type, item) for item in value]
+    elif type_ is model.DictType:
+        item_type = field_type.get_item_type()
+        return {k: _to_native(item_type, v) for k, v in six.iteritems(value)}
+    elif type_ is model.DateTime and value.utcoffset() is not None:
+        return msgpack.Timestamp.from_datetime(value)
+    elif type_ is model.Bytes:
+        return value
+    elif type_ is model.RawJson:
+        return value.text
+    return field_type.to_json(value)
+
+def _model_from_native(model_class, obj, error_context):
+    if not isinstance(obj, dict):
+        error_context.add_error(CommonErrorCodes.INVALID_TYPE, 'Value %s is not an object' % obj)
+        return None
+    model_class.init()
+    fields = model_class._field_name_to_field
+    kwargs = {}
+    for key, field in six.iteritems(fields):
+        kwargs[key] = _from_native(field.get_type(), obj.get(key), error_context.extend(field=key))
+    model_class._check_unknown_fields(obj, error_context)
+    if error_context.has_errors():
+        return None
+    return model_class(**kwargs)
+
+def _from_native(field_type, value, error_context):
+    if value is None:
+        return None
+    type_ = type(field_type)
+    if type_ is model.ModelType:
+        return _model_from_native(field_type.get_model_class(), value, error_context)
+    elif type_ is model.ListType:
+        if not isinstance(value, list):
+            error_context.add_error(CommonErrorCodes.INVALID_TYPE, 'Value %s is not a list' % value)
+            return None
+        item_type = field_type.get_item_type()
+        value = [_from_native(item_type, item, error_context.extend(index=i)) for i, item in enumerate(value)]
+        return value if not error_context.has_errors() else None
+    elif type_ is model.DictType:
+        if not isinstance(value, dict):
+            error_context.add_error(CommonErrorCodes.INVALID_TYPE, 'Value %s is not a dict' % value)
+            return None
+        item_type = field_type.get_item_type()
+        value = {k: _from_native(item_type, v, error_context.extend(key=k)) for k, v in six.iteritems(value)}
+        return value if not error_context.has_errors() else None
+    elif type_ is model.DateTime and isinstance(value, datetime.datetime):
+        return value
+    elif type_ is model.RawJson and isinstance(value, six.string_types):
+        return model.RawJsonValue(value)
+    return field_type.from_json(value, error_context)
@@ -0,0 +1,289 @@
+from __future__ import absolute_import
+
+import copy
+
+import six
+
+from . import model
+from . import validators as vals
+from .validation import CommonErrorCodes
+from .validation import ErrorContext
+from . import exceptions
+
+class Patch(object):
+    '''The changes between two models of the same class, see Model.diff().
+
+    Fields of the new model are either set to a new value, unset, or, for fields
+    holding models, patched in turn. Lists of models of the same length are patched
+    item by item. The JSON form is an object with any of these keys:
+
+        {"set": {"name": "Alice"}, "unset": ["nickname"],
+         "nested": {"address": {"set": {"city": "Paris"}}},
+         "items": {"courses": {"0": {"set": {"grade": "A"}}}}}
+    '''
+
+    def __init__(self, model_class, set=None, unset=(), nested=None, items=None):
+        self.model_class = model_class
+        self.set = set or {}
+        self.unset = frozenset(unset)
+        self.nested = nested or {}
+        self.items = items or {}
+
+    def is_empty(self):
+        return not (self.set or self.unset or self.nested or self.items)
+
+    def __bool__(self):
+        return not self.is_empty()
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        return type(self) == type(other) and self.model_class == other.model_class and self.to_json() == other.to_json()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __str__(self):
+        return '<%s: %s %s>' % (type(self).__name__, self.model_class.__name__, self.to_json())
+
+    def apply(self, model_obj):
+        '''Returns a copy of the model with the changes applied, see Model.apply_patch().'''
+        if not isinstance(model_obj, self.model_class):
+            raise ValueError('Cannot apply a patch for %s to a %s' % (self.model_class.__name__, type(model_obj).__name__))
+        new = copy.copy(model_obj)
+        # Values are copied, so that changing the patched model doesn't change the
+        # patch, or other models it is applied to, and vice versa.
+        for name, value in six.iteritems(self.set):
+            setattr(new, name, copy.deepcopy(value))
+        for name in self.unset:
+            new._data.pop(name, None)
+        for name, patch in six.iteritems(self.nested):
+            value = getattr(model_obj, name)
+            if value is None:
+                raise ValueError('Cannot patch field "%s", which is None' % name)
+            setattr(new, name, patch.apply(value))
+        for name, item_patches in six.iteritems(self.items):
+            values = list(getattr(model_obj, name) or ())
+            for index, patch in six.iteritems(item_patches):
+                if index >= len(values) or values[index] is None:
+                    raise ValueError('Cannot patch item %d of field "%s", which is missing' % (index, name))
+                values[index] = patch.apply(values[index])
+            setattr(new, name, values)
+        return new
+
+    def to_json(self):
+        fields = self.model_class._field_name_to_field
+        obj = {}
+        if self.set:
+            obj['set'] = {name: fields[name].to_json(value) for name, value in six.iteritems(self.set)}
+        if self.unset:
+            obj['unset'] = sorted(self.unset)
+        if self.nested:
+            obj['nested'] = {name: patch.to_json() for name, patch in six.iteritems(self.nested)}
+        if self.items:
+            obj['items'] = {name: {six.text_type(index): patch.to_json() for index, patch in six.iteritems(item_patches)}
+                for name, item_patches in six.iteritems(self.items)}
+        return obj
+
+    @classmethod
+    def from_json(cls, obj, model_class, error_context=None, context=None):
+        '''Deserializes a patch for the given model class, validating the values it sets.
+
+        As with Model.from_json(), errors are raised as a DeserializationError if no
+        error context is given. With a validation context, fields that are read-only
+        in that context are left out of the patch.
+        '''
+        model_class.init()
+        is_root = not error_context
+        error_context = error_context or ErrorContext()
+        patch = _patch_from_json(obj, model_class, error_context, context)
+        if error_context.has_errors():
+            if is_root:
+                raise exceptions.DeserializationError(error_context.all_errors())
+            return None
+        return patch
+
+class PatchType(model.FieldType):
+    '''Usage: Field(PatchType(SomeModel))
+
+    A Patch for the given model class, e.g. to send only the changes to an
+    object in an UPDATE operation.
+    '''
+    json_type = 'object'
+
+    def __init__(self, model_class):
+        self.model_class = model_class
+
+    def to_json(self, value):
+        return value.to_json() if value is not None else None
+
+    def from_json(self, value, error_context, context=None):
+        if value is None:
+            return None
+        return Patch.from_json(value, self.model_class, error_context, context)
+
+    def normalize(self, value):
+        if value is not None and value.model_class is not self.model_class:
+            raise ValueError('Expected a patch for %s, not %s' % (self.model_class.__name__, value.model_class.__name__))
+        return value
+
+    def get_model_class(self):
+        return self.model_class
+
+    def get_type_name(self):
+        return 'patch(%s)' % self.model_class.__name__
+
+    def to_string(self, value, indent):
+        return six.text_type(value)
+
+def diff_models(old, new):
+    if type(old) is not type(new):
+        raise ValueError('Cannot diff a %s against a %s' % (type(old).__name__, type(new).__name__))
+    if old._has_lazy_values:
+        old._decode_lazy_values()
+    if new._has_lazy_values:
+        new._decode_lazy_values()
+    patch = Patch(type(old))
+    unset = set()
+    old_data = old._data
+    new_data = new._data
+    for name, field in six.iteritems(type(old)._field_name_to_field):
+        in_old = name in old_data
+        if name not in new_data:
+            if in_old:
+                unset.add(name)
+            continue
+        new_value = new_data[name]
+        old_value = old_data.get(name)
+        if in_old and old_value is new_value:
+            continue
+        field_type = field.get_type()
+        if in_old and old_value is not None and new_value is not None:
+            if isinstance(field_type, model.ModelType) and type(old_value) is type(new_value):
+                nested_patch = diff_models(old_value, new_value)
+                if nested_patch:
+                    patch.nested[name] = nested_patch
+                continue
+            if _is_model_list(field_type) and _items_patchable(old_value, new_value):
+                item_patches = {}
+                for i, (old_item, new_item) in enumerate(zip(old_value, new_value)):
+                    if old_item is not new_item:
+                        item_patch = diff_models(old_item, new_item)
+                        if item_patch:
+                            item_patches[i] = item_patch
+                if item_patches:
+                    patch.items[name] = item_patches
+                continue
+        if not in_old or old_value != new_value:
+            patch.set[name] = new_value
+    patch.unset = frozenset(unset)
+    return patch
+
+def _is_model_list(field_type):
+    return isinstance(field_type, model.ListType) and isinstance(field_type.get_item_type(), model.ModelType)
+
+def _items_patchable(old_values, new_values):
+    if len(old_values) != len(new_values):
+        return False
+    for old_item, new_item in zip(old_values, new_values):
+        if (old_item is None) != (new_item is None) or type(old_item) is not type(new_item):
+            return False
+    return True
+
+_PATCH_KEYS = frozenset(['set', 'unset', 'nested', 'items'])
+
+def _patch_from_json(obj, model_class, error_context, context):
+    if not isinstance(obj, dict):
+        error_context.add_error(CommonErrorCodes.INVALID_TYPE, 'Value %s is not an object' % obj)
+        return None
+    for key in obj:
+        if key not in _PATCH_KEYS:
+            error_context.extend(field=key).add_error(CommonErrorCodes.UNKNOWN_FIELD, 'Unknown field "%s"' % key)
+    fields = model_class._field_name_to_field
+    set_values = _get_json(obj, 'set', dict, {}, error_context)
+    unset = _get_json(obj, 'unset', list, [], error_context)
+    nested = _get_json(obj, 'nested', dict, {}, error_context)
+    items = _get_json(obj, 'items', dict, {}, error_context)
+    context = model_class.make_parent_context(set_values, context) if context else None
+
+    patch = Patch(model_class)
+    set_context = error_context.extend(field='set')
+    for name, value in six.iteritems(set_values):
+        field = _get_field(fields, name, set_context)
+        if field and not _is_readonly(field, context):
+            patch.set[name] = field.from_json(value, set_context.extend(field=name), context)
+    unset_names = set()
+    unset_context = error_context.extend(field='unset')
+    for i, name in enumerate(unset):
+        item_context = unset_context.extend(index=i)
+        field = _get_field(fields, name, item_context, by_index=True)
+        if field and not _is_readonly(field, context):
+            field.from_json(None, item_context, context)
+            unset_names.add(name)
+    patch.unset = frozenset(unset_names)
+    nested_context = error_context.extend(field='nested')
+    for name, value in six.iteritems(nested):
+        field = _get_field(fields, name, nested_context)
+        if not field:
+            continue
+        if not isinstance(field.get_type(), model.ModelType):
+            nested_context.extend(field=name).add_error(CommonErrorCodes.INVALID_VALUE,
+                'Field "%s" does not hold a model' % name)
+            continue
+        if not _is_readonly(field, context):
+            patch.nested[name] = _patch_from_json(
+                value, field.get_type().get_model_class(), nested_context.extend(field=name), context)
+    items_context = error_context.extend(field='items')
+    for name, value in six.iteritems(items):
+        field = _get_field(fields, name, items_context)
+        if not field:
+            continue
+        field_context = items_context.extend(field=name)
+        if not _is_model_list(field.get_type()):
+            field_context.add_error(CommonErrorCodes.INVALID_VALUE, 'Field "%s" does not hold a list of models' % name)
+            continue
+        if not isinstance(value, dict):
+            field_context.add_error(CommonErrorCodes.INVALID_TYPE, 'Value %s is not an object' % value)
+            continue
+        item_class = field.get_type().get_item_type().get_model_class()
+        item_patches = {}
+        for index, item_value in six.iteritems(value):
+            try:
+                i = int(index)
+                if i < 0:
+                    raise ValueError()
+            except ValueError:
+                field_context.extend(key=index).add_error(CommonErrorCodes.INVALID_VALUE,
+                    'List index "%s" is not a non-negative integer' % index)
+                continue
+            item_patches[i] = _patch_from_json(item_value, item_class, field_context.extend(key=index), context)
+        if not _is_readonly(field, context):
+            patch.items[name] = item_patches
+    return patch
+
+def _get_json(obj, key, type_, default, error_context):
+    value = obj.get(key)
+    if value is None:
+        return default
+    if not isinstance(value, type_):
+        error_context.extend(field=key).add_error(CommonErrorCodes.INVALID_TYPE,
+            'Value %s is not %s' % (value, 'a list' if type_ is list else 'an object'))
+        return default
+    return value
+
+def _get_field(fields, name, error_context, by_index=False):
+    field = fields.get(name) if isinstance(name, six.string_types) else None
+    if not field:
+        if not by_index:
+            error_context = error_context.extend(field=name)
+        error_context.add_error(CommonErrorCodes.UNKNOWN_FIELD, 'Unknown field "%s"' % name)
+    return field
+
+def _is_readonly(field, context):
+    if not context:
+        return False
+    for validator in field.get_validators():
+        if isinstance(validator, vals.Readonly) and validator.method_matcher.matches(
+                context.service, context.method, context.operator):
+            return True
+    return False
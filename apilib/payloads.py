@@ -0,0 +1,270 @@
+# Generates random JSON payloads for models, for benchmarks, load tests and fuzzing.
+#
+# Payloads follow the model's schema: values have the types of their fields, enums
+# take one of their values, and the Required, Readonly, Range, NonemptyElements,
+# Unique, UniqueFields, ExactlyOneNonempty and AtMostOneNonempty validators are
+# respected for the given validation context. With an error rate, some values are
+# replaced with invalid ones, and the paths of the errors they cause are reported:
+#
+#   generator = PayloadGenerator(seed=1, error_rate=0.1,
+#       context=apilib.ValidationContext(service='StudentService', method='create'))
+#   payload, error_paths = generator.generate_with_errors(CreateStudentRequest)
+#
+# Errors caused by validators are only reported when payloads are decoded with a
+# validation context, as services do.
+
+from __future__ import absolute_import
+
+import datetime
+import decimal
+import json
+import math
+import random
+import string
+
+import six
+
+from . import exceptions
+from . import model
+from . import validators as vals
+from .validation import ErrorContext
+from .validation import ValidationContext
+
+_LETTERS = string.ascii_letters + string.digits
+_EPOCH = datetime.datetime(2000, 1, 1)
+
+class PayloadGenerator(object):
+    '''Generates random payloads of a configurable size.
+
+    Optional fields are set with probability fill_rate. Nested models are generated
+    up to max_depth levels deep, and beyond that only where required. Lists and dicts
+    get between min_items and max_items items, and strings between 1 and
+    max_string_length characters. Each value is made invalid with probability
+    error_rate.
+    '''
+
+    def __init__(self, seed=None, context=None, max_depth=3, min_items=0, max_items=5, max_string_length=16,
+            fill_rate=0.8, error_rate=0.0):
+        if min_items > max_items:
+            raise ValueError('min_items must not exceed max_items')
+        self.random = random.Random(seed)
+        self.context = context or ValidationContext()
+        self.max_depth = max_depth
+        self.min_items = min_items
+        self.max_items = max_items
+        self.max_string_length = max_string_length
+        self.fill_rate = fill_rate
+        self.error_rate = error_rate
+
+    def generate(self, model_class):
+        '''Returns a payload for the model class, as a JSON-compatible dict.'''
+        return self.generate_with_errors(model_class)[0]
+
+    def generate_with_errors(self, model_class):
+        '''Returns a payload along with the sorted paths of the errors decoding it reports.'''
+        model_class.init()
+        error_paths = []
+        payload = self._generate_model(model_class, 0, '', self.context, error_paths)
+        return payload, sorted(error_paths)
+
+    def _generate_model(self, model_class, depth, path, context, error_paths):
+        fields = model_class.get_fields()
+        obj = {}
+        for field in fields:
+            if self.random.random() < self.fill_rate:
+                value = self._generate_value(field.get_type(), field.get_validators(), depth, _join(path, field.get_name()),
+                    context, error_paths)
+                if value is not None:
+                    obj[field.get_name()] = value
+        if not obj and fields:
+            # Empty objects count as missing values for validators like Required.
+            field = self.random.choice(sorted(fields, key=model.Field.get_name))
+            obj[field.get_name()] = self._generate_value(field.get_type(), field.get_validators(), depth,
+                _join(path, field.get_name()), context, error_paths, required=True)
+        # Which fields are required or read-only may depend on the values, e.g. an
+        # Operation's operator, so they are only settled once all values are known.
+        parent_context = model_class.make_parent_context(obj, context)
+        grouped_names = set()
+        for field in fields:
+            name = field.get_name()
+            field_path = _join(path, name)
+            for validator in field.get_validators():
+                if _matches(validator, vals.Readonly, parent_context):
+                    _discard(obj, name, field_path, error_paths)
+                elif _matches(validator, vals.Required, parent_context) and obj.get(name) in vals.EMPTY_VALUES:
+                    _discard(obj, name, field_path, error_paths)
+                    obj[name] = self._generate_value(field.get_type(), field.get_validators(), depth, field_path,
+                        context, error_paths, required=True)
+                elif isinstance(validator, (vals.ExactlyOneNonempty, vals.AtMostOneNonempty)):
+                    self._apply_group(model_class, validator, obj, depth, path, context, error_paths)
+                    grouped_names.update(validator.field_names)
+        if self.error_rate:
+            self._add_errors(model_class, obj, grouped_names, path, parent_context, error_paths)
+        return obj
+
+    def _generate_value(self, field_type, validators, depth, path, context, error_paths, required=False):
+        range_validator = _find(validators, vals.Range)
+        if isinstance(field_type, model.ModelType):
+            if depth >= self.max_depth and not required:
+                return None
+            return self._generate_model(field_type.get_model_class(), depth + 1, path, context, error_paths)
+        if isinstance(field_type, model.ListType):
+            return self._generate_list(field_type, validators, depth, path, context, error_paths, required)
+        if isinstance(field_type, model.DictType):
+            item_type = field_type.get_item_type()
+            if isinstance(item_type, model.ModelType) and depth >= self.max_depth and not required:
+                return None
+            return {key: self._generate_value(item_type, (), depth, '%s["%s"]' % (path, key), context, error_paths, True)
+                for key in sorted(set(self._string() for _ in range(self._num_items(required))))}
+        return self._generate_scalar(field_type, range_validator)
+
+    def _generate_list(self, field_type, validators, depth, path, context, error_paths, required):
+        item_type = field_type.get_item_type()
+        if isinstance(item_type, model.ModelType) and depth >= self.max_depth and not required:
+            return None
+        unique_fields = _find(validators, vals.UniqueFields)
+        unique = _find(validators, vals.Unique)
+        items = []
+        seen = set()
+        for _ in range(self._num_items(required)):
+            item_errors = []
+            item = self._generate_value(item_type, (), depth, '%s[%d]' % (path, len(items)), context, item_errors, True)
+            key = item.get(unique_fields.field_name) if unique_fields and isinstance(item, dict) else item
+            if (unique or unique_fields) and key is not None:
+                key = json.dumps(key, sort_keys=True)
+                if key in seen:
+                    continue
+                seen.add(key)
+            items.append(item)
+            error_paths.extend(item_errors)
+        return items
+
+    def _generate_scalar(self, field_type, range_validator):
+        if isinstance(field_type, model.Enum):
+            return self.random.choice(sorted(field_type.values))
+        if isinstance(field_type, (model.String, model.Bytes)):
+            return self._string()
+        if isinstance(field_type, model.Boolean):
+            return self.random.random() < 0.5
+        if isinstance(field_type, model.Integer):
+            low, high = _bounds(range_validator, 0, 1000000)
+            return self.random.randint(int(math.ceil(low)), int(math.floor(high)))
+        if isinstance(field_type, model.Float):
+            low, high = _bounds(range_validator, 0, 1000000)
+            return self.random.uniform(low, high)
+        if isinstance(field_type, model.Decimal):
+            low, high = _bounds(range_validator, 0, 1000000)
+            cents = self.random.randint(int(decimal.Decimal(low) * 100), int(decimal.Decimal(high) * 100))
+            return six.text_type(decimal.Decimal(cents) / 100)
+        if isinstance(field_type, model.DateTime):
+            return (_EPOCH + datetime.timedelta(seconds=self.random.randint(0, 10 ** 9))).isoformat() + '+00:00'
+        if isinstance(field_type, model.Date):
+            return (_EPOCH + datetime.timedelta(days=self.random.randint(0, 10000))).date().isoformat()
+        if isinstance(field_type, model.EncryptedId):
+            return field_type.to_json(self.random.randint(1, 10 ** 9))
+        if isinstance(field_type, (model.AnyPrimitive, model.RawJson)):
+            return self.random.choice([self._string(), self.random.randint(0, 1000), True, {'key': self._string()}])
+        raise exceptions.ApilibException('Cannot generate values of type %s' % type(field_type).__name__)
+
+    def _apply_group(self, model_class, validator, obj, depth, path, context, error_paths):
+        nonempty = [name for name in validator.field_names if obj.get(name) not in vals.EMPTY_VALUES]
+        if isinstance(validator, vals.ExactlyOneNonempty) and not nonempty:
+            name = self.random.choice(validator.field_names)
+            field = model_class._field_name_to_field[name]
+            obj[name] = self._generate_value(field.get_type(), field.get_validators(), depth, _join(path, name),
+                context, error_paths, required=True)
+            nonempty = [name]
+        for name in nonempty[1:]:
+            _discard(obj, name, _join(path, name), error_paths)
+
+    def _add_errors(self, model_class, obj, grouped_names, path, context, error_paths):
+        for field in model_class.get_fields():
+            name = field.get_name()
+            if name in grouped_names or self.random.random() >= self.error_rate:
+                continue
+            validators = field.get_validators()
+            if any(_matches(v, vals.Readonly, context) for v in validators):
+                continue
+            field_path = _join(path, name)
+            if name in obj and any(_matches(v, vals.Required, context) for v in validators):
+                _discard(obj, name, field_path, error_paths)
+                error_paths.append(field_path)
+                continue
+            invalid_value = self._invalid_value(field.get_type(), _find(validators, vals.Range))
+            if invalid_value is not None:
+                _discard(obj, name, field_path, error_paths)
+                obj[name] = invalid_value
+                error_paths.append(field_path)
+        if self.random.random() < self.error_rate:
+            name = '%s_unknown' % self._string()
+            obj[name] = self._string()
+            error_paths.append(_join(path, name))
+
+    def _invalid_value(self, field_type, range_validator):
+        if range_validator and isinstance(field_type, (model.Integer, model.Float)) and self.random.random() < 0.5:
+            if range_validator.min is not None:
+                return range_validator.min - 1
+            return range_validator.max + 1
+        if isinstance(field_type, (model.String, model.Bytes, model.EncryptedId, model.Decimal)):
+            return self.random.randint(0, 1000)
+        if isinstance(field_type, (model.Integer, model.Float, model.Boolean, model.DateTime, model.Date,
+                model.Enum, model.DictType)):
+            return '!%s' % self._string()
+        # Lists and nested models get errors in their items and fields instead.
+        return None
+
+    def _num_items(self, required):
+        return self.random.randint(max(self.min_items, 1 if required else 0), max(self.max_items, 1 if required else 0))
+
+    def _string(self):
+        return ''.join(self.random.choice(_LETTERS) for _ in range(self.random.randint(1, self.max_string_length)))
+
+def fuzz(model_class, iterations=1000, seed=None, context=None, **generator_args):
+    '''Decodes generated payloads, returning (payload, problem) pairs for unexpected results.
+
+    Problems are exceptions raised while decoding and errors that differ from the
+    expected ones. Payloads are decoded with the given
+    validation context, or an empty one.
+    '''
+    context = context or ValidationContext()
+    generator = PayloadGenerator(seed=seed, context=context, **generator_args)
+    problems = []
+    for _ in range(iterations):
+        payload, expected_paths = generator.generate_with_errors(model_class)
+        error_context = ErrorContext()
+        try:
+            model_class.from_json(payload, error_context, context)
+        except Exception as e:
+            problems.append((payload, e))
+            continue
+        paths = sorted(set(error.path for error in error_context.all_errors()))
+        if paths != sorted(set(expected_paths)):
+            problems.append((payload, 'Expected errors at %s, got %s' % (expected_paths, paths)))
+    return problems
+
+def _join(path, name):
+    return '%s.%s' % (path, name) if path else name
+
+def _find(validators, validator_class):
+    for validator in validators:
+        if isinstance(validator, validator_class):
+            return validator
+    return None
+
+def _matches(validator, validator_class, context):
+    return isinstance(validator, validator_class) and validator.method_matcher.matches(
+        context.service, context.method, context.operator)
+
+def _bounds(range_validator, default_low, default_high):
+    low = range_validator.min if range_validator and range_validator.min is not None else None
+    high = range_validator.max if range_validator and range_validator.max is not None else None
+    if low is None:
+        low = min(default_low, high) if high is not None else default_low
+    if high is None:
+        high = max(default_high, low)
+    return low, high
+
+def _discard(obj, name, path, error_paths):
+    '''Removes a value from a payload, along with the errors expected inside it.'''
+    obj.pop(name, None)
+    error_paths[:] = [p for p in error_paths if not (p == path or p.startswith(path + '.') or p.startswith(path + '['))]
@@ -0,0 +1,250 @@
+# Opt-in profiling of decoding, encoding and validation of models.
+#
+# While enabled, the time spent and the memory blocks allocated in from_json(),
+# to_dict() and validate() are attributed to each model, to each field of each model
+# and to each field type, and aggregated until reset:
+#
+#   with apilib.profiling.profile() as profiler:
+#       for request in requests:
+#           service.invoke_with_body(...)
+#   print(profiler.format_table())
+#
+# format_collapsed() returns the stacks in the collapsed format read by flamegraph.pl
+# and speedscope. Enabling installs instrumented versions of the Model and Field
+# methods involved, and disabling restores the originals, so there is no overhead
+# while disabled.
+
+from __future__ import absolute_import
+
+import contextlib
+import sys
+import threading
+import timeit
+
+import six
+
+from . import model
+
+# Memory blocks allocated by the interpreter, where available. Counts are net of
+# blocks freed, so they reflect the objects that outlive each call.
+_allocated_blocks = getattr(sys, 'getallocatedblocks', lambda: 0)
+
+clock = timeit.default_timer
+
+class FrameStats(object):
+    '''The aggregated measurements of one frame, or one stack of frames.'''
+    __slots__ = ('calls', 'total_time', 'self_time', 'self_blocks')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.self_time = 0.0
+        self.self_blocks = 0
+
+    def record(self, elapsed, self_time, self_blocks):
+        self.calls += 1
+        self.total_time += elapsed
+        self.self_time += self_time
+        self.self_blocks += self_blocks
+
+class Profiler(object):
+    '''Aggregates measurements by stack of frames.
+
+    Frames are named after models and fields, e.g. "Order.from_json" for decoding an
+    Order, "Order.items" for decoding or encoding its items field and
+    "Order.items.validators" for running that field's validators. The self time and
+    blocks of a frame exclude those of the frames called from it.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Stack of frame names -> FrameStats.
+        self.stacks = {}
+        # FieldType class name -> FrameStats, covering the fields of that type.
+        self.field_types = {}
+
+    def reset(self):
+        with self._lock:
+            self.stacks = {}
+            self.field_types = {}
+
+    def get_frames(self):
+        '''Returns the measurements aggregated by frame name, across all stacks.'''
+        frames = {}
+        for path, stats in list(self.stacks.items()):
+            frame = frames.get(path[-1])
+            if frame is None:
+                frame = frames[path[-1]] = FrameStats()
+            frame.self_time += stats.self_time
+            frame.self_blocks += stats.self_blocks
+            # Recursive frames are counted once, at their outermost occurrence.
+            if path[-1] not in path[:-1]:
+                frame.calls += stats.calls
+                frame.total_time += stats.total_time
+        return frames
+
+    def format_table(self, limit=None):
+        '''Returns tables of the frames and the field types, by descending self time.'''
+        lines = []
+        _add_table(lines, 'frame', self.get_frames(), limit)
+        lines.append('')
+        _add_table(lines, 'field type', dict(self.field_types), limit)
+        return '\n'.join(lines) + '\n'
+
+    def format_collapsed(self, metric='time'):
+        '''Returns the stacks in the collapsed stack format, one line per stack.
+
+        Values are the self time in microseconds, or with metric='blocks' the
+        allocated blocks.
+        '''
+        lines = []
+        for path, stats in sorted(self.stacks.items()):
+            if metric == 'blocks':
+                value = stats.self_blocks
+            elif metric == 'time':
+                value = int(round(stats.self_time * 1e6))
+            else:
+                raise ValueError('Unknown metric "%s"' % metric)
+            if value > 0:
+                lines.append('%s %d' % (';'.join(path), value))
+        return '\n'.join(lines) + '\n'
+
+    def _get_stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _call(self, name, model_name, field_type, func, *args, **kwargs):
+        stack = self._get_stack()
+        path = stack[-1][0] + (name,) if stack else (name,)
+        # [path, child time, child blocks, name of the model being processed]
+        frame = [path, 0.0, 0, model_name]
+        stack.append(frame)
+        start_blocks = _allocated_blocks()
+        start = clock()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = clock() - start
+            blocks = _allocated_blocks() - start_blocks
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+                stack[-1][2] += blocks
+            self._record(path, field_type, elapsed, elapsed - frame[1], blocks - frame[2])
+
+    def _record(self, path, field_type, elapsed, self_time, self_blocks):
+        with self._lock:
+            stats = self.stacks.get(path)
+            if stats is None:
+                stats = self.stacks[path] = FrameStats()
+            stats.record(elapsed, self_time, self_blocks)
+            if field_type is not None:
+                type_name = type(field_type).__name__
+                stats = self.field_types.get(type_name)
+                if stats is None:
+                    stats = self.field_types[type_name] = FrameStats()
+                stats.record(elapsed, self_time, self_blocks)
+
+profiler = Profiler()
+
+# (class, attribute name) -> the original attribute, while enabled.
+_originals = {}
+_enable_lock = threading.Lock()
+
+def is_enabled():
+    return bool(_originals)
+
+def enable():
+    '''Starts recording into the module's profiler.'''
+    with _enable_lock:
+        if _originals:
+            return
+        for cls, name, wrapper in _instrumented_methods():
+            _originals[(cls, name)] = cls.__dict__[name]
+            setattr(cls, name, wrapper)
+
+def disable():
+    with _enable_lock:
+        for (cls, name), original in six.iteritems(_originals):
+            setattr(cls, name, original)
+        _originals.clear()
+
+@contextlib.contextmanager
+def profile():
+    '''Resets the profiler and records into it for the duration of the block.'''
+    profiler.reset()
+    enable()
+    try:
+        yield profiler
+    finally:
+        disable()
+
+def _instrumented_methods():
+    Model = model.Model
+    Field = model.Field
+    model_from_json = Model.__dict__['from_json'].__func__
+    model_to_dict = Model.__dict__['to_dict']
+    # Model.validate() encodes the model and then calls _validate_json(), as nested
+    # models do, so wrapping the latter covers both.
+    model_validate_json = Model.__dict__['_validate_json']
+    field_from_json = Field.__dict__['from_json']
+    field_check_json = Field.__dict__['check_json']
+    field_validate_value = Field.__dict__['validate_value']
+    field_to_json = Field.__dict__['to_json']
+    field_validate = Field.__dict__['_validate']
+
+    def from_json(cls, obj, *args, **kwargs):
+        name = cls.__name__
+        return profiler._call(name + '.from_json', name, None, model_from_json, cls, obj, *args, **kwargs)
+
+    def to_dict(self):
+        name = type(self).__name__
+        return profiler._call(name + '.to_dict', name, None, model_to_dict, self)
+
+    def validate_json(self, *args, **kwargs):
+        name = type(self).__name__
+        return profiler._call(name + '.validate', name, None, model_validate_json, self, *args, **kwargs)
+
+    def field_wrapper(method):
+        def wrapper(self, *args, **kwargs):
+            stack = profiler._get_stack()
+            model_name = stack[-1][3] if stack else '?'
+            name = '%s.%s' % (model_name, self._name)
+            if stack and stack[-1][0][-1] == name:
+                # E.g. check_json() calling from_json(), which needs no frame of its own.
+                return method(self, *args, **kwargs)
+            return profiler._call(name, model_name, self._type, method, self, *args, **kwargs)
+        return wrapper
+
+    def _validate(self, *args, **kwargs):
+        if not self._validators:
+            return field_validate(self, *args, **kwargs)
+        stack = profiler._get_stack()
+        model_name = stack[-1][3] if stack else '?'
+        return profiler._call('%s.%s.validators' % (model_name, self._name), model_name, None,
+            field_validate, self, *args, **kwargs)
+
+    return [
+        (Model, 'from_json', classmethod(from_json)),
+        (Model, 'to_dict', to_dict),
+        (Model, '_validate_json', validate_json),
+        (Field, 'from_json', field_wrapper(field_from_json)),
+        (Field, 'check_json', field_wrapper(field_check_json)),
+        (Field, 'validate_value', field_wrapper(field_validate_value)),
+        (Field, 'to_json', field_wrapper(field_to_json)),
+        (Field, '_validate', _validate),
+    ]
+
+def _add_table(lines, title, stats_by_name, limit):
+    rows = sorted(six.iteritems(stats_by_name), key=lambda item: -item[1].self_time)[:limit]
+    headers = (title, 'calls', 'total ms', 'self ms', 'self blocks')
+    cells = [(name, '%d' % stats.calls, '%.3f' % (stats.total_time * 1000), '%.3f' % (stats.self_time * 1000),
+        '%d' % stats.self_blocks) for name, stats in rows]
+    widths = [max([len(header)] + [len(row[i]) for row in cells]) for i, header in enumerate(headers)]
+    lines.append('  '.join(header.ljust(width) for header, width in zip(headers, widths)).rstrip())
+    lines.append('  '.join('-' * width for width in widths))
+    for row in cells:
+        lines.append('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
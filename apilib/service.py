@@ -1,17 +1,62 @@
 from __future__ import absolute_import
 
+import collections
+import copy
+import hashlib
 import inspect
+import json
 import logging
+import threading
 import traceback
 
-import requests
+import six
 
+from . import compression
+from . import content_types
 from . import exceptions
+from . import log_format
+from . import meta
+from . import metrics
 from . import model
+from . import patch
+from . import tracing
 from . import validation
 
 logger = logging.getLogger(__name__)
 
+# Carries the schema fingerprint of a method, see apilib.meta. Clients send it with
+# requests in encodings that depend on the schema, and servers echo their own.
+SCHEMA_FINGERPRINT_HEADER = 'X-Apilib-Schema-Fingerprint'
+
+# The number of processes that decode requests of methods with decode_in_process set.
+# Defaults to the number of CPUs.
+DECODING_PROCESSES = None
+
+# Clients of methods with conditional set send the ETag of the last response they
+# received in this header to ask for a patch against it rather than the full response.
+DELTA_BASE_HEADER = 'X-Apilib-Delta-Base'
+# Status of responses carrying a patch against the base response, "IM Used" as in RFC 3229.
+DELTA_STATUS = 226
+NOT_MODIFIED_STATUS = 304
+
+# The number of recent responses of conditional methods kept as bases for patches.
+DELTA_CACHE_SIZE = 256
+
+_decoding_process_pool = None
+_decoding_process_pool_lock = threading.Lock()
+
+# requests takes a while to import, and is only needed by remote stubs. It used to be
+# imported eagerly, and so is still an attribute of this module.
+requests = model._LazyModule('requests')
+
+def get_decoding_process_pool():
+    global _decoding_process_pool
+    with _decoding_process_pool_lock:
+        if _decoding_process_pool is None:
+            from concurrent import futures
+            _decoding_process_pool = futures.ProcessPoolExecutor(DECODING_PROCESSES)
+        return _decoding_process_pool
+
 class ApiError(model.Model):
     code = model.Field(model.String())
     path = model.Field(model.String())
@@ -53,11 +98,25 @@ class ApiException(exceptions.ApilibException):
         return ApiException(ResponseCode.REQUEST_ERROR, api_errors)
 
 class MethodDescriptor(object):
-    def __init__(self, name, request_class, response_class, public=True):
+    def __init__(self, name, request_class, response_class, public=True, lazy_decode=False, decode_in_process=False,
+            conditional=False):
         self.name = name
         self.request_class = request_class
         self.response_class = response_class
         self.public = public
+        # Defer building nested request models until the handler accesses them.
+        # Validation errors are still reported before the handler is invoked.
+        self.lazy_decode = lazy_decode
+        # Decode and validate requests in a separate process, see get_decoding_process_pool(),
+        # so that large requests don't hold the GIL of the serving process. The request class
+        # must be importable by the worker processes, and validators run in those processes.
+        self.decode_in_process = decode_in_process
+        # Tag successful responses with an ETag, answer requests whose If-None-Match
+        # header names the current response with 304 Not Modified, and answer requests
+        # naming a recent response in the DELTA_BASE_HEADER with a patch against it.
+        # Only useful for methods that are polled, like reads. Handlers must not
+        # modify responses after returning them, as they may serve as bases for patches.
+        self.conditional = conditional
 
 Meth = MethodDescriptor
 Method = MethodDescriptor
@@ -82,17 +141,22 @@ class Service(object):
     def get_name(self):
         if self.name:
             return self.name
-        if not hasattr(self, '_name'):
+        return type(self)._get_class_name()
+
+    @classmethod
+    def _get_class_name(cls):
+        # Cached on the class itself, since services are often instantiated per request.
+        if '_name' not in cls.__dict__:
             # Find the first parent class that inherits from Service.
             # Any subclass could use multiple inheritance, so we don't
             # want to select a parent class in a different class hierarchy.
             # Also, one service could inherit from another service, so we want
             # to use the highest Service-subclass in the hierarchy.
-            for type_ in inspect.getmro(type(self))[1:]:
+            for type_ in inspect.getmro(cls)[1:]:
                 if Service in inspect.getmro(type_):
-                    self._name = type_.__name__
+                    cls._name = type_.__name__
                     break
-        return self._name
+        return cls._name
 
 class ServiceImplementation(Service):
     '''Usage:
@@ -102,9 +166,21 @@ class ServiceImplementation(Service):
     '''
 
     def invoke(self, method_name, request):
+        return self._invoke(method_name, self.resolve_method(method_name), self._get_method_metrics(method_name),
+            request)
+
+    def _invoke(self, method_name, method_descriptor, method_metrics, request):
         self.log_request(method_name, request)
 
-        method_descriptor = self.resolve_method(method_name)
+        if _is_instrumented():
+            response = self._call_instrumented(method_metrics, method_descriptor, request)
+        else:
+            response = self._call(method_descriptor, request)
+
+        self.log_response(method_name, request, response)
+        return response
+
+    def _call(self, method_descriptor, request):
         method = getattr(self, method_descriptor.name)
         try:
             response = method(request)
@@ -118,23 +194,235 @@ class ServiceImplementation(Service):
             if self.process_unhandled_exception(e):
                 raise
             response = method_descriptor.response_class(response_code=ResponseCode.SERVER_ERROR)
+        return response
 
-        self.log_response(method_name, request, response)
+    def _call_instrumented(self, method_metrics, method_descriptor, request):
+        start = metrics.clock() if method_metrics else None
+        if tracing.TRACER.enabled:
+            with tracing.start_span('handler') as span:
+                response = self._call(method_descriptor, request)
+                span.set_attribute('response_code', response.response_code)
+        else:
+            response = self._call(method_descriptor, request)
+        if method_metrics:
+            method_metrics.observe_duration(metrics.HANDLER, metrics.clock() - start)
+            method_metrics.count_response(response.response_code)
         return response
 
     def invoke_with_json(self, method_name, json_request):
         method_descriptor = self.resolve_method(method_name)
+        method_metrics = self._get_method_metrics(method_name)
+        response = self._invoke_with_decoder(method_name, method_descriptor, method_metrics, self._decode_json,
+            json_request)
+        return self._encode(method_metrics, response, _to_json, sized=False)
+
+    def invoke_with_json_str(self, method_name, json_str):
+        '''Like invoke_with_json(), but takes and returns encoded JSON.
+
+        RawJson fields of the request are kept as the original text and written
+        verbatim into the response.
+        '''
+        method_descriptor = self.resolve_method(method_name)
+        method_metrics = self._get_method_metrics(method_name)
+        if method_metrics:
+            method_metrics.request_size.observe(len(json_str))
+        if method_descriptor.decode_in_process:
+            response = self._invoke_with_decoder(method_name, method_descriptor, method_metrics,
+                lambda descriptor, error_context, validation_context: self._decode_in_process(
+                    descriptor, error_context, json_str, content_types.JSON_CONTENT_TYPE))
+        else:
+            def decode(descriptor, error_context, validation_context):
+                json_request = descriptor.request_class.parse_json_str(json_str)
+                return descriptor.request_class.from_json(
+                    json_request, error_context, validation_context, lazy=descriptor.lazy_decode)
+            response = self._invoke_with_decoder(method_name, method_descriptor, method_metrics, decode)
+        return self._encode(method_metrics, response, lambda response: response.to_json_str())
+
+    def invoke_with_body(self, method_name, body, headers=None, stream=False):
+        '''Invokes a method with an encoded request body, for use by server adapters.
+
+        The request is decoded according to its Content-Type header (JSON if absent),
+        and the response is encoded in the content type named by the Accept header,
+        falling back to the request's content type. Raises
+        UnsupportedContentTypeException for unknown request content types.
+
+        Request bodies are decompressed according to their Content-Encoding header,
+        raising UnsupportedContentEncodingException for unknown encodings. Responses
+        are compressed if the Accept-Encoding header allows it and they are at least
+        compression.COMPRESSION_THRESHOLD bytes. If stream is True, the body of a
+        compressed response is an iterator of chunks rather than bytes.
+
+        For methods with conditional set, the response may instead be a
+        NOT_MODIFIED_STATUS response with an empty body, or a DELTA_STATUS response
+        with a patch in JSON, see MethodDescriptor.
+
+        Calls are traced as a continuation of the trace in the traceparent header,
+        if any, see the tracing module.
+        '''
+        headers = _lowercase_keys(headers)
+        if not tracing.TRACER.enabled:
+            return self._invoke_with_body(method_name, body, headers, stream)
+        parent = tracing.SpanContext.from_traceparent(headers.get(tracing.TRACEPARENT_HEADER))
+        with tracing.start_span('%s.%s' % (self.get_name(), method_name), parent, tracing.SERVER) as span:
+            response = self._invoke_with_body(method_name, body, headers, stream)
+            span.set_attribute('status', response.status)
+            return response
+
+    def _invoke_with_body(self, method_name, body, headers, stream):
+        method_descriptor = self.resolve_method(method_name)
+        method_metrics = self._get_method_metrics(method_name)
+        if method_metrics:
+            method_metrics.request_size.observe(len(body))
+        request_codec = content_types.get_content_codec(headers.get('content-type'))
+        content_encoding = headers.get('content-encoding')
+        compression.check_encoding(content_encoding)
+        response_codec = content_types.negotiate_content_codec(headers.get('accept'), request_codec)
+        response_headers = {}
+        client_fingerprint = headers.get(SCHEMA_FINGERPRINT_HEADER.lower())
+        if client_fingerprint:
+            fingerprint = meta.get_method_fingerprint(method_descriptor)
+            response_headers[SCHEMA_FINGERPRINT_HEADER] = fingerprint
+            if client_fingerprint != fingerprint:
+                # Respond in JSON, which doesn't depend on the schema.
+                response_codec = content_types.get_content_codec(content_types.JSON_CONTENT_TYPE)
+                response_headers['Content-Type'] = response_codec.content_type
+                return self._encoded_response(response_codec.encode(method_descriptor.response_class(
+                    response_code=ResponseCode.REQUEST_ERROR,
+                    errors=[ApiError(code=validation.CommonErrorCodes.SCHEMA_MISMATCH,
+                        message='Schema fingerprint %s does not match the server\'s schema fingerprint %s' % (
+                            client_fingerprint, fingerprint))])), response_headers, headers, stream)
+
+        def decode(descriptor, error_context, validation_context):
+            if descriptor.decode_in_process:
+                return self._decode_in_process(
+                    descriptor, error_context, body, request_codec.content_type, content_encoding)
+            try:
+                request_body = compression.decompress(body, content_encoding)
+            except ValueError as e:
+                error_context.add_error(validation.CommonErrorCodes.INVALID_VALUE,
+                    'Unable to decompress %s body: %s' % (content_encoding, e))
+                return None
+            return request_codec.decode(
+                descriptor.request_class, request_body, error_context, validation_context, lazy=descriptor.lazy_decode)
+
+        response = self._invoke_with_decoder(method_name, method_descriptor, method_metrics, decode)
+        response_headers['Content-Type'] = response_codec.content_type
+        body = self._encode(method_metrics, response, response_codec.encode) or b''
+        if response and response.response_code == ResponseCode.SUCCESS and method_descriptor.conditional:
+            return self._conditional_response(method_name, response, body, response_headers, headers, stream)
+        return self._encoded_response(body, response_headers, headers, stream)
+
+    def _encode(self, method_metrics, response, encode, sized=True):
+        '''Encodes a response, recording its size in the metrics if sized.'''
+        if not response:
+            return None
+        if not _is_instrumented():
+            return encode(response)
+        start = metrics.clock() if method_metrics else None
+        if tracing.TRACER.enabled:
+            with tracing.start_span('encode'):
+                encoded = encode(response)
+        else:
+            encoded = encode(response)
+        if method_metrics:
+            method_metrics.observe_duration(metrics.ENCODE, metrics.clock() - start)
+            if sized:
+                method_metrics.response_size.observe(len(encoded))
+        return encoded
+
+    def _get_method_metrics(self, method_name):
+        if not metrics.ENABLED:
+            return None
+        return metrics.registry.get_method_metrics(self.get_name(), method_name)
+
+    def _conditional_response(self, method_name, response, body, response_headers, request_headers, stream):
+        etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+        response_headers['ETag'] = etag
+        if_none_match = request_headers.get('if-none-match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in _parse_etags(if_none_match)):
+            return EncodedResponse(b'', response_headers, status=NOT_MODIFIED_STATUS)
+        cache_key = (self.get_name(), method_name)
+        _delta_cache.put(cache_key + (etag,), response)
+        base_etag = request_headers.get(DELTA_BASE_HEADER.lower())
+        base = _delta_cache.get(cache_key + (base_etag,)) if base_etag else None
+        if base is not None and type(base) is type(response):
+            patch_body = json.dumps(base.diff(response).to_json()).encode('utf-8')
+            # Changes to most of a response can take more space as a patch.
+            if len(patch_body) < len(body):
+                response_headers['Content-Type'] = content_types.JSON_CONTENT_TYPE
+                response_headers[DELTA_BASE_HEADER] = base_etag
+                return self._encoded_response(patch_body, response_headers, request_headers, stream, DELTA_STATUS)
+        return self._encoded_response(body, response_headers, request_headers, stream)
+
+    def _encoded_response(self, body, response_headers, request_headers, stream, status=200):
+        accept_encoding = request_headers.get('accept-encoding')
+        if accept_encoding is not None:
+            # Let the client know it can compress its requests.
+            response_headers['Accept-Encoding'] = ', '.join(compression.SUPPORTED_ENCODINGS)
+            response_headers['Vary'] = 'Accept-Encoding'
+            encoding = compression.negotiate_encoding(accept_encoding)
+            if encoding and compression.should_compress(body):
+                response_headers['Content-Encoding'] = encoding
+                if stream:
+                    body = compression.compress_stream(body, encoding)
+                else:
+                    body = compression.compress(body, encoding)
+        return EncodedResponse(body, response_headers, status)
+
+    def _decode_json(self, descriptor, error_context, validation_context, json_request):
+        if descriptor.decode_in_process:
+            return self._decode_in_process(descriptor, error_context, json_request)
+        return descriptor.request_class.from_json(
+            json_request, error_context, validation_context, lazy=descriptor.lazy_decode)
+
+    def _decode_in_process(self, descriptor, error_context, body, content_type=None, content_encoding=None):
+        future = get_decoding_process_pool().submit(_decode_request, descriptor.request_class,
+            self.get_name(), descriptor.name, body, content_type, content_encoding)
+        state, errors = future.result()
+        error_context.errors.extend(validation.ValidationError(*error) for error in errors)
+        return descriptor.request_class._from_state(state) if state is not None else None
+
+    def _invoke_with_decoder(self, method_name, method_descriptor, method_metrics, decode, *args):
+        '''Decodes the request with decode(descriptor, error_context, validation_context, *args)
+        and invokes the method with it, or returns a REQUEST_ERROR response.
+
+        The method's descriptor and metrics are resolved once by the caller and passed
+        down, since looking up the metrics costs a registry lookup.
+        '''
         error_context = validation.ErrorContext()
         validation_context = validation.ValidationContext(service=self.get_name(), method=method_name)
-        request = method_descriptor.request_class.from_json(json_request, error_context, validation_context)
+        if _is_instrumented():
+            request = self._decode_instrumented(method_metrics, method_descriptor, decode, args, error_context,
+                validation_context)
+        else:
+            request = decode(method_descriptor, error_context, validation_context, *args)
         validation_errors = error_context.all_errors()
         if validation_errors:
-            response = method_descriptor.response_class(
+            if method_metrics:
+                method_metrics.count_response(ResponseCode.REQUEST_ERROR)
+            return method_descriptor.response_class(
                 response_code=ResponseCode.REQUEST_ERROR,
                 errors=[ApiError(code=ve.code, path=ve.path, message=ve.msg) for ve in validation_errors])
+        return self._invoke(method_name, method_descriptor, method_metrics, request)
+
+    def _decode_instrumented(self, method_metrics, method_descriptor, decode, args, error_context, validation_context):
+        if method_metrics:
+            timer = validation_context.timer = validation.ValidationTimer()
+            start = metrics.clock()
+        if tracing.TRACER.enabled:
+            with tracing.start_span('decode'):
+                request = decode(method_descriptor, error_context, validation_context, *args)
         else:
-            response = self.invoke(method_name, request)
-        return response.to_json() if response else None
+            request = decode(method_descriptor, error_context, validation_context, *args)
+        if method_metrics:
+            decode_time = metrics.clock() - start
+            if method_descriptor.decode_in_process:
+                # Validators ran in the decoding process, where they weren't timed.
+                method_metrics.observe_duration(metrics.DECODE, decode_time)
+            else:
+                method_metrics.observe_duration(metrics.DECODE, decode_time - timer.seconds)
+                method_metrics.observe_duration(metrics.VALIDATE, timer.seconds)
+        return request
 
     def resolve_method(self, method_name):
         descriptor = self.methods.get(method_name)
@@ -152,19 +440,29 @@ class ServiceImplementation(Service):
         return True
 
     def log_request(self, method_name, request):
-        logger.debug('API service request: %s.%s\n%s',
-            self.__class__.__name__, method_name, request)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('API service request: %s.%s\n%s',
+                self.__class__.__name__, method_name, log_format.LogRepr(request))
 
     def log_response(self, method_name, request, response):
         if response.response_code == ResponseCode.SERVER_ERROR:
-            logger.error('Server error in API call %s.%s\nRequest:\n%s\nResponse: %s\n%s',
-                self.__class__.__name__,
-                method_name,
-                request.to_json_str() if request else None,
-                response.to_json_str() if response else None,
-                traceback.format_exc() or '')
-        else:
-            logger.debug('API service response:\n%s', response)
+            if logger.isEnabledFor(logging.ERROR):
+                logger.error('Server error in API call %s.%s\nRequest:\n%s\nResponse: %s\n%s',
+                    self.__class__.__name__,
+                    method_name,
+                    log_format.LogRepr(request) if request else None,
+                    log_format.LogRepr(response) if response else None,
+                    traceback.format_exc() or '')
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug('API service response:\n%s', log_format.LogRepr(response))
+
+class EncodedResponse(object):
+    '''An encoded response body along with the headers to send it with.'''
+
+    def __init__(self, body, headers, status=200):
+        self.body = body
+        self.headers = headers
+        self.status = status
 
 class RemoteServiceStub(Service):
     '''Usage:
@@ -173,17 +471,176 @@ class RemoteServiceStub(Service):
 
     service = RemoteFooService('https://remoteserver.com')
     foo_response = service.foo(FooRequest(...))
+
+    Pass content_type=apilib.BINARY_CONTENT_TYPE to use the compact binary
+    encoding when the remote service is also implemented with apilib.
+
+    Requests are compressed once the remote service has advertised that it accepts
+    compressed requests. Pass compress_requests=False to disable this.
+
+    Pass conditional_requests=True to remember the last response of each method and
+    ask for only the changes to it, for methods served with conditional set. Keep
+    the stub around between calls for this to have an effect.
+
+    When tracing is enabled, calls are recorded as client spans whose context is
+    sent in the traceparent header, see the tracing module.
     '''
-    def __init__(self, base_url):
+    content_type = content_types.JSON_CONTENT_TYPE
+    compress_requests = True
+    conditional_requests = False
+    # The encoding the remote service accepts for requests, learned from its responses.
+    _request_encoding = None
+
+    def __init__(self, base_url, content_type=content_types.JSON_CONTENT_TYPE, compress_requests=True,
+            conditional_requests=False):
         self.base_url = base_url.rstrip('/')
+        self.content_type = content_type
+        self.compress_requests = compress_requests
+        self.conditional_requests = conditional_requests
+        # Method name -> (ETag, response) of the last successful response.
+        self._last_responses = {}
 
     def _invoke(self, method_descriptor, request):
+        if not tracing.TRACER.enabled:
+            return self._call(method_descriptor, request, {})
+        with tracing.start_span('%s.%s' % (self.get_name(), method_descriptor.name), kind=tracing.CLIENT) as span:
+            return self._call(method_descriptor, request, {tracing.TRACEPARENT_HEADER: span.context.to_traceparent()})
+
+    def _call(self, method_descriptor, request, headers):
         url = '%s%s/%s' % (self.base_url, self.path.rstrip('/'), method_descriptor.name)
-        response = requests.post(url, data=request.to_json_str(), headers={'Content-Type': 'application/json'})
-        return method_descriptor.response_class.from_json(response.json())
+        last = self._last_responses.get(method_descriptor.name) if self.conditional_requests else None
+        if last:
+            headers['If-None-Match'] = last[0]
+            headers[DELTA_BASE_HEADER] = last[0]
+        if self.content_type != content_types.JSON_CONTENT_TYPE:
+            response = self._post_with_codec(url, method_descriptor, request, headers)
+        else:
+            headers['Content-Type'] = 'application/json'
+            response = self._post(url, request.to_json_str(), headers)
+
+        if last and response.status_code == NOT_MODIFIED_STATUS:
+            result = last[1]
+        elif last and response.status_code == DELTA_STATUS:
+            delta = patch.Patch.from_json(json.loads(response.content.decode('utf-8')), method_descriptor.response_class)
+            result = last[1].apply_patch(delta)
+        elif self.content_type != content_types.JSON_CONTENT_TYPE:
+            response_codec = content_types.get_content_codec(response.headers.get('Content-Type'))
+            result = response_codec.decode(method_descriptor.response_class, response.content)
+        elif method_descriptor.response_class._contains_raw_json():
+            result = method_descriptor.response_class.from_json_str(response.text)
+        else:
+            result = method_descriptor.response_class.from_json(response.json())
+
+        if not self.conditional_requests:
+            return result
+        etag = response.headers.get('ETag')
+        if etag and result.response_code == ResponseCode.SUCCESS:
+            self._last_responses[method_descriptor.name] = (etag, result)
+        # The caller may modify the response, so it must not be the remembered one.
+        return copy.deepcopy(result)
+
+    def _post_with_codec(self, url, method_descriptor, request, headers):
+        codec = content_types.get_content_codec(self.content_type)
+        headers.update({'Content-Type': codec.content_type, 'Accept': codec.content_type})
+        if codec.requires_matching_schema:
+            fingerprint = meta.get_method_fingerprint(method_descriptor)
+            headers[SCHEMA_FINGERPRINT_HEADER] = fingerprint
+        response = self._post(url, codec.encode(request), headers)
+        server_fingerprint = response.headers.get(SCHEMA_FINGERPRINT_HEADER)
+        if codec.requires_matching_schema and server_fingerprint and server_fingerprint != fingerprint:
+            raise exceptions.SchemaMismatchException(
+                'Schema of %s.%s differs between client (%s) and server (%s)' % (
+                    type(self).__name__, method_descriptor.name, fingerprint, server_fingerprint))
+        return response
+
+    def _post(self, url, data, headers):
+        # Responses are decompressed by requests, which sends Accept-Encoding by default.
+        if self.compress_requests and self._request_encoding and compression.should_compress(data):
+            if isinstance(data, six.text_type):
+                data = data.encode('utf-8')
+            data = compression.compress(data, self._request_encoding)
+            headers['Content-Encoding'] = self._request_encoding
+        response = requests.post(url, data=data, headers=headers)
+        self._request_encoding = compression.negotiate_encoding(response.headers.get('Accept-Encoding'))
+        return response
 
     def __getattr__(self, method_name):
         descriptor = self.methods.get(method_name)
         if not descriptor:
             raise exceptions.MethodNotFoundException('No method named "%s" defined on this service' % method_name)
         return lambda request: self._invoke(descriptor, request)
+
+def _decode_request(request_class, service_name, method_name, body, content_type, content_encoding):
+    '''Decodes and validates a request in a worker process.
+
+    The body is either encoded in the given content type or, if there is none,
+    already parsed JSON. Returns the state of the request, see Model._get_state(),
+    along with any errors as (path, code, message) tuples.
+    '''
+    error_context = validation.ErrorContext()
+    validation_context = validation.ValidationContext(service=service_name, method=method_name)
+    request = None
+    if content_type is None:
+        request = request_class.from_json(body, error_context, validation_context)
+    else:
+        try:
+            body = compression.decompress(body, content_encoding)
+        except ValueError as e:
+            error_context.add_error(validation.CommonErrorCodes.INVALID_VALUE,
+                'Unable to decompress %s body: %s' % (content_encoding, e))
+            body = None
+        if body is not None:
+            request = content_types.get_content_codec(content_type).decode(
+                request_class, body, error_context, validation_context)
+    errors = [(error.path, error.code, error.msg) for error in error_context.all_errors()]
+    if errors or request is None:
+        return None, errors
+    return request._get_state(), errors
+
+def _is_instrumented():
+    # Checked once per stage, so that calls cost no more than before metrics and
+    # tracing existed while both are disabled.
+    return metrics.ENABLED or tracing.TRACER.enabled
+
+def _to_json(response):
+    return response.to_json()
+
+def _lowercase_keys(headers):
+    return {k.lower(): v for k, v in (headers or {}).items()}
+
+def _parse_etags(header):
+    # If-None-Match uses the weak comparison, which ignores the W/ prefix.
+    etags = []
+    for etag in header.split(','):
+        etag = etag.strip()
+        if etag.startswith('W/'):
+            etag = etag[2:]
+        etags.append(etag)
+    return etags
+
+class _ResponseCache(object):
+    '''A thread-safe LRU cache of responses that serve as bases for patches.'''
+
+    def __init__(self):
+        self._responses = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            response = self._responses.pop(key, None)
+            if response is not None:
+                self._responses[key] = response
+            return response
+
+    def put(self, key, response):
+        with self._lock:
+            self._responses.pop(key, None)
+            self._responses[key] = response
+            while len(self._responses) > DELTA_CACHE_SIZE:
+                self._responses.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._responses.clear()
+
+_delta_cache = _ResponseCache()
@@ -0,0 +1,218 @@
+# Tracing of calls across services, propagated with the W3C traceparent header.
+#
+# RemoteServiceStub records a span for each call and sends its context in the
+# traceparent header. ServiceImplementation.invoke_with_body() continues the trace
+# from that header, recording a server span with child spans for decoding the
+# request, running the handler and encoding the response. Calls that the handler
+# makes through remote stubs become children of the handler span, so one trace
+# covers a whole chain of services.
+#
+# Traces that the caller's traceparent header marks as not sampled are propagated
+# but not recorded.
+#
+# By default spans aren't recorded. Set TRACER to a Tracer subclass that exports
+# finished spans, or to an InMemoryTracer to inspect them in tests:
+#
+#   apilib.tracing.TRACER = apilib.tracing.InMemoryTracer()
+
+from __future__ import absolute_import
+
+import random
+import re
+import threading
+import time
+import timeit
+
+TRACEPARENT_HEADER = 'traceparent'
+
+SERVER = 'server'
+CLIENT = 'client'
+INTERNAL = 'internal'
+
+_TRACEPARENT_RE = re.compile(r'^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$')
+_INVALID_TRACE_ID = '0' * 32
+_INVALID_SPAN_ID = '0' * 16
+_SAMPLED = 0x01
+
+_clock = timeit.default_timer
+_random = random.SystemRandom()
+_local = threading.local()
+
+class SpanContext(object):
+    '''The identity of a span, as propagated between services.'''
+    __slots__ = ('trace_id', 'span_id', 'trace_flags')
+
+    def __init__(self, trace_id, span_id, trace_flags=_SAMPLED):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.trace_flags = trace_flags
+
+    @property
+    def sampled(self):
+        return bool(self.trace_flags & _SAMPLED)
+
+    def to_traceparent(self):
+        return '00-%s-%s-%02x' % (self.trace_id, self.span_id, self.trace_flags)
+
+    @classmethod
+    def from_traceparent(cls, header):
+        '''Parses a traceparent header, returning None if it's missing or invalid.'''
+        match = _TRACEPARENT_RE.match(header.strip().lower()) if header else None
+        if not match:
+            return None
+        version, trace_id, span_id, flags, rest = match.groups()
+        # Later versions may append fields, but version 00 has exactly four.
+        if version == 'ff' or (version == '00' and rest):
+            return None
+        if trace_id == _INVALID_TRACE_ID or span_id == _INVALID_SPAN_ID:
+            return None
+        return cls(trace_id, span_id, int(flags, 16))
+
+    def __eq__(self, other):
+        return type(self) == type(other) and self.to_traceparent() == other.to_traceparent()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<SpanContext: %s>' % self.to_traceparent()
+
+class Span(object):
+    '''A timed operation within a trace.
+
+    Use spans as context managers, which makes them the current span while active
+    and finishes them on exit, recording any exception. Spans whose context isn't
+    sampled, e.g. because a caller's traceparent header said so, are not recorded,
+    but still propagate their context to child spans and remote calls.
+    '''
+
+    def __init__(self, tracer, name, context, parent_id=None, kind=INTERNAL, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self.end_time = None
+        self._start = _clock()
+        self.duration = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self):
+        if self.end_time is not None:
+            return
+        self.duration = _clock() - self._start
+        self.end_time = self.start_time + self.duration
+        if self.context.sampled:
+            self.tracer.record(self)
+
+    def __enter__(self):
+        _get_stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        stack = _get_stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        if exc_type is not None:
+            self.set_attribute('error', '%s: %s' % (exc_type.__name__, exc_value))
+        self.finish()
+        return False
+
+    def __repr__(self):
+        return '<Span: %s %s>' % (self.name, self.context.to_traceparent())
+
+class _NoopSpan(object):
+    '''Stands in for spans when tracing is disabled.'''
+    context = None
+    attributes = {}
+
+    def set_attribute(self, key, value):
+        pass
+
+    def finish(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+class Tracer(object):
+    '''Creates spans. Subclasses set enabled and override record() to export finished spans.
+
+    The base class creates no spans, so that disabled tracing costs next to nothing.
+    '''
+    enabled = False
+
+    def start_span(self, name, parent=None, kind=INTERNAL, attributes=None):
+        '''Starts a span, which is a child of parent, or else of the current span.
+
+        The parent is a Span or a SpanContext, e.g. from a traceparent header.
+        '''
+        if not self.enabled:
+            return NOOP_SPAN
+        if parent is None:
+            parent = get_current_span()
+        parent_context = parent.context if isinstance(parent, Span) else parent
+        if parent_context is None:
+            context = SpanContext(_new_id(128), _new_id(64))
+            parent_id = None
+        else:
+            context = SpanContext(parent_context.trace_id, _new_id(64), parent_context.trace_flags)
+            parent_id = parent_context.span_id
+        return Span(self, name, context, parent_id, kind, attributes)
+
+    def record(self, span):
+        pass
+
+class InMemoryTracer(Tracer):
+    '''Keeps finished spans in memory, for tests and for inspecting traces locally.'''
+    enabled = True
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def get_spans(self, name=None, kind=None, trace_id=None):
+        with self._lock:
+            spans = list(self.spans)
+        return [span for span in spans
+            if (name is None or span.name == name) and (kind is None or span.kind == kind)
+                and (trace_id is None or span.context.trace_id == trace_id)]
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+
+# The tracer used by services and remote stubs.
+TRACER = Tracer()
+
+def start_span(name, parent=None, kind=INTERNAL, attributes=None):
+    '''Starts a span with TRACER, see Tracer.start_span().'''
+    return TRACER.start_span(name, parent, kind, attributes)
+
+def get_current_span():
+    '''Returns the innermost active span of the current thread, or None.'''
+    stack = _get_stack()
+    return stack[-1] if stack else None
+
+def _get_stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+def _new_id(bits):
+    # Ids must not be all zeros.
+    return '%0*x' % (bits // 4, _random.getrandbits(bits) or 1)
@@ -70,18 +70,29 @@ class CommonErrorCodes(object):
     DUPLICATE_VALUE = 'DUPLICATE_VALUE'
     VALUE_NOT_IN_RANGE = 'VALUE_NOT_IN_RANGE'
     REPEATED = 'REPEATED'
+    SCHEMA_MISMATCH = 'SCHEMA_MISMATCH'
 
 class ValidationContext(object):
-    def __init__(self, service=None, method=None, operator=None, parent=None):
+    # Set to a ValidationTimer to add up the time spent in field validators.
+    timer = None
+
+    def __init__(self, service=None, method=None, operator=None, parent=None, timer=None):
         self.service = service
         self.method = method
         self.operator = operator
         # Note that the parent is a dictionary and not a model object, since
         # the parent cannot be parsed into a model until its field have been validated.
         self.parent = parent
+        self.timer = timer
 
     def for_parent(self, parent, operator=None):
-        return ValidationContext(self.service, self.method, operator or self.operator, parent)
+        return ValidationContext(self.service, self.method, operator or self.operator, parent, self.timer)
+
+class ValidationTimer(object):
+    '''The time spent in field validators, in seconds, see ValidationContext.timer.'''
+
+    def __init__(self):
+        self.seconds = 0.0
 
 class InvalidMethodSpec(Exception):
     '''Method specs have the form [service].[method]/[operator]. The service and operator are optional'''
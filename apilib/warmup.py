@@ -0,0 +1,142 @@
+# Eager initialization of services, so that the first requests aren't slow.
+#
+# Models populate their field tables, services look up their names, and codecs and
+# fingerprints are computed the first time they're needed. warm_up() does all of
+# that up front for the models reachable from some services, and decodes and
+# encodes a generated request and response of each method to run any remaining
+# first-use initialization, like that of the datetime parser. Neither field
+# validators nor service handlers run during the warm-up. Servers that fork
+# workers should warm up before forking, so workers share the result:
+#
+#   report = apilib.warmup.warm_up([StudentServiceImpl, CourseServiceImpl], freeze=True)
+#   logging.info('Warmed up:\n%s', report.format_report())
+
+from __future__ import absolute_import
+
+import gc
+import inspect
+import timeit
+
+import six
+
+from . import exceptions
+from . import meta
+from . import payloads
+from .service import RemoteServiceStub
+from .service import ServiceImplementation
+from .validation import ErrorContext
+from .validation import ValidationContext
+
+_clock = timeit.default_timer
+
+class WarmUpReport(object):
+    '''How long each step of a warm-up took.
+
+    steps holds (name, seconds) pairs in the order the steps ran.
+    '''
+
+    def __init__(self):
+        self.steps = []
+        self.num_models = 0
+        self.num_methods = 0
+
+    @property
+    def total_time(self):
+        return sum(seconds for _, seconds in self.steps)
+
+    def format_report(self):
+        lines = ['Warmed up %d models of %d methods in %.1fms' % (
+            self.num_models, self.num_methods, self.total_time * 1000)]
+        lines.extend('  %-12s %.1fms' % (name, seconds * 1000) for name, seconds in self.steps)
+        return '\n'.join(lines)
+
+    def _time(self, name, func, *args):
+        start = _clock()
+        result = func(*args)
+        self.steps.append((name, _clock() - start))
+        return result
+
+def warm_up(services, exercise=True, freeze=False):
+    '''Initializes everything the given services need to handle requests.
+
+    services are service classes or instances. With exercise, a generated request
+    and response of each method are decoded and encoded, which runs first-use
+    initialization outside of apilib too. They are decoded without a validation
+    context, so field validators don't run, and no handlers are invoked. With
+    freeze, objects that exist after the warm-up are moved out of reach of the
+    garbage collector with gc.freeze(), on Python versions that have it, so that
+    collections in forked workers don't write to, and thereby copy, the memory
+    pages they share with the parent.
+
+    Returns a WarmUpReport.
+    '''
+    service_classes = [service if inspect.isclass(service) else type(service) for service in services]
+    report = WarmUpReport()
+    model_classes = report._time('models', _init_models, service_classes)
+    report._time('services', _init_services, service_classes)
+    report._time('fingerprints', _init_fingerprints, service_classes)
+    report._time('codecs', _init_codecs, model_classes)
+    if exercise:
+        report._time('exercise', _exercise, service_classes)
+    if freeze and hasattr(gc, 'freeze'):
+        report._time('freeze', _freeze)
+    report.num_models = len(model_classes)
+    report.num_methods = sum(len(service_class.methods) for service_class in service_classes)
+    return report
+
+def _init_models(service_classes):
+    model_classes = meta.get_model_classes_from_services(service_classes)
+    for model_class in model_classes:
+        model_class.get_numbered_fields()
+        model_class._contains_raw_json()
+        model_class._get_state_layout()
+        model_class._get_mutable_field_names()
+    return model_classes
+
+def _init_services(service_classes):
+    for service_class in service_classes:
+        _get_service_name(service_class)
+        if issubclass(service_class, RemoteServiceStub):
+            # Stubs import requests on their first call otherwise.
+            import requests
+
+def _init_fingerprints(service_classes):
+    for service_class in service_classes:
+        meta.get_service_fingerprint(service_class)
+
+def _init_codecs(model_classes):
+    # Imported here as in Model.to_bytes(), since the binary encoding is optional.
+    from . import binary
+    for model_class in model_classes:
+        binary.get_model_codec(model_class).init()
+
+def _exercise(service_classes):
+    for service_class in service_classes:
+        for descriptor in six.itervalues(service_class.methods):
+            context = ValidationContext(service=_get_service_name(service_class), method=descriptor.name)
+            generator = payloads.PayloadGenerator(seed=0, context=context, max_depth=1, max_items=1)
+            for model_class in [descriptor.request_class, descriptor.response_class]:
+                if model_class is None:
+                    continue
+                try:
+                    payload = generator.generate(model_class)
+                except exceptions.ApilibException:
+                    # Custom field types can't be generated, and are left to warm up on first use.
+                    continue
+                # Without a validation context, so that no validators run in the process
+                # that workers are forked from.
+                obj = model_class.from_json(payload, ErrorContext())
+                if obj is not None:
+                    obj.to_json_str()
+
+def _freeze():
+    gc.collect()
+    gc.freeze()
+
+def _get_service_name(service_class):
+    if service_class.name:
+        return service_class.name
+    # Only implementations and stubs are named after the service they derive from.
+    if issubclass(service_class, (ServiceImplementation, RemoteServiceStub)):
+        return service_class._get_class_name()
+    return service_class.__name__
@@ -0,0 +1,43 @@
+# Compares the size and speed of the JSON, binary and MessagePack encodings.
+# MessagePack is skipped if the msgpack module isn't installed.
+#
+# Usage: python -m benchmarks.codec_benchmark
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import json
+
+from apilib import msgpack_encoding
+
+from . import common
+from . import schemas
+
+def get_encodings():
+    cls = schemas.ListOrdersResponse
+    encodings = [
+        ('json', lambda m: m.to_json_str(), lambda s: cls.from_json(json.loads(s))),
+        ('binary', lambda m: m.to_bytes(), cls.from_bytes),
+    ]
+    if msgpack_encoding.msgpack:
+        encodings.append(('msgpack', lambda m: m.to_msgpack(), cls.from_msgpack))
+    return encodings
+
+def run():
+    rows = []
+    for num_orders in (1, 10, 100, 1000):
+        response = schemas.make_list_orders_response(num_orders)
+        min_time = 0.1 if num_orders < 1000 else 0.5
+        for name, encode, decode in get_encodings():
+            data = encode(response)
+            rows.append([
+                num_orders,
+                name,
+                len(data),
+                common.measure(lambda: encode(response), min_time),
+                common.measure(lambda: decode(data), min_time),
+            ])
+    common.print_table(['orders', 'encoding', 'bytes', 'enc/s', 'dec/s'], rows)
+
+if __name__ == '__main__':
+    run()
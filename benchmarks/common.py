@@ -0,0 +1,34 @@
+# Helpers shared by the benchmark scripts.
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import timeit
+
+def measure(func, min_time=0.2, repeat=5):
+    '''Returns the best observed throughput of func, in calls per second.'''
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time / 10:
+            break
+        number *= 2
+    number = max(1, int(number * min_time / elapsed))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return number / best
+
+def print_table(headers, rows):
+    rows = [[format_cell(cell) for cell in row] for row in rows]
+    widths = [max(len(str(h)), *(len(row[i]) for row in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print('  '.join('-' * w for w in widths))
+    for row in rows:
+        print('  '.join(cell.ljust(w) for cell, w in zip(row, widths)))
+
+def format_cell(cell):
+    if isinstance(cell, float):
+        return '%.1f' % cell if cell < 100 else '{:,.0f}'.format(cell)
+    if isinstance(cell, int):
+        return '{:,}'.format(cell)
+    return str(cell)
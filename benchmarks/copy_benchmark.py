@@ -0,0 +1,69 @@
+# Compares pickling and copying of models with Python's generic implementations,
+# which are used when the Model methods that customize them are removed, and
+# changing a nested field by copying with Model.evolve() versus deepcopy().
+#
+# Usage: python -m benchmarks.copy_benchmark
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import contextlib
+import copy
+import pickle
+
+import apilib
+
+from . import common
+from . import schemas
+
+@contextlib.contextmanager
+def generic_protocols():
+    methods = {name: apilib.Model.__dict__[name] for name in ('__reduce__', '__copy__', '__deepcopy__')}
+    for name in methods:
+        delattr(apilib.Model, name)
+    try:
+        yield
+    finally:
+        for name, method in methods.items():
+            setattr(apilib.Model, name, method)
+
+def measure(response, min_time):
+    data = pickle.dumps(response, pickle.HIGHEST_PROTOCOL)
+    return [
+        len(data),
+        common.measure(lambda: pickle.dumps(response, pickle.HIGHEST_PROTOCOL), min_time),
+        common.measure(lambda: pickle.loads(data), min_time),
+        common.measure(lambda: copy.deepcopy(response), min_time),
+    ]
+
+def modify_with_deepcopy(response):
+    response = copy.deepcopy(response)
+    response.orders[0].shipping_address.city = 'Paris'
+    return response
+
+def modify_with_evolve(response):
+    return response.evolve(orders__0__shipping_address__city='Paris')
+
+def run():
+    rows = []
+    for num_orders in (1, 10, 100, 1000):
+        response = schemas.make_list_orders_response(num_orders)
+        min_time = 0.1 if num_orders < 1000 else 0.5
+        with generic_protocols():
+            rows.append([num_orders, 'generic'] + measure(response, min_time))
+        rows.append([num_orders, 'apilib'] + measure(response, min_time))
+    common.print_table(['orders', 'protocol', 'pickle bytes', 'dumps/s', 'loads/s', 'deepcopy/s'], rows)
+    print()
+
+    rows = []
+    for num_orders in (1, 10, 100, 1000):
+        response = schemas.make_list_orders_response(num_orders)
+        rows.append([
+            num_orders,
+            common.measure(lambda: modify_with_deepcopy(response), 0.1),
+            common.measure(lambda: modify_with_evolve(response), 0.1),
+        ])
+    common.print_table(['orders', 'deepcopy and set/s', 'evolve/s'], rows)
+
+if __name__ == '__main__':
+    run()
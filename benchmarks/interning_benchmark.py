@@ -0,0 +1,64 @@
+# Compares the memory held by decoded responses with and without interning of
+# String(intern=True) and Enum values, along with the cost to decoding speed.
+#
+# Usage: python -m benchmarks.interning_benchmark
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import contextlib
+import gc
+import json
+import tracemalloc
+
+from . import common
+from . import schemas
+
+class PassThroughValues(dict):
+    '''Enum values that map each value to the one being looked up.'''
+
+    def get(self, key, default=None):
+        return key if key in self else default
+
+@contextlib.contextmanager
+def interning_disabled():
+    enum_type = schemas.Order.status.get_type()
+    canonical_values = enum_type._canonical_values
+    string_types = [schemas.Address.city.get_type(), schemas.Address.country_code.get_type(),
+        schemas.Order.tags.get_type().get_item_type()]
+    enum_type._canonical_values = PassThroughValues(canonical_values)
+    for string_type in string_types:
+        string_type.intern = False
+    try:
+        yield
+    finally:
+        enum_type._canonical_values = canonical_values
+        for string_type in string_types:
+            string_type.intern = True
+
+def decode(json_str):
+    return schemas.ListOrdersResponse.from_json(json.loads(json_str))
+
+def measure(json_str, min_time):
+    # Decoded strings are the ones created by the JSON parser, so measure the memory
+    # that remains allocated once the parsed JSON is discarded.
+    tracemalloc.start()
+    response = decode(json_str)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del response
+    return [size, common.measure(lambda: decode(json_str), min_time, repeat=3)]
+
+def run():
+    rows = []
+    for num_orders in (100, 1000, 10000):
+        json_str = schemas.make_list_orders_response(num_orders).to_json_str()
+        min_time = 0.1 if num_orders < 1000 else 0.5
+        with interning_disabled():
+            rows.append([num_orders, 'off'] + measure(json_str, min_time))
+        rows.append([num_orders, 'on'] + measure(json_str, min_time))
+    common.print_table(['orders', 'interning', 'bytes', 'dec/s'], rows)
+
+if __name__ == '__main__':
+    run()
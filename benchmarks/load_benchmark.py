@@ -0,0 +1,37 @@
+# Load-tests the benchmark suite's search service with generated requests,
+# reporting throughput, latency percentiles and errors, see apilib.load_testing.
+#
+# Usage:
+#   python -m benchmarks.load_benchmark [--workers thread|process|asyncio] [--concurrency 4]
+#       [--transport json|body] [--duration 10] [--error-rate 0.05]
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+
+from apilib import load_testing
+
+from . import suite_schemas as schemas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-tests a service in process.')
+    parser.add_argument('--workers', choices=load_testing.WORKER_TYPES, default=load_testing.THREAD)
+    parser.add_argument('--concurrency', type=int, default=4, help='Number of concurrent workers')
+    parser.add_argument('--transport', choices=load_testing.TRANSPORTS, default=load_testing.JSON_TRANSPORT)
+    parser.add_argument('--duration', type=float, default=load_testing.DEFAULT_DURATION, help='Seconds to run for')
+    parser.add_argument('--payloads', type=int, default=100, help='Number of distinct requests to generate')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of request values to make invalid')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    payloads = load_testing.generate_payloads(schemas.SearchServiceImpl(), 'search', args.payloads,
+        seed=args.seed, error_rate=args.error_rate)
+    print('Running %d %s workers over the %s transport for %gs...' % (
+        args.concurrency, args.workers, args.transport, args.duration))
+    result = load_testing.run(schemas.SearchServiceImpl, 'search', payloads, args.concurrency, args.duration,
+        workers=args.workers, transport=args.transport)
+    print(result.format_report())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Measures the overhead of recording metrics (apilib.metrics.ENABLED) on calls of
+# a trivial method and of one returning a large response, and checks it against
+# a budget. The overhead is a fixed cost per call, so it is given in microseconds.
+# Only the trivial method is checked against the budget, since the run to run
+# variation of calls returning large responses is larger than the budget. Exits
+# with status 1 if the overhead is over the budget.
+#
+# Usage: python -m benchmarks.metrics_benchmark
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import sys
+
+import apilib
+from apilib import metrics
+
+from . import common
+from . import schemas
+
+# The largest acceptable cost of recording metrics per call, in seconds.
+OVERHEAD_BUDGET = 5e-6
+# Measurements with metrics disabled and enabled alternate this many times, to
+# even out fluctuations in the speed of the machine.
+ROUNDS = 10
+
+class OrdersRequest(apilib.Request):
+    num_orders = apilib.Field(apilib.Integer())
+
+class PingResponse(apilib.Response):
+    pass
+
+class OrdersService(apilib.Service):
+    methods = apilib.servicemethods(
+        apilib.Meth('ping', apilib.Request, PingResponse),
+        apilib.Meth('list_orders', OrdersRequest, schemas.ListOrdersResponse))
+
+class OrdersServiceImpl(OrdersService, apilib.ServiceImplementation):
+    responses = {}
+
+    def ping(self, request):
+        return PingResponse()
+
+    def list_orders(self, request):
+        return self.responses[request.num_orders]
+
+    def log_request(self, method_name, request):
+        pass
+
+    def log_response(self, method_name, request, response):
+        pass
+
+def run():
+    # (method name, request body, seconds to measure, whether to check the budget)
+    cases = [('ping', b'{}', 1.0, True)]
+    for num_orders in (10, 100):
+        OrdersServiceImpl.responses[num_orders] = schemas.make_list_orders_response(num_orders)
+        cases.append(('list_orders', ('{"num_orders": %d}' % num_orders).encode('utf-8'), 0.5, False))
+    rows = []
+    within_budget = True
+    for method_name, body, min_time, checked in cases:
+        call = lambda: OrdersServiceImpl().invoke_with_body(method_name, body)
+        disabled = enabled = 0
+        for _ in range(ROUNDS):
+            metrics.ENABLED = False
+            disabled = max(disabled, common.measure(call, min_time / ROUNDS, repeat=3))
+            metrics.ENABLED = True
+            enabled = max(enabled, common.measure(call, min_time / ROUNDS, repeat=3))
+        metrics.ENABLED = False
+        overhead = 1 / enabled - 1 / disabled
+        if checked:
+            within_budget = within_budget and overhead <= OVERHEAD_BUDGET
+        rows.append([method_name, len(call().body), disabled, enabled, overhead * 1e6,
+            '%.1f%%' % (overhead * disabled * 100)])
+    common.print_table(['method', 'response bytes', 'calls/s off', 'calls/s on', 'overhead us', 'overhead'], rows)
+    print()
+    print('Overhead is %s the budget of %.0fus per call' % ('within' if within_budget else 'OVER', OVERHEAD_BUDGET * 1e6))
+    return within_budget
+
+if __name__ == '__main__':
+    sys.exit(0 if run() else 1)
@@ -0,0 +1,88 @@
+# Measures the latency of small requests while large requests are being decoded
+# concurrently, with and without MethodDescriptor(decode_in_process=True).
+#
+# Usage: python -m benchmarks.offload_benchmark
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import threading
+import time
+
+import apilib
+
+from . import common
+from . import schemas
+
+NUM_BULK_ORDERS = 2000
+NUM_BULK_THREADS = 2
+DURATION = 3.0
+PING_INTERVAL = 0.005
+
+class BulkOrdersRequest(apilib.Request):
+    orders = apilib.Field(apilib.ListType(schemas.Order))
+
+class PingRequest(apilib.Request):
+    pass
+
+class PingResponse(apilib.Response):
+    pass
+
+class BulkService(apilib.Service):
+    methods = apilib.servicemethods(
+        apilib.Meth('import_orders', BulkOrdersRequest, apilib.Response),
+        apilib.Meth('import_orders_in_process', BulkOrdersRequest, apilib.Response, decode_in_process=True),
+        apilib.Meth('ping', PingRequest, PingResponse))
+
+class BulkServiceImpl(BulkService, apilib.ServiceImplementation):
+    def import_orders(self, request):
+        return apilib.Response()
+
+    def import_orders_in_process(self, request):
+        return apilib.Response()
+
+    def ping(self, request):
+        return PingResponse()
+
+    def log_request(self, method_name, request):
+        pass
+
+    def log_response(self, method_name, request, response):
+        pass
+
+def measure_ping_latency(bulk_method):
+    service = BulkServiceImpl()
+    body = BulkOrdersRequest(orders=schemas.make_list_orders_response(NUM_BULK_ORDERS).orders).to_json_str()
+    deadline = time.time() + DURATION
+    bulk_counts = []
+
+    def send_bulk_requests():
+        count = 0
+        while time.time() < deadline:
+            service.invoke_with_json_str(bulk_method, body)
+            count += 1
+        bulk_counts.append(count)
+
+    threads = [threading.Thread(target=send_bulk_requests) for _ in range(NUM_BULK_THREADS)]
+    for thread in threads:
+        thread.start()
+    latencies = []
+    while time.time() < deadline:
+        start = time.time()
+        service.invoke_with_json_str('ping', '{}')
+        latencies.append(time.time() - start)
+        time.sleep(PING_INTERVAL)
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    return [bulk_method, sum(bulk_counts) / DURATION, percentile(0.5), percentile(0.99), latencies[-1] * 1000]
+
+def run():
+    # Start the worker processes before measuring.
+    BulkServiceImpl().invoke_with_json_str('import_orders_in_process', '{}')
+    rows = [measure_ping_latency(method) for method in ('import_orders', 'import_orders_in_process')]
+    common.print_table(['bulk method', 'bulk req/s', 'ping p50 ms', 'ping p99 ms', 'ping max ms'], rows)
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,36 @@
+# Measures how decoding of large lists scales with apilib.model.PARALLEL_DECODING_WORKERS.
+# Speedups are only expected where decoding releases the GIL, e.g. on free-threaded builds.
+#
+# Usage: python -m benchmarks.parallel_decoding_benchmark
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import sys
+
+import apilib
+
+from . import common
+from . import schemas
+
+def run():
+    gil_enabled = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print('Python %s, GIL %s' % (sys.version.split()[0], 'enabled' if gil_enabled else 'disabled'))
+    original_workers = apilib.model.PARALLEL_DECODING_WORKERS
+    rows = []
+    try:
+        for num_orders in (1000, 10000):
+            obj = schemas.make_list_orders_response(num_orders).to_json()
+            min_time = 0.5
+            baseline = None
+            for workers in (0, 1, 2, 4, 8):
+                apilib.model.PARALLEL_DECODING_WORKERS = workers
+                rate = common.measure(lambda: schemas.ListOrdersResponse.from_json(obj), min_time, repeat=3)
+                baseline = baseline or rate
+                rows.append([num_orders, workers or 'sequential', rate * num_orders, rate / baseline])
+    finally:
+        apilib.model.PARALLEL_DECODING_WORKERS = original_workers
+    common.print_table(['orders', 'workers', 'orders/s', 'speedup'], rows)
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,66 @@
+# Representative models and payloads for benchmarks.
+
+from __future__ import absolute_import
+
+import datetime
+import decimal
+
+from dateutil import tz
+
+import apilib
+
+if not apilib.model.ID_ENCRYPTION_KEY:
+    apilib.model.ID_ENCRYPTION_KEY = 'benchmark'
+
+class OrderStatus(apilib.EnumValues):
+    PENDING = 'PENDING'
+    SHIPPED = 'SHIPPED'
+    DELIVERED = 'DELIVERED'
+    CANCELLED = 'CANCELLED'
+
+class Address(apilib.Model):
+    street = apilib.Field(apilib.String())
+    city = apilib.Field(apilib.String(intern=True))
+    country_code = apilib.Field(apilib.String(intern=True))
+    postal_code = apilib.Field(apilib.String())
+
+class LineItem(apilib.Model):
+    sku = apilib.Field(apilib.String())
+    quantity = apilib.Field(apilib.Integer())
+    unit_price = apilib.Field(apilib.Decimal())
+    discount = apilib.Field(apilib.Float())
+
+class Order(apilib.Model):
+    id = apilib.Field(apilib.EncryptedId())
+    customer_id = apilib.Field(apilib.EncryptedId())
+    status = apilib.Field(apilib.Enum(OrderStatus.values()))
+    created = apilib.Field(apilib.DateTime())
+    updated = apilib.Field(apilib.DateTime())
+    total = apilib.Field(apilib.Decimal())
+    gift = apilib.Field(apilib.Boolean())
+    notes = apilib.Field(apilib.String())
+    shipping_address = apilib.Field(apilib.ModelType(Address))
+    line_items = apilib.Field(apilib.ListType(LineItem))
+    tags = apilib.Field(apilib.ListType(apilib.String(intern=True)))
+
+class ListOrdersResponse(apilib.Response):
+    orders = apilib.Field(apilib.ListType(Order))
+
+def make_order(i, num_line_items=5):
+    created = datetime.datetime(2016, 1, 1, tzinfo=tz.tzutc()) + datetime.timedelta(minutes=i)
+    return Order(
+        id=1000 + i,
+        customer_id=i % 97,
+        status=OrderStatus.values()[i % 4],
+        created=created,
+        updated=created + datetime.timedelta(hours=1),
+        total=decimal.Decimal('%d.%02d' % (i * 3, i % 100)),
+        gift=i % 2 == 0,
+        notes='Please leave the package at the back door' if i % 3 == 0 else None,
+        shipping_address=Address(street='%d Main Street' % i, city='Springfield', country_code='US', postal_code='12345'),
+        line_items=[LineItem(sku='SKU-%05d' % (i + j), quantity=j + 1, unit_price=decimal.Decimal('9.99'), discount=0.1)
+            for j in range(num_line_items)],
+        tags=['priority', 'web'])
+
+def make_list_orders_response(num_orders):
+    return ListOrdersResponse(response_code='SUCCESS', orders=[make_order(i) for i in range(num_orders)])
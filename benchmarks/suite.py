@@ -0,0 +1,291 @@
+# Measures decoding, encoding, validation and service dispatch for models of
+# various shapes, reporting throughput and the peak memory allocated per call.
+#
+# Usage:
+#   python -m benchmarks.suite [--filter deep] [--json results.json]
+#   python -m benchmarks.suite --compare OLD_REV [NEW_REV] [--threshold 10]
+#
+# --compare runs the suite against the apilib package of each git revision (the
+# working tree if NEW_REV is omitted), alternating between them for a few rounds and
+# keeping the best results, and exits with status 1 if any case got slower, or
+# allocates more, by more than the threshold percentage. The current version of
+# the suite is used for both revisions, so revisions from before the suite existed
+# can be compared too. Cases that fail on a revision are reported as errors.
+#
+# The import/apilib case measures how long importing apilib takes in a fresh
+# interpreter, with python -X importtime, reported as imports per second.
+
+from __future__ import absolute_import
+from __future__ import print_function
+
+import argparse
+import io
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import traceback
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from . import common
+
+DEFAULT_THRESHOLD = 10.0
+IMPORT_RUNS = 5
+GENERATED_PAYLOADS = 100
+
+def get_cases():
+    '''Returns (name, function) pairs of the operations to measure.'''
+    import apilib
+    from . import suite_schemas as schemas
+
+    cases = []
+    models = [
+        ('flat', schemas.make_flat(1)),
+        ('wide', schemas.make_wide()),
+        ('deep', schemas.make_deep()),
+        ('list_heavy', schemas.make_list_heavy()),
+        ('typed', schemas.make_typed()),
+    ]
+    for name, obj in models:
+        cls = type(obj)
+        obj_json = obj.to_dict()
+        cases.extend([
+            ('%s/from_json' % name, lambda cls=cls, obj_json=obj_json: cls.from_json(obj_json)),
+            ('%s/to_dict' % name, obj.to_dict),
+            ('%s/to_json_str' % name, obj.to_json_str),
+        ])
+
+    request_json = schemas.make_search_request_json()
+    invalid_request_json = schemas.make_invalid_search_request_json()
+    validation_context = apilib.ValidationContext(service='SearchService', method='search')
+    service = schemas.SearchServiceImpl()
+    cases.extend([
+        ('selector/from_json_validated',
+            lambda: schemas.SearchRequest.from_json(request_json, apilib.ErrorContext(), validation_context)),
+        ('service/invoke_with_json', lambda: service.invoke_with_json('search', request_json)),
+    ])
+
+    invalid_flat_json = schemas.make_invalid_flat_json()
+    def decode_invalid():
+        try:
+            schemas.Flat.from_json(invalid_flat_json)
+        except apilib.DeserializationError:
+            pass
+        else:
+            raise AssertionError('Expected a DeserializationError')
+    cases.extend([
+        ('errors/from_json', decode_invalid),
+        ('errors/invoke_with_json', lambda: service.invoke_with_json('search', invalid_request_json)),
+    ])
+    cases.extend(_get_generated_cases(service, validation_context))
+    return cases
+
+def _get_generated_cases(service, validation_context):
+    '''Cases over a varied set of generated requests, when the revision has apilib.payloads.'''
+    try:
+        from apilib import payloads
+    except ImportError:
+        return []
+    from . import suite_schemas as schemas
+
+    generator = payloads.PayloadGenerator(seed=0, context=validation_context)
+    requests = itertools.cycle([generator.generate(schemas.SearchRequest) for _ in range(GENERATED_PAYLOADS)])
+    return [('generated/invoke_with_json', lambda: service.invoke_with_json('search', next(requests)))]
+
+def measure_allocations(func):
+    '''Returns the peak memory allocated by a call, in bytes, or None if unavailable.'''
+    if tracemalloc is None or not hasattr(tracemalloc, 'reset_peak'):
+        return None
+    func()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - start
+
+def measure_import_time(module_name='apilib', runs=IMPORT_RUNS):
+    '''Returns the best time that importing a module took in a fresh interpreter, in seconds.
+
+    Bytecode is cached in a temporary directory after the first run, as it would be
+    in an installed package.
+    '''
+    import apilib
+    root = os.path.dirname(os.path.dirname(os.path.abspath(apilib.__file__)))
+    cache_dir = tempfile.mkdtemp(prefix='apilib-bench-pycache-')
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=cache_dir)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    try:
+        times = []
+        for _ in range(runs):
+            output = subprocess.check_output([sys.executable, '-X', 'importtime', '-c', 'import %s' % module_name],
+                cwd=root, env=env, stderr=subprocess.STDOUT)
+            # Lines look like "import time: <self us> | <cumulative us> | <indented module name>".
+            for line in output.decode('utf-8').splitlines():
+                parts = line.split('|')
+                if len(parts) == 3 and parts[2].strip() == module_name and not parts[2].startswith('  '):
+                    times.append(int(parts[1]) / 1e6)
+        if not times:
+            raise ValueError('No import time reported for %s' % module_name)
+        return min(times)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+def run_cases(name_filter=None, min_time=0.2):
+    '''Returns results by case name, as dicts with ops_per_sec and peak_bytes, or error.'''
+    results = {}
+    for name, func in get_cases():
+        if name_filter and name_filter not in name:
+            continue
+        try:
+            results[name] = {
+                'ops_per_sec': common.measure(func, min_time),
+                'peak_bytes': measure_allocations(func),
+            }
+        except Exception:
+            results[name] = {'error': traceback.format_exc().strip().splitlines()[-1]}
+    if not name_filter or name_filter in 'import/apilib':
+        try:
+            results['import/apilib'] = {'ops_per_sec': 1.0 / measure_import_time(), 'peak_bytes': None}
+        except Exception:
+            results['import/apilib'] = {'error': traceback.format_exc().strip().splitlines()[-1]}
+    return results
+
+def print_results(results):
+    rows = []
+    for name in sorted(results):
+        result = results[name]
+        if 'error' in result:
+            rows.append([name, 'error', result['error']])
+        else:
+            rows.append([name, result['ops_per_sec'], _format_bytes(result['peak_bytes'])])
+    common.print_table(['case', 'ops/s', 'peak alloc'], rows)
+
+def compare(old_results, new_results, threshold):
+    '''Prints a comparison and returns the names of the cases that regressed.'''
+    rows = []
+    regressions = []
+    for name in sorted(set(old_results) | set(new_results)):
+        old = old_results.get(name, {'error': 'missing'})
+        new = new_results.get(name, {'error': 'missing'})
+        if 'error' in old or 'error' in new:
+            rows.append([name, _format_ops(old), _format_ops(new), '', '', '', 'error' if 'error' in new else ''])
+            continue
+        speed_change = _percent_change(old['ops_per_sec'], new['ops_per_sec'])
+        alloc_change = _percent_change(old['peak_bytes'], new['peak_bytes'])
+        regressed = speed_change < -threshold or (alloc_change is not None and alloc_change > threshold)
+        if regressed:
+            regressions.append(name)
+        rows.append([name, old['ops_per_sec'], new['ops_per_sec'], '%+.1f%%' % speed_change,
+            _format_bytes(old['peak_bytes']), _format_bytes(new['peak_bytes']), 'REGRESSION' if regressed else ''])
+    common.print_table(['case', 'old ops/s', 'new ops/s', 'change', 'old alloc', 'new alloc', ''], rows)
+    return regressions
+
+def run_comparison(old_rev, new_rev, args):
+    '''Runs the suite against two git revisions, alternating between them for args.rounds rounds.
+
+    Keeps the best result of each case, to reduce the effect of noise. With new_rev
+    None, the working tree is used.
+    '''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    temp_dir = tempfile.mkdtemp(prefix='apilib-bench-')
+    try:
+        trees = [_prepare_tree(root, rev, os.path.join(temp_dir, 'tree%d' % i)) for i, rev in enumerate([old_rev, new_rev])]
+        results = [{}, {}]
+        for round_num in range(args.rounds):
+            for i, rev in enumerate([old_rev, new_rev]):
+                print('Round %d of %d at %s...' % (round_num + 1, args.rounds, rev or 'the working tree'), file=sys.stderr)
+                _merge_best(results[i], _run_suite(trees[i], os.path.join(temp_dir, 'results.json'), args))
+        return results
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+def _prepare_tree(root, rev, path):
+    '''Returns a directory holding the apilib package at rev, along with the current benchmarks.'''
+    if rev is None:
+        return root
+    archive = subprocess.check_output(['git', 'archive', rev, 'apilib'], cwd=root)
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(path)
+    shutil.copytree(os.path.join(root, 'benchmarks'), os.path.join(path, 'benchmarks'),
+        ignore=shutil.ignore_patterns('__pycache__', '*.pyc'))
+    return path
+
+def _run_suite(cwd, results_path, args):
+    command = [sys.executable, '-m', 'benchmarks.suite', '--json', results_path, '--min-time', str(args.min_time)]
+    if args.filter:
+        command.extend(['--filter', args.filter])
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(command, cwd=cwd, stdout=devnull)
+    with open(results_path) as f:
+        return json.load(f)
+
+def _merge_best(best, results):
+    for name, result in results.items():
+        current = best.get(name)
+        if current is None or 'error' in current:
+            best[name] = result
+        elif 'error' not in result:
+            current['ops_per_sec'] = max(current['ops_per_sec'], result['ops_per_sec'])
+            if result['peak_bytes'] is not None:
+                current['peak_bytes'] = min(current['peak_bytes'], result['peak_bytes'])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks apilib models and services.')
+    parser.add_argument('--filter', help='Only run cases whose name contains this string')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Seconds to spend on each measurement')
+    parser.add_argument('--json', help='Also write the results to this file')
+    parser.add_argument('--compare', nargs='+', metavar='REV',
+        help='Compare an old git revision against a new one, or against the working tree')
+    parser.add_argument('--rounds', type=int, default=3,
+        help='Times to run the suite against each revision when comparing, keeping the best results')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help='Percentage by which a case may get slower or allocate more before failing')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        if len(args.compare) > 2:
+            parser.error('--compare takes one or two revisions')
+        old_results, new_results = run_comparison(
+            args.compare[0], args.compare[1] if len(args.compare) == 2 else None, args)
+        regressions = compare(old_results, new_results, args.threshold)
+        if regressions:
+            print('\n%d case(s) regressed by more than %g%%: %s' % (
+                len(regressions), args.threshold, ', '.join(regressions)))
+            return 1
+        print('\nNo regressions beyond %g%%' % args.threshold)
+        return 0
+
+    results = run_cases(args.filter, args.min_time)
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+def _percent_change(old, new):
+    if old is None or new is None or not old:
+        return None
+    return (new - old) * 100.0 / old
+
+def _format_ops(result):
+    return 'error' if 'error' in result else result['ops_per_sec']
+
+def _format_bytes(num_bytes):
+    if num_bytes is None:
+        return 'n/a'
+    return '%.1f KiB' % (num_bytes / 1024.0)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# Models and payloads of various shapes for the benchmark suite.
+#
+# These only use features that apilib has had from the start, so the suite can
+# run against older revisions when comparing them, see benchmarks.suite.
+
+from __future__ import absolute_import
+
+import datetime
+import decimal
+
+from dateutil import tz
+
+import apilib
+from apilib import service_models
+
+if not apilib.model.ID_ENCRYPTION_KEY:
+    apilib.model.ID_ENCRYPTION_KEY = 'benchmark'
+
+WIDE_FIELDS = 60
+DEEP_LEVELS = 12
+LIST_ITEMS = 1000
+TYPED_ITEMS = 50
+
+class Flat(apilib.Model):
+    id = apilib.Field(apilib.Integer())
+    name = apilib.Field(apilib.String())
+    email = apilib.Field(apilib.String())
+    score = apilib.Field(apilib.Float())
+    active = apilib.Field(apilib.Boolean())
+    visits = apilib.Field(apilib.Integer())
+    country = apilib.Field(apilib.String())
+    bio = apilib.Field(apilib.String())
+
+def _wide_field_type(i):
+    return [apilib.String, apilib.Integer, apilib.Float, apilib.Boolean][i % 4]()
+
+Wide = type('Wide', (apilib.Model,), {'field_%02d' % i: apilib.Field(_wide_field_type(i)) for i in range(WIDE_FIELDS)})
+
+def _make_deep_classes(levels):
+    classes = [type('Deep0', (apilib.Model,), {'name': apilib.Field(apilib.String()), 'value': apilib.Field(apilib.Integer())})]
+    for i in range(1, levels):
+        classes.append(type('Deep%d' % i, (apilib.Model,), {
+            'name': apilib.Field(apilib.String()),
+            'value': apilib.Field(apilib.Integer()),
+            'child': apilib.Field(apilib.ModelType(classes[-1])),
+        }))
+    return classes
+
+# Deep<n> holds a Deep<n - 1> in its child field.
+DEEP_CLASSES = _make_deep_classes(DEEP_LEVELS)
+Deep = DEEP_CLASSES[-1]
+
+class ListHeavy(apilib.Model):
+    ids = apilib.Field(apilib.ListType(apilib.Integer()))
+    labels = apilib.Field(apilib.ListType(apilib.String()))
+    counts = apilib.Field(apilib.DictType(apilib.Integer()))
+    rows = apilib.Field(apilib.ListType(Flat))
+
+class TypedItem(apilib.Model):
+    id = apilib.Field(apilib.EncryptedId())
+    owner_id = apilib.Field(apilib.EncryptedId())
+    created = apilib.Field(apilib.DateTime())
+    updated = apilib.Field(apilib.DateTime())
+    price = apilib.Field(apilib.Decimal())
+    tax = apilib.Field(apilib.Decimal())
+
+class Typed(apilib.Model):
+    items = apilib.Field(apilib.ListType(TypedItem))
+
+class SearchRequest(apilib.Request):
+    query = apilib.Field(apilib.String(), required=True)
+    selector = apilib.Field(apilib.ModelType(service_models.Selector))
+
+class SearchResponse(apilib.Response):
+    results = apilib.Field(apilib.ListType(Flat))
+
+class SearchService(apilib.Service):
+    methods = apilib.servicemethods(
+        apilib.Meth('search', SearchRequest, SearchResponse))
+
+class SearchServiceImpl(SearchService, apilib.ServiceImplementation):
+    def __init__(self, num_results=10):
+        self.results = [make_flat(i) for i in range(num_results)]
+
+    def search(self, request):
+        return SearchResponse(results=self.results)
+
+    def log_request(self, method_name, request):
+        pass
+
+    def log_response(self, method_name, request, response):
+        pass
+
+def make_flat(i):
+    return Flat(id=i, name='User %d' % i, email='user%d@example.com' % i, score=i * 1.5, active=i % 2 == 0,
+        visits=i * 7, country='US', bio='Likes long walks on the beach' if i % 3 == 0 else None)
+
+def make_wide():
+    values = {}
+    for i in range(WIDE_FIELDS):
+        values['field_%02d' % i] = ['value %d' % i, i, i * 0.5, i % 2 == 0][i % 4]
+    return Wide(**values)
+
+def make_deep():
+    obj = None
+    for i, cls in enumerate(DEEP_CLASSES):
+        obj = cls(name='level %d' % i, value=i, child=obj) if obj else cls(name='level %d' % i, value=i)
+    return obj
+
+def make_list_heavy():
+    return ListHeavy(
+        ids=list(range(LIST_ITEMS)),
+        labels=['label-%d' % i for i in range(LIST_ITEMS)],
+        counts={'key-%d' % i: i for i in range(LIST_ITEMS // 10)},
+        rows=[make_flat(i) for i in range(LIST_ITEMS // 10)])
+
+def make_typed():
+    start = datetime.datetime(2016, 1, 1, tzinfo=tz.tzutc())
+    return Typed(items=[TypedItem(
+        id=1000 + i,
+        owner_id=i % 31,
+        created=start + datetime.timedelta(minutes=i),
+        updated=start + datetime.timedelta(hours=i),
+        price=decimal.Decimal('%d.%02d' % (i, i % 100)),
+        tax=decimal.Decimal('0.21')) for i in range(TYPED_ITEMS)])
+
+def make_search_request_json():
+    return {
+        'query': 'walks on the beach',
+        'selector': {
+            'ordering': {'criteria': [
+                {'field_name': 'score', 'direction': 'DESC'},
+                {'field_name': 'name', 'direction': 'ASC'},
+            ]},
+            'pagination': {'start': 20, 'num': 10},
+        },
+    }
+
+def make_invalid_search_request_json():
+    '''A request failing validation in several places.'''
+    return {
+        'selector': {
+            'ordering': {'criteria': [
+                {'field_name': 'score', 'direction': 'DESC'},
+                {'field_name': 'score', 'direction': 'SIDEWAYS'},
+            ]},
+            'pagination': {'start': -1, 'num': 0},
+        },
+    }
+
+def make_invalid_flat_json():
+    return {'id': 'one', 'name': 5, 'score': 'high', 'active': 'yes', 'unknown': True}
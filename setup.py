@@ -9,6 +9,6 @@ setup(
     version='0.3.0',
     packages=find_packages(),
     install_requires=['six', 'python-dateutil', 'requests'],
-    extras_require={'encrypted-ids': ['hashids']},
+    extras_require={'encrypted-ids': ['hashids'], 'msgpack': ['msgpack>=1.0']},
     tests_require=['mock'],
     test_suite='tests.all_tests')
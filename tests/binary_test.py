@@ -0,0 +1,191 @@
+from __future__ import absolute_import
+
+import datetime
+import decimal
+import unittest
+
+from dateutil import tz
+
+import apilib
+from apilib import binary
+
+apilib.model.ID_ENCRYPTION_KEY = 'test'
+
+class Child(apilib.Model):
+    fstring = apilib.Field(apilib.String())
+    fint = apilib.Field(apilib.Integer())
+
+class AllTypesModel(apilib.Model):
+    fstring = apilib.Field(apilib.String())
+    fbytes = apilib.Field(apilib.Bytes())
+    fint = apilib.Field(apilib.Integer())
+    ffloat = apilib.Field(apilib.Float())
+    fbool = apilib.Field(apilib.Boolean())
+    fdatetime = apilib.Field(apilib.DateTime())
+    fdate = apilib.Field(apilib.Date())
+    fdecimal = apilib.Field(apilib.Decimal())
+    fenum = apilib.Field(apilib.Enum(['A', 'B']))
+    fid = apilib.Field(apilib.EncryptedId())
+    fany = apilib.Field(apilib.AnyPrimitive())
+    fraw = apilib.Field(apilib.RawJson())
+    fchild = apilib.Field(apilib.ModelType(Child))
+    lchild = apilib.Field(apilib.ListType(Child))
+    dint = apilib.Field(apilib.DictType(apilib.Integer()))
+    llstring = apilib.Field(apilib.ListType(apilib.ListType(apilib.String())))
+
+class CustomString(apilib.String):
+    def to_json(self, value):
+        return value.upper() if value is not None else None
+
+class CustomTypeModel(apilib.Model):
+    fcustom = apilib.Field(CustomString())
+
+class BinaryCodecTest(unittest.TestCase):
+    def assertRoundTrip(self, m):
+        decoded = type(m).from_bytes(m.to_bytes())
+        self.assertEqual(type(m).from_json(m.to_json()).to_json(), decoded.to_json())
+        return decoded
+
+    def test_empty(self):
+        self.assertEqual(b'', AllTypesModel().to_bytes())
+        m = AllTypesModel.from_bytes(b'')
+        self.assertEqual(AllTypesModel.from_json({}).to_json(), m.to_json())
+
+    def test_all_types(self):
+        m = AllTypesModel(
+            fstring=u'héllo',
+            fbytes=b'\x00\xff',
+            fint=-1234567890123,
+            ffloat=2.5,
+            fbool=False,
+            fdatetime=datetime.datetime(2016, 3, 4, 5, 6, 7, 8910, tzinfo=tz.tzoffset(None, -7 * 3600)),
+            fdate=datetime.date(1901, 2, 3),
+            fdecimal=decimal.Decimal('-12.340'),
+            fenum='B',
+            fid=12345,
+            fany={'a': [1, 2.0, None, True, 'x', {}]},
+            fraw=apilib.RawJsonValue('[1, 2]'),
+            fchild=Child(fstring='child'),
+            lchild=[Child(fint=1), None, Child()],
+            dint={'a': 1, 'b': None},
+            llstring=[['a', None], [], None])
+        decoded = self.assertRoundTrip(m)
+        self.assertEqual(b'\x00\xff', decoded.fbytes)
+        self.assertEqual(m.fdatetime, decoded.fdatetime)
+        self.assertEqual(m.fdatetime.utcoffset(), decoded.fdatetime.utcoffset())
+        self.assertEqual('-12.340', str(decoded.fdecimal))
+        self.assertEqual('[1, 2]', decoded.fraw.text)
+        self.assertIsNone(decoded.lchild[1])
+
+    def test_datetimes_and_decimals(self):
+        for value in [datetime.datetime(1960, 1, 1, 0, 0, 0, 1), datetime.datetime(2016, 1, 1, tzinfo=tz.tzutc())]:
+            decoded = AllTypesModel.from_bytes(AllTypesModel(fdatetime=value).to_bytes())
+            self.assertEqual(value.isoformat(), decoded.fdatetime.isoformat())
+        for value in ['0', '-0', '1E+10', '0.000001', 'Infinity', '-Infinity', 'NaN']:
+            decoded = AllTypesModel.from_bytes(AllTypesModel(fdecimal=decimal.Decimal(value)).to_bytes())
+            self.assertEqual(value, str(decoded.fdecimal))
+
+    def test_compact(self):
+        m = AllTypesModel(fint=1, fid=99, fdatetime=datetime.datetime(2016, 1, 1, tzinfo=tz.tzutc()))
+        self.assertLess(len(m.to_bytes()), len(m.to_json_str()) / 3)
+
+    def test_field_numbers_follow_declaration_order(self):
+        self.assertEqual([(1, 'fstring'), (2, 'fint')], [(n, f.get_name()) for n, f in Child.get_numbered_fields()])
+        self.assertEqual(b'\x10\x02', Child(fint=1).to_bytes())
+        self.assertEqual(b'\x0a\x01a', Child(fstring='a').to_bytes())
+
+    def test_unknown_fields_skipped(self):
+        data = b'\x18\x05' + b'\x21' + b'\x00' * 8 + b'\x2a\x02ab' + Child(fint=3).to_bytes()
+        self.assertEqual(3, Child.from_bytes(data).fint)
+
+    def test_malformed(self):
+        for data in [b'\x0a\x05a', b'\x10', b'\x0f', b'\x0a\x01\xff']:
+            with self.assertRaises(ValueError):
+                Child.from_bytes(data)
+
+    def test_custom_field_type(self):
+        m = CustomTypeModel.from_bytes(CustomTypeModel(fcustom='abc').to_bytes())
+        self.assertEqual('ABC', m.fcustom)
+
+    def test_validation(self):
+        ec = apilib.ErrorContext()
+        m = ValidatedModel.from_bytes(ValidatedModel(fchild=Child(), fint=0).to_bytes(), ec, apilib.ValidationContext())
+        self.assertIsNone(m)
+        self.assertEqual([('fchild.fstring', 'REQUIRED'), ('fint', 'VALUE_NOT_IN_RANGE')],
+            sorted((e.path, e.code) for e in ec.all_errors()))
+
+        with self.assertRaises(apilib.DeserializationError):
+            ValidatedModel.from_bytes(ValidatedModel().to_bytes(), context=apilib.ValidationContext())
+
+        m = ValidatedModel.from_bytes(ValidatedModel(fchild=RequiredChild(fstring='a'), fint=1, fro='x').to_bytes(),
+            context=apilib.ValidationContext())
+        self.assertEqual(1, m.fint)
+        self.assertIsNone(m.fro)
+
+class EnumModel(apilib.Model):
+    fenum = apilib.Field(apilib.Enum({'RED': 1, 'GREEN': 200}))
+    lenum = apilib.Field(apilib.ListType(apilib.Enum(['A', 'B'])))
+
+class EnumCodeTest(unittest.TestCase):
+    def test_codes(self):
+        self.assertEqual({'A': 0, 'B': 1}, apilib.Enum(['A', 'B', 'A']).codes)
+        self.assertEqual({'A': 0, 'B': 1}, apilib.Enum(set(['B', 'A'])).codes)
+        self.assertEqual({'Z': 0, 'A': 1}, apilib.Enum(['Z', 'A']).codes)
+        self.assertEqual({1: 'RED', 200: 'GREEN'}, EnumModel.fenum.get_type().values_by_code)
+        for codes in [{'A': 1, 'B': 1}, {'A': -1}, {'A': 'x'}]:
+            with self.assertRaises(ValueError):
+                apilib.Enum(codes)
+
+    def test_binary_encoding(self):
+        self.assertEqual(b'\x08\xc8\x01', EnumModel(fenum='GREEN').to_bytes())
+        m = EnumModel.from_bytes(EnumModel(fenum='RED', lenum=['B', None, 'A']).to_bytes())
+        self.assertEqual('RED', m.fenum)
+        self.assertEqual(['B', None, 'A'], m.lenum)
+
+        with self.assertRaises(ValueError):
+            EnumModel(fenum='BLUE').to_bytes()
+        with self.assertRaises(ValueError):
+            EnumModel.from_bytes(b'\x08\x02')
+
+class TaggedModel(apilib.Model):
+    a = apilib.Field(apilib.String())
+    b = apilib.Field(apilib.String(), tag=1)
+    c = apilib.Field(apilib.String(), tag=3)
+    d = apilib.Field(apilib.String())
+    e = apilib.Field(apilib.String())
+
+class TaggedModelV2(apilib.Model):
+    e = apilib.Field(apilib.Integer(), tag=5)
+    b = apilib.Field(apilib.String(), tag=1)
+
+class FieldTagTest(unittest.TestCase):
+    def test_numbering(self):
+        self.assertEqual([(1, 'b'), (2, 'a'), (3, 'c'), (4, 'd'), (5, 'e')],
+            [(n, f.get_name()) for n, f in TaggedModel.get_numbered_fields()])
+
+    def test_compatible_decoding(self):
+        m = TaggedModelV2.from_bytes(TaggedModel(a='a', b='b', e='e').to_bytes())
+        self.assertEqual('b', m.b)
+        # Fields with the same number but a different wire type are skipped.
+        self.assertIsNone(m.e)
+
+    def test_invalid_tags(self):
+        with self.assertRaises(ValueError):
+            apilib.Field(apilib.String(), tag=0)
+
+        class DuplicateTags(apilib.Model):
+            a = apilib.Field(apilib.String(), tag=2)
+            b = apilib.Field(apilib.String(), tag=2)
+        with self.assertRaises(apilib.InvalidFieldTagException):
+            DuplicateTags.get_numbered_fields()
+
+class RequiredChild(apilib.Model):
+    fstring = apilib.Field(apilib.String(), required=True)
+
+class ValidatedModel(apilib.Model):
+    fchild = apilib.Field(apilib.ModelType(RequiredChild), required=True)
+    fint = apilib.Field(apilib.Integer(), validators=[apilib.Range(1)])
+    fro = apilib.Field(apilib.String(), readonly=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+from __future__ import absolute_import
+
+import gzip
+import io
+import unittest
+import zlib
+
+import apilib
+from apilib import compression
+
+class CompressionTest(unittest.TestCase):
+    def test_negotiate_encoding(self):
+        self.assertIsNone(compression.negotiate_encoding(None))
+        self.assertIsNone(compression.negotiate_encoding('br'))
+        self.assertEqual('gzip', compression.negotiate_encoding('gzip, deflate, br'))
+        self.assertEqual('deflate', compression.negotiate_encoding('gzip;q=0.5, DEFLATE'))
+        self.assertEqual('gzip', compression.negotiate_encoding('*'))
+        self.assertIsNone(compression.negotiate_encoding('identity, gzip;q=0.5'))
+        self.assertIsNone(compression.negotiate_encoding('gzip;q=0'))
+
+    def test_round_trip(self):
+        data = b'abc' * 1000
+        for encoding in compression.SUPPORTED_ENCODINGS:
+            compressed = compression.compress(data, encoding)
+            self.assertLess(len(compressed), 100)
+            self.assertEqual(data, compression.decompress(compressed, encoding))
+            stream = list(compression.compress_stream(data, encoding, chunk_size=100))
+            self.assertEqual(data, compression.decompress(b''.join(stream), encoding))
+        self.assertEqual(data, gzip.GzipFile(fileobj=io.BytesIO(compression.compress(data, 'gzip'))).read())
+        self.assertEqual(data, zlib.decompress(compression.compress(data, 'deflate')))
+        self.assertEqual(data, compression.decompress(data, None))
+        self.assertEqual(data, compression.decompress(data, 'identity'))
+
+    def test_level(self):
+        data = bytes(bytearray(range(256))) * 100
+        self.assertGreater(len(compression.compress(data, 'gzip', level=0)), len(compression.compress(data, 'gzip')))
+
+    def test_malformed(self):
+        compressed = compression.compress(b'abc' * 100, 'gzip')
+        for data in [b'abc', compressed[:-5], compression.compress(b'abc' * 100, 'deflate')]:
+            with self.assertRaises(ValueError):
+                compression.decompress(data, 'gzip')
+
+    def test_max_decompressed_size(self):
+        original = compression.MAX_DECOMPRESSED_SIZE
+        compression.MAX_DECOMPRESSED_SIZE = 100
+        try:
+            with self.assertRaises(ValueError):
+                compression.decompress(compression.compress(b'a' * 101, 'gzip'), 'gzip')
+            self.assertEqual(b'a' * 100, compression.decompress(compression.compress(b'a' * 100, 'gzip'), 'gzip'))
+        finally:
+            compression.MAX_DECOMPRESSED_SIZE = original
+
+    def test_unsupported_encoding(self):
+        with self.assertRaises(apilib.UnsupportedContentEncodingException):
+            compression.compress(b'', 'br')
+        with self.assertRaises(apilib.UnsupportedContentEncodingException):
+            compression.check_encoding('br')
+        compression.check_encoding('identity')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+from __future__ import absolute_import
+
+import unittest
+
+import mock
+
+import apilib
+from apilib import load_testing
+from tests.service_test import FooResponse
+from tests.service_test import FooService
+from tests.service_test import FooServiceImpl
+
+PAYLOADS = [{'request_str': 'a'}, {'request_str': 'b'}, {}, {'request_str': 'crash'}]
+
+class CrashingFooServiceImpl(FooService, apilib.ServiceImplementation):
+    def foo(self, request):
+        if request.request_str == 'crash':
+            raise ValueError('crash')
+        return FooResponse(response_str=request.request_str)
+
+    def log_request(self, method_name, request):
+        pass
+
+    def log_response(self, method_name, request, response):
+        pass
+
+class LoadTestResultTest(unittest.TestCase):
+    def test_statistics(self):
+        result = load_testing.LoadTestResult()
+        for i in range(100):
+            result._record((i + 1) / 1000.0, 'SUCCESS' if i % 10 else 'REQUEST_ERROR', None)
+        other = load_testing.LoadTestResult()
+        other._record(0.5, None, ValueError())
+        other.elapsed = 2.0
+        result.elapsed = 1.0
+        result.merge(other)
+        self.assertEqual(101, result.num_requests)
+        self.assertEqual(11, result.num_errors)
+        self.assertEqual(50.5, result.throughput)
+        self.assertEqual(0.051, result.percentile(50))
+        self.assertEqual(0.1, result.percentile(99))
+        self.assertEqual(0.5, result.percentile(100))
+        report = result.format_report()
+        self.assertIn('REQUEST_ERROR: 10', report)
+        self.assertIn('ValueError raised: 1', report)
+
+class RunTest(unittest.TestCase):
+    def test_workers_and_transports(self):
+        for workers in load_testing.WORKER_TYPES:
+            for transport in load_testing.TRANSPORTS:
+                result = load_testing.run(CrashingFooServiceImpl, 'foo', PAYLOADS, concurrency=2, num_requests=40,
+                    workers=workers, transport=transport)
+                message = '%s %s' % (workers, transport)
+                self.assertEqual(40, result.num_requests, message)
+                self.assertEqual({'SUCCESS': 20, 'REQUEST_ERROR': 10}, result.response_codes, message)
+                self.assertEqual({'ValueError': 10}, result.exceptions, message)
+                self.assertEqual(0.5, result.error_rate, message)
+                self.assertGreater(result.throughput, 0, message)
+
+    def test_asyncio_worker_errors(self):
+        timed_call = load_testing._timed_call
+        def fail_on_crash(call, payload):
+            if payload.get('request_str') == 'crash':
+                raise RuntimeError('timing failed')
+            return timed_call(call, payload)
+        with mock.patch('apilib.load_testing._timed_call', side_effect=fail_on_crash):
+            result = load_testing.run(CrashingFooServiceImpl, 'foo', PAYLOADS, concurrency=2, num_requests=40,
+                workers=load_testing.ASYNCIO)
+        self.assertEqual(40, result.num_requests)
+        self.assertEqual({'RuntimeError': 10}, result.exceptions)
+
+    def test_duration(self):
+        result = load_testing.run(CrashingFooServiceImpl, 'foo', PAYLOADS[:1], concurrency=2, duration=0.05)
+        self.assertGreaterEqual(result.elapsed, 0.05)
+        self.assertEqual(0, result.num_errors)
+
+    def test_generated_payloads(self):
+        payloads = load_testing.generate_payloads(FooServiceImpl(), 'foo', count=10, seed=1)
+        self.assertEqual(10, len(payloads))
+        result = load_testing.run(CrashingFooServiceImpl, 'foo', payloads, num_requests=10)
+        self.assertEqual({'SUCCESS': 10}, result.response_codes)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            load_testing.run(FooServiceImpl, 'foo', PAYLOADS, workers='fibers')
+        with self.assertRaises(ValueError):
+            load_testing.run(FooServiceImpl, 'foo', PAYLOADS, transport='carrier pigeon')
+        with self.assertRaises(ValueError):
+            load_testing.run(FooServiceImpl, 'foo', [])
+
+if __name__ == '__main__':
+    unittest.main()
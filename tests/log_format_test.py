@@ -0,0 +1,87 @@
+from __future__ import absolute_import
+
+import logging
+import unittest
+
+import mock
+
+import apilib
+from apilib import log_format
+from tests.service_test import FooRequest
+from tests.service_test import FooServiceImpl
+
+class Item(apilib.Model):
+    name = apilib.Field(apilib.String())
+    data = apilib.Field(apilib.Bytes())
+
+class Leaf(apilib.Model):
+    label = apilib.Field(apilib.String())
+    items = apilib.Field(apilib.ListType(Item))
+
+class Branch(apilib.Model):
+    label = apilib.Field(apilib.String())
+    child = apilib.Field(apilib.ModelType(Leaf))
+
+class Tree(apilib.Model):
+    label = apilib.Field(apilib.String())
+    items = apilib.Field(apilib.ListType(Item))
+    attrs = apilib.Field(apilib.DictType(apilib.Integer()))
+    child = apilib.Field(apilib.ModelType(Branch))
+
+class FormatForLogTest(unittest.TestCase):
+    def test_single_line(self):
+        tree = Tree(label="it's", items=[Item(name='a', data=b'\x00\x01')], attrs={'y': 2, 'x': 1})
+        self.assertEqual(
+            "<Tree: {attrs: {'x': 1, 'y': 2}, items: [<Item: {data: <2 bytes>, name: 'a'}>], label: 'it\\'s'}>",
+            log_format.format_for_log(tree))
+
+    def test_max_items(self):
+        tree = Tree(items=[Item(name=str(i)) for i in range(5)])
+        self.assertEqual(
+            "<Tree: {items: [<Item: {name: '0'}>, <Item: {name: '1'}>, ... 3 more]}>",
+            log_format.format_for_log(tree, max_items=2))
+
+    def test_max_depth(self):
+        tree = Tree(label='a', child=Branch(label='b', child=Leaf(label='c', items=[Item()])))
+        self.assertEqual(
+            "<Tree: {child: <Branch: {child: <Leaf>, label: 'b'}>, label: 'a'}>",
+            log_format.format_for_log(tree, max_depth=2))
+        self.assertEqual('<Tree: {items: [... 1 items]}>',
+            log_format.format_for_log(Tree(items=[Item()]), max_depth=1))
+
+    def test_max_length(self):
+        tree = Tree(label='x' * 100000, items=[Item(name='a')] * 1000)
+        text = log_format.format_for_log(tree, max_length=50)
+        self.assertEqual(53, len(text))
+        self.assertTrue(text.startswith("<Tree: {items: [<Item: {name: 'a'}>"))
+        self.assertTrue(text.endswith('...'))
+
+    def test_lazy_values_not_decoded(self):
+        tree = Tree.from_json({'items': [{'name': 'a'}], 'label': 'b'}, lazy=True)
+        self.assertEqual("<Tree: {attrs: None, child: None, items: [{'name': 'a'}], label: 'b'}>", log_format.format_for_log(tree))
+        self.assertTrue(tree._has_lazy_values)
+
+    def test_log_repr_renders_lazily(self):
+        with mock.patch('apilib.log_format.format_for_log', return_value='rendered') as format_mock:
+            log_repr = log_format.LogRepr(Tree(), max_items=3)
+            self.assertFalse(format_mock.called)
+            self.assertEqual('rendered', str(log_repr))
+            format_mock.assert_called_once_with(log_repr.value, None, 3, None)
+
+class ServiceLoggingTest(unittest.TestCase):
+    def test_not_rendered_when_disabled(self):
+        with mock.patch('apilib.service.logger') as logger:
+            logger.isEnabledFor.return_value = False
+            FooServiceImpl().invoke('foo', FooRequest(request_str='a'))
+        self.assertFalse(logger.debug.called)
+
+    def test_debug_logging(self):
+        with mock.patch('apilib.service.logger') as logger:
+            logger.isEnabledFor.return_value = True
+            FooServiceImpl().invoke('foo', FooRequest(request_str='a'))
+        logger.isEnabledFor.assert_any_call(logging.DEBUG)
+        request_args = logger.debug.call_args_list[0][0]
+        self.assertEqual("<FooRequest: {request_str: 'a'}>", str(request_args[-1]))
+
+if __name__ == '__main__':
+    unittest.main()
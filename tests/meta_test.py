@@ -1,5 +1,7 @@
 from __future__ import absolute_import
 
+import threading
+import time
 import unittest
 
 import apilib
@@ -28,6 +30,32 @@ class FooService(apilib.Service):
         apilib.Meth('public_method', PublicRequest, PublicResponse, public=True),
         apilib.Meth('private_method', PrivateRequest, PrivateResponse, public=False))
 
+class Comment(apilib.Model):
+    text = apilib.Field(apilib.String())
+
+Comment.replies = apilib.Field(apilib.ListType(Comment))
+
+class Thread(apilib.Response):
+    comments = apilib.Field(apilib.DictType(Comment))
+    pinned = apilib.Field(apilib.ModelType(Comment))
+
+class CommentService(apilib.Service):
+    methods = apilib.servicemethods(
+        apilib.Meth('get_thread', PublicRequest, Thread),
+        apilib.Meth('unimplemented', None, None))
+
+def make_diamonds(num_levels):
+    '''Returns the root of a chain of diamonds, where each model references the two of the next level.'''
+    level = [type('Leaf', (apilib.Model,), {'value': apilib.Field(apilib.Integer())})]
+    for i in range(num_levels):
+        left, right = [type('Diamond%d%s' % (i, side), (apilib.Model,), {
+            'first': apilib.Field(apilib.ModelType(level[0])),
+            'second': apilib.Field(apilib.ListType(level[-1])),
+        }) for side in 'LR']
+        level = [left, right]
+    return type('Root', (apilib.Model,), {'left': apilib.Field(apilib.ModelType(level[0])),
+        'right': apilib.Field(apilib.ModelType(level[1]))})
+
 class MetaTest(unittest.TestCase):
     def test_get_model_classes(self):
         model_classes = apilib.get_model_classes_from_services([FooService])
@@ -50,5 +78,109 @@ class MetaTest(unittest.TestCase):
         self.assertNotIn(PrivateRequest, model_classes)
         self.assertNotIn(PrivateResponse, model_classes)
 
+    def test_self_referential_models(self):
+        self.assertEqual(set([Comment]), apilib.get_model_classes_from_model(Comment))
+        self.assertEqual(set([Comment, apilib.ApiError]), apilib.get_model_classes_from_model(Thread))
+        model_classes = apilib.get_model_classes_from_service(CommentService)
+        self.assertEqual(set([PublicRequest, ScalarModel, Thread, Comment, apilib.ApiError]), model_classes)
+        # Results are cached, but callers get their own copies.
+        model_classes.clear()
+        self.assertEqual(5, len(apilib.get_model_classes_from_service(CommentService)))
+        self.assertIn('Comment {1: text String, 2: replies ListType(ModelType(Comment))}',
+            apilib.describe_schema(Thread))
+
+    def test_large_schemas(self):
+        root = make_diamonds(2000)
+        model_classes = apilib.get_model_classes_from_model(root)
+        self.assertEqual(4001, len(model_classes))
+        graph = apilib.ModelGraph([root])
+        self.assertEqual(4002, len(graph.model_classes))
+        self.assertEqual(16, len(apilib.get_model_fingerprint(root)))
+
+class SlowLeaf(apilib.Model):
+    value = apilib.Field(apilib.Integer())
+
+    @classmethod
+    def init(cls):
+        # Widens the window in which another thread can see a half built graph.
+        time.sleep(0.05)
+        super(SlowLeaf, cls).init()
+
+class SlowRoot(apilib.Model):
+    leaf = apilib.Field(apilib.ModelType(SlowLeaf))
+
+class ModelGraphTest(unittest.TestCase):
+    def test_edges(self):
+        graph = apilib.get_service_model_graph(CommentService)
+        self.assertIs(graph, apilib.get_service_model_graph(CommentService))
+        self.assertEqual([
+            apilib.Edge(Thread, 'comments', Comment),
+            apilib.Edge(Thread, 'errors', apilib.ApiError),
+            apilib.Edge(Thread, 'pinned', Comment),
+        ], graph.get_edges(Thread))
+        self.assertEqual([apilib.Edge(Comment, 'replies', Comment)], graph.get_edges(Comment))
+        self.assertEqual(['comments', 'pinned', 'replies'],
+            sorted(edge.field_name for edge in graph.get_referencing_edges(Comment)))
+        self.assertEqual(frozenset([Comment]), graph.get_referenced_models(Comment))
+        self.assertEqual([], graph.get_edges(ScalarModel))
+
+    def test_threads(self):
+        graph = apilib.ModelGraph()
+        results = []
+        errors = []
+        def walk():
+            try:
+                results.append(graph.get_referenced_models(SlowRoot))
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=walk) for _ in range(2)]
+        threads[0].start()
+        time.sleep(0.01)
+        threads[1].start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        self.assertEqual([frozenset([SlowLeaf])] * 2, results)
+
+    def test_public_only(self):
+        self.assertNotIn(PrivateRequest, apilib.get_service_model_graph(FooService, public_only=True).model_classes)
+        self.assertIn(PrivateRequest, apilib.get_service_model_graph(FooService).model_classes)
+
+class FingerprintTest(unittest.TestCase):
+    def make_model(self, **fields):
+        return type('ScalarModel', (apilib.Model,), fields)
+
+    def test_model_fingerprint(self):
+        fingerprint = apilib.get_model_fingerprint(PublicRequest)
+        self.assertEqual(16, len(fingerprint))
+        self.assertEqual(fingerprint, apilib.get_model_fingerprint(PublicRequest))
+        self.assertNotEqual(fingerprint, apilib.get_model_fingerprint(ScalarModel))
+
+    def test_fingerprint_changes_with_schema(self):
+        base = self.make_model(fint=apilib.Field(apilib.Integer()), fstring=apilib.Field(apilib.String()))
+        same = self.make_model(fint=apilib.Field(apilib.Integer()), fstring=apilib.Field(apilib.String()))
+        self.assertEqual(apilib.get_model_fingerprint(base), apilib.get_model_fingerprint(same))
+        for other in [
+                self.make_model(fint=apilib.Field(apilib.Integer())),
+                self.make_model(fint=apilib.Field(apilib.Integer()), fstring=apilib.Field(apilib.Decimal())),
+                self.make_model(fint=apilib.Field(apilib.Integer()), fstring=apilib.Field(apilib.String(), tag=7)),
+                self.make_model(fint=apilib.Field(apilib.Integer()), fstring=apilib.Field(apilib.Enum(['a'])))]:
+            self.assertNotEqual(apilib.get_model_fingerprint(base), apilib.get_model_fingerprint(other))
+
+    def test_fingerprint_covers_enum_codes(self):
+        enum_model = self.make_model(fenum=apilib.Field(apilib.Enum(['a', 'b'])))
+        self.assertNotEqual(apilib.get_model_fingerprint(enum_model),
+            apilib.get_model_fingerprint(self.make_model(fenum=apilib.Field(apilib.Enum(['b', 'a'])))))
+        self.assertEqual(apilib.get_model_fingerprint(enum_model),
+            apilib.get_model_fingerprint(self.make_model(fenum=apilib.Field(apilib.Enum({'b': 1, 'a': 0})))))
+
+    def test_fingerprint_covers_nested_models(self):
+        self.assertIn('ScalarModel {1: fint Integer, 2: fstring String}', apilib.describe_schema(PublicRequest))
+
+    def test_service_fingerprint(self):
+        fingerprint = apilib.get_service_fingerprint(FooService)
+        self.assertEqual(16, len(fingerprint))
+        self.assertNotEqual(fingerprint, apilib.get_method_fingerprint(FooService.methods['public_method']))
+
 if __name__ == '__main__':
     unittest.main()
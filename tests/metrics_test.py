@@ -0,0 +1,164 @@
+from __future__ import absolute_import
+
+import json
+import threading
+import time
+import unittest
+
+import mock
+
+import apilib
+from apilib import metrics
+from tests.service_test import FooRequest
+from tests.service_test import FooServiceImpl
+
+class SlowValidator(apilib.Validator):
+    def validate(self, value, error_context, context):
+        time.sleep(0.01)
+        return value
+
+class ValidatedChild(apilib.Model):
+    request_str = apilib.Field(apilib.String(), [SlowValidator()])
+
+class ValidatedRequest(apilib.Request):
+    request_str = apilib.Field(apilib.String(), [SlowValidator()])
+    child = apilib.Field(apilib.ModelType(ValidatedChild))
+
+class ValidatedService(apilib.Service):
+    methods = apilib.servicemethods(apilib.Meth('foo', ValidatedRequest, apilib.Response))
+
+class ValidatedServiceImpl(ValidatedService, apilib.ServiceImplementation):
+    def foo(self, request):
+        return apilib.Response()
+
+class HistogramTest(unittest.TestCase):
+    def test_observe(self):
+        histogram = metrics.Histogram([1, 10])
+        for value in [0.5, 1, 5, 100]:
+            histogram.observe(value)
+        self.assertEqual([2, 1, 1], histogram.counts)
+        self.assertEqual(4, histogram.count)
+        self.assertEqual(106.5, histogram.sum)
+
+class MetricsRegistryTest(unittest.TestCase):
+    def test_threads_merged(self):
+        registry = metrics.MetricsRegistry()
+        def record():
+            method_metrics = registry.get_method_metrics('FooService', 'foo')
+            for _ in range(1000):
+                method_metrics.request_size.observe(10)
+                method_metrics.count_response('SUCCESS')
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        totals = registry.get_totals()[('FooService', 'foo')]
+        self.assertEqual(4000, totals.request_size.count)
+        self.assertEqual({'SUCCESS': 4000}, totals.responses)
+
+        registry.reset()
+        self.assertEqual({}, registry.get_totals())
+        registry.get_method_metrics('FooService', 'foo').count_response('SUCCESS')
+        self.assertEqual({'SUCCESS': 1}, registry.get_totals()[('FooService', 'foo')].responses)
+
+    def test_exited_threads_merged(self):
+        registry = metrics.MetricsRegistry()
+        def record():
+            registry.get_method_metrics('FooService', 'foo').count_response('SUCCESS')
+            registry.get_method_metrics('FooService', 'bar').count_response('SUCCESS')
+        for _ in range(200):
+            thread = threading.Thread(target=record)
+            thread.start()
+            thread.join()
+        record()
+        self.assertEqual(1, len(registry._threads))
+        self.assertEqual(2, len(registry._exited))
+        totals = registry.get_totals()
+        self.assertEqual({'SUCCESS': 201}, totals[('FooService', 'foo')].responses)
+        self.assertEqual({'SUCCESS': 201}, totals[('FooService', 'bar')].responses)
+
+        # Threads that exit after a reset don't bring back the old metrics.
+        thread = threading.Thread(target=lambda: registry.get_method_metrics('FooService', 'foo'))
+        thread.start()
+        registry.reset()
+        thread.join()
+        self.assertEqual({}, registry.get_totals())
+
+    def test_prometheus_text(self):
+        registry = metrics.MetricsRegistry()
+        with mock.patch('apilib.metrics.DURATION_BUCKETS', (0.1, 1.0)):
+            method_metrics = registry.get_method_metrics('FooService', 'foo')
+            registry.get_totals()
+        self.assertIs(method_metrics, registry.get_method_metrics('FooService', 'foo'))
+        method_metrics.observe_duration(metrics.HANDLER, 0.05)
+        method_metrics.observe_duration(metrics.HANDLER, 2.0)
+        method_metrics.count_response('SUCCESS')
+        method_metrics.count_response('SUCCESS')
+        registry.get_method_metrics('Foo"Service', 'foo').count_response('REQUEST_ERROR')
+        lines = registry.to_prometheus().splitlines()
+        self.assertIn('# TYPE apilib_stage_duration_seconds histogram', lines)
+        labels = 'service="FooService",method="foo",stage="handler"'
+        self.assertIn('apilib_stage_duration_seconds_bucket{%s,le="0.1"} 1' % labels, lines)
+        self.assertIn('apilib_stage_duration_seconds_bucket{%s,le="1.0"} 1' % labels, lines)
+        self.assertIn('apilib_stage_duration_seconds_bucket{%s,le="+Inf"} 2' % labels, lines)
+        self.assertIn('apilib_stage_duration_seconds_sum{%s} 2.05' % labels, lines)
+        self.assertIn('apilib_stage_duration_seconds_count{%s} 2' % labels, lines)
+        self.assertIn('apilib_responses_total{service="FooService",method="foo",code="SUCCESS"} 2', lines)
+        self.assertIn('apilib_responses_total{service="Foo\\"Service",method="foo",code="REQUEST_ERROR"} 1', lines)
+        # Histograms without observations are left out.
+        self.assertFalse([line for line in lines if 'stage="decode"' in line])
+
+        registry.reset()
+        self.assertNotIn('apilib_responses_total{', registry.to_prometheus())
+
+class ServiceMetricsTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch('apilib.metrics.ENABLED', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def test_invoke_with_body(self):
+        body = FooRequest(request_str='blah').to_json_str().encode('utf-8')
+        response = FooServiceImpl().invoke_with_body('foo', body)
+        method_metrics = metrics.registry.get_totals()[('FooService', 'foo')]
+        for stage in metrics.STAGES:
+            self.assertEqual(1, method_metrics.durations[stage].count)
+        self.assertEqual(len(body), method_metrics.request_size.sum)
+        self.assertEqual(len(response.body), method_metrics.response_size.sum)
+        self.assertEqual({'SUCCESS': 1}, method_metrics.responses)
+
+    def test_metrics_looked_up_once_per_call(self):
+        body = FooRequest(request_str='blah').to_json_str().encode('utf-8')
+        with mock.patch.object(metrics.registry, 'get_method_metrics',
+                wraps=metrics.registry.get_method_metrics) as get_method_metrics:
+            FooServiceImpl().invoke_with_body('foo', body)
+            FooServiceImpl().invoke_with_json('foo', {'request_str': 'blah'})
+            FooServiceImpl().invoke_with_json_str('foo', '{"request_str": "blah"}')
+        self.assertEqual(3, get_method_metrics.call_count)
+        self.assertEqual({'SUCCESS': 3}, metrics.registry.get_totals()[('FooService', 'foo')].responses)
+
+    def test_request_errors(self):
+        FooServiceImpl().invoke_with_json_str('foo', '{}')
+        FooServiceImpl().invoke_with_json('foo', {})
+        method_metrics = metrics.registry.get_totals()[('FooService', 'foo')]
+        self.assertEqual({'REQUEST_ERROR': 2}, method_metrics.responses)
+        self.assertEqual(0, method_metrics.durations[metrics.HANDLER].count)
+        self.assertEqual(2, method_metrics.durations[metrics.ENCODE].count)
+
+    def test_validation_timed_separately(self):
+        ValidatedServiceImpl().invoke_with_json('foo', {'request_str': 'a', 'child': {'request_str': 'b'}})
+        method_metrics = metrics.registry.get_totals()[('ValidatedService', 'foo')]
+        self.assertGreaterEqual(method_metrics.durations[metrics.VALIDATE].sum, 0.02)
+        self.assertLess(method_metrics.durations[metrics.DECODE].sum, 0.01)
+
+    def test_disabled(self):
+        with mock.patch('apilib.metrics.ENABLED', False):
+            response = FooServiceImpl().invoke_with_json_str('foo', '{"request_str": "a"}')
+        self.assertEqual('SUCCESS', json.loads(response)['response_code'])
+        self.assertEqual({}, metrics.registry.get_totals())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,18 @@
 from __future__ import absolute_import
 
+import copy
 import datetime
 import decimal
+import json
+import os
+import pickle
+import subprocess
+import sys
+import threading
 import unittest
 
 from dateutil import tz
+import mock
 import six
 
 import apilib
@@ -744,6 +752,405 @@ class DeepNestingTest(unittest.TestCase):
         self.assertEqual('blah', m.fdeep['a'][0].fstring)
 
 
+class LazyDecodingTest(unittest.TestCase):
+    def test_nested_models_decoded_on_access(self):
+        m = BasicParentModel.from_json({'lchild': [{'fstring': u'b'}, None], 'fchild': {'fstring': u'a'}}, lazy=True)
+        self.assertTrue(m._has_lazy_values)
+        self.assertIsInstance(m._data['fchild'], apilib.model._LazyValue)
+        self.assertEqual('a', m.fchild.fstring)
+        self.assertIsInstance(m._data['fchild'], BasicChildModel)
+        self.assertIsInstance(m._data['lchild'], apilib.model._LazyValue)
+        self.assertEqual(2, len(m.lchild))
+        self.assertEqual('b', m.lchild[0].fstring)
+        self.assertIsNone(m.lchild[1])
+
+    def test_scalars_decoded_eagerly(self):
+        m = ModelWithDates.from_json({'fdate': '2016-02-03'}, lazy=True)
+        self.assertFalse(m._has_lazy_values)
+        self.assertEqual(datetime.date(2016, 2, 3), m.fdate)
+
+    def test_serialize(self):
+        obj = {'fdeep': {'a': [{'fstring': u'blah'}]}}
+        m = DeeplyNested.from_json(obj, lazy=True)
+        self.assertEqual(DeeplyNested.from_json(obj).to_json(), m.to_json())
+        self.assertFalse(m._has_lazy_values)
+        self.assertEqual(DeeplyNested.from_json(obj), DeeplyNested.from_json(obj, lazy=True))
+
+    def test_values_decoded_once(self):
+        class Parent(apilib.Model):
+            ldates = apilib.Field(apilib.ListType(ModelWithDates))
+        obj = {'ldates': [{'fdatetime': '2016-02-03T04:05:06Z'}, {'fdatetime': '2017-02-03T04:05:06Z'}]}
+        with mock.patch.object(apilib.model, '_parse_datetime', wraps=apilib.model._parse_datetime) as parse:
+            m = Parent.from_json(obj, lazy=True)
+            self.assertEqual(2, parse.call_count)
+            self.assertEqual(Parent.from_json(obj).to_json(), m.to_json())
+            self.assertEqual(4, parse.call_count)
+
+    def test_errors_reported_up_front(self):
+        with self.assertRaises(apilib.DeserializationError) as e:
+            DeeplyNested.from_json({'fdeep': {'a': [{'fstring': 1}, {'foo': 'bar'}]}}, lazy=True)
+        self.assertEqual(['fdeep["a"][0].fstring', 'fdeep["a"][1].foo'], [error.path for error in e.exception.errors])
+
+        with self.assertRaises(apilib.DeserializationError) as e:
+            DeeplyNested.from_json({'fdeep': ['a']}, lazy=True)
+        self.assertEqual(apilib.CommonErrorCodes.INVALID_TYPE, e.exception.errors[0].code)
+        self.assertEqual('fdeep', e.exception.errors[0].path)
+
+
+class ParallelListModel(apilib.Model):
+    lchild = apilib.Field(apilib.ListType(BasicScalarModel, parallel=True))
+    llint = apilib.Field(apilib.ListType(apilib.ListType(apilib.Integer(), parallel=True), parallel=True))
+    lsequential = apilib.Field(apilib.ListType(apilib.Integer(), parallel=False))
+
+class ParallelDecodingTest(unittest.TestCase):
+    def setUp(self):
+        self.original_settings = (apilib.model.PARALLEL_DECODING_WORKERS, apilib.model.PARALLEL_DECODING_THRESHOLD)
+        apilib.model.PARALLEL_DECODING_WORKERS = 3
+        apilib.model.PARALLEL_DECODING_THRESHOLD = 2
+
+    def tearDown(self):
+        apilib.model.PARALLEL_DECODING_WORKERS, apilib.model.PARALLEL_DECODING_THRESHOLD = self.original_settings
+
+    def test_decode(self):
+        obj = {
+            'lchild': [{'fint': i} for i in range(50)] + [None],
+            'llint': [list(range(i)) for i in range(20)],
+        }
+        m = ParallelListModel.from_json(obj)
+        self.assertEqual(list(range(50)), [c.fint for c in m.lchild[:-1]])
+        self.assertIsNone(m.lchild[-1])
+        self.assertEqual(obj['llint'], m.llint)
+
+    def test_errors_in_index_order(self):
+        obj = {'lchild': [{'fint': 'x' if i % 7 == 0 else i} for i in range(30)], 'llint': [[1, 'a'], [], ['b']]}
+        with self.assertRaises(apilib.DeserializationError) as e:
+            ParallelListModel.from_json(obj)
+        self.assertEqual(['lchild[%d].fint' % i for i in range(0, 30, 7)] + ['llint[0][1]', 'llint[2][0]'],
+            [error.path for error in e.exception.errors])
+
+    def test_workers_changed_concurrently(self):
+        obj = {'lchild': [{'fint': i} for i in range(20)]}
+        errors = []
+        def decode():
+            try:
+                for _ in range(20):
+                    self.assertEqual(20, len(ParallelListModel.from_json(obj).lchild))
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=decode) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for workers in [1, 2, 3, 4] * 10:
+            apilib.model.PARALLEL_DECODING_WORKERS = workers
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+
+    def test_sequential_below_threshold(self):
+        apilib.model.PARALLEL_DECODING_THRESHOLD = 100
+        with mock.patch('apilib.model._submit_decoding_tasks') as submit:
+            m = ParallelListModel.from_json({'lchild': [{'fint': 1}] * 10})
+        self.assertFalse(submit.called)
+        self.assertEqual(10, len(m.lchild))
+
+    def test_parallel_false(self):
+        with mock.patch('apilib.model._submit_decoding_tasks') as submit:
+            m = ParallelListModel.from_json({'lsequential': list(range(10))})
+        self.assertFalse(submit.called)
+        self.assertEqual(list(range(10)), m.lsequential)
+
+class StateSubclassChild(BasicChildModel):
+    fextra = apilib.Field(apilib.Integer())
+
+class ModelStateTest(unittest.TestCase):
+    def assertStateRoundTrip(self, m):
+        state = pickle.loads(pickle.dumps(m._get_state(), pickle.HIGHEST_PROTOCOL))
+        restored = type(m)._from_state(state)
+        self.assertEqual(m._data.keys(), restored._data.keys())
+        self.assertEqual(m, restored)
+        return restored
+
+    def test_round_trip(self):
+        m = DeeplyNested(fdeep={'a': [BasicScalarModel(fstring='blah', fint=1), None], 'b': None})
+        self.assertEqual(({'a': [('blah', 1, None, None, 0b1100), None], 'b': None}, 0), m._get_state())
+        self.assertStateRoundTrip(m)
+        self.assertStateRoundTrip(DeeplyNested.from_json({'fdeep': None}))
+
+        m = self.assertStateRoundTrip(BasicParentModel(lchild=[StateSubclassChild(fstring='a', fextra=2)]))
+        self.assertEqual(2, m.lchild[0].fextra)
+
+    def test_unset_fields_omitted(self):
+        m = BasicScalarModel(fint=1)
+        self.assertEqual((None, 1, None, None, 0b1101), m._get_state())
+        self.assertEqual({'fint': 1}, self.assertStateRoundTrip(m).to_json())
+        self.assertEqual({}, self.assertStateRoundTrip(BasicScalarModel()).to_json())
+
+    def test_lazy_values_decoded(self):
+        m = BasicParentModel.from_json({'fchild': {'fstring': u'a'}}, lazy=True)
+        self.assertEqual('a', self.assertStateRoundTrip(m).fchild.fstring)
+
+class CopyTestModel(apilib.Model):
+    fstring = apilib.Field(apilib.String())
+    fbytes = apilib.Field(apilib.Bytes())
+    fdatetime = apilib.Field(apilib.DateTime())
+    fany = apilib.Field(apilib.AnyPrimitive())
+    fchild = apilib.Field(apilib.ModelType(BasicChildModel))
+    lchild = apilib.Field(apilib.ListType(BasicChildModel))
+    dlint = apilib.Field(apilib.DictType(apilib.ListType(apilib.Integer())))
+
+class PickleAndCopyTest(unittest.TestCase):
+    def make_model(self):
+        child = BasicChildModel(fstring='child')
+        return CopyTestModel(fstring='a', fbytes=bytearray(b'xy'), fdatetime=datetime.datetime(2016, 1, 1, tzinfo=tz.tzutc()),
+            fany={'a': [1]}, fchild=child, lchild=[child, StateSubclassChild(fextra=1), None], dlint={'a': [1, 2]})
+
+    def test_pickle(self):
+        m = self.make_model()
+        for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+            restored = pickle.loads(pickle.dumps(m, protocol))
+            self.assertEqual(m, restored)
+            self.assertEqual(1, restored.lchild[1].fextra)
+        self.assertLess(len(pickle.dumps(m, 2)), len(pickle.dumps(m.__dict__, 2)))
+
+    def test_pickle_with_changed_fields(self):
+        def make_class(*names):
+            fields = [(name, apilib.Field(apilib.String())) for name in names]
+            cls = type('SwappedModel', (apilib.Model,), dict(fields))
+            cls.__module__ = __name__
+            return cls
+        module = sys.modules[__name__]
+        with mock.patch.object(module, 'SwappedModel', make_class('a', 'b'), create=True):
+            data = pickle.dumps(module.SwappedModel(a='x'))
+        with mock.patch.object(module, 'SwappedModel', make_class('a', 'b'), create=True):
+            self.assertEqual('x', pickle.loads(data).a)
+        for names in [('b', 'a'), ('a', 'b', 'c'), ('a',)]:
+            with mock.patch.object(module, 'SwappedModel', make_class(*names), create=True):
+                with self.assertRaises(apilib.SchemaMismatchException):
+                    pickle.loads(data)
+
+    def test_pickle_preserves_instance_attributes(self):
+        m = BasicChildModel(fstring='a')
+        m.note = 'extra'
+        self.assertEqual('extra', pickle.loads(pickle.dumps(m)).note)
+
+    def test_copy(self):
+        m = self.make_model()
+        m2 = copy.copy(m)
+        self.assertEqual(m, m2)
+        m2.fstring = 'b'
+        self.assertEqual('a', m.fstring)
+        self.assertIs(m.fchild, m2.fchild)
+
+    def test_deepcopy(self):
+        m = self.make_model()
+        m2 = copy.deepcopy(m)
+        self.assertEqual(m, m2)
+        self.assertIs(m.fstring, m2.fstring)
+        self.assertIs(m.fdatetime, m2.fdatetime)
+        self.assertIsNot(m.fbytes, m2.fbytes)
+        self.assertIsNot(m.fchild, m2.fchild)
+        # Shared references are preserved.
+        self.assertIs(m2.fchild, m2.lchild[0])
+        self.assertIsInstance(m2.lchild[1], StateSubclassChild)
+        m2.fchild.fstring = 'changed'
+        m2.fany['a'].append(2)
+        m2.dlint['a'].append(3)
+        self.assertEqual('child', m.fchild.fstring)
+        self.assertEqual({'a': [1]}, m.fany)
+        self.assertEqual({'a': [1, 2]}, m.dlint)
+
+    def test_deepcopy_lazy(self):
+        m = BasicParentModel.from_json({'fchild': {'fstring': u'a'}}, lazy=True)
+        m2 = copy.deepcopy(m)
+        self.assertEqual('a', m2.fchild.fstring)
+        self.assertIsNot(m.fchild, m2.fchild)
+
+class EvolveTest(unittest.TestCase):
+    def make_model(self):
+        return CopyTestModel(fstring='a', fchild=BasicChildModel(fstring='child'),
+            lchild=[BasicChildModel(fstring='0'), BasicChildModel(fstring='1')], dlint={'a': [1, 2], 'b': [3]})
+
+    def test_evolve(self):
+        m = self.make_model()
+        m2 = m.evolve(fstring='b')
+        self.assertEqual('b', m2.fstring)
+        self.assertEqual('a', m.fstring)
+        self.assertIs(m.fchild, m2.fchild)
+        self.assertIs(m.lchild, m2.lchild)
+
+        m3 = m.evolve()
+        self.assertEqual(m, m3)
+        self.assertIsNot(m, m3)
+
+    def test_nested(self):
+        m = self.make_model()
+        m2 = m.evolve(fchild__fstring='changed', lchild__1__fstring='one', dlint__a=[5], fstring='b')
+        self.assertEqual('changed', m2.fchild.fstring)
+        self.assertEqual('child', m.fchild.fstring)
+        self.assertEqual(['0', 'one'], [c.fstring for c in m2.lchild])
+        self.assertEqual(['0', '1'], [c.fstring for c in m.lchild])
+        self.assertIs(m.lchild[0], m2.lchild[0])
+        self.assertEqual({'a': [5], 'b': [3]}, m2.dlint)
+        self.assertEqual({'a': [1, 2], 'b': [3]}, m.dlint)
+        self.assertIs(m.dlint['b'], m2.dlint['b'])
+
+        m3 = m.evolve(lchild__0=None, lchild__1__fstring='x')
+        self.assertEqual([None, 'x'], [c and c.fstring for c in m3.lchild])
+
+    def test_values_normalized(self):
+        m = BasicParentModel(lchild=[BasicChildModel()]).evolve(lchild=(BasicChildModel(fstring='a'),))
+        self.assertEqual([BasicChildModel(fstring='a')], m.lchild)
+
+    def test_errors(self):
+        m = self.make_model()
+        with self.assertRaises(apilib.UnknownFieldException):
+            m.evolve(foo=1)
+        with self.assertRaises(apilib.UnknownFieldException):
+            m.evolve(fchild__foo=1)
+        for changes in [{'lchild__2__fstring': 'x'}, {'lchild__x__fstring': 'x'}, {'fstring__x': 'y'},
+                {'fany__a': 1}, {'fchild': None, 'fchild__fstring': 'x'}]:
+            with self.assertRaises(ValueError):
+                m.evolve(**changes)
+
+class DirtyTrackingTest(unittest.TestCase):
+    def make_model(self):
+        return CopyTestModel(fstring='a', fchild=BasicChildModel(fstring='child'),
+            lchild=[BasicChildModel(fstring='0'), BasicChildModel(fstring='1')], dlint={'a': [1, 2]}).mark_clean()
+
+    def test_untracked(self):
+        m = CopyTestModel(fstring='a', fchild=None)
+        self.assertEqual(set(['fstring', 'fchild']), m.get_dirty_fields())
+        self.assertEqual(set(), CopyTestModel().get_dirty_fields())
+
+    def test_set_fields(self):
+        m = self.make_model()
+        self.assertFalse(m.is_dirty())
+        m.fstring = 'a'
+        m.fdatetime = None
+        self.assertEqual(set(['fstring', 'fdatetime']), m.get_dirty_fields())
+        m.mark_clean()
+        self.assertEqual(set(), m.get_dirty_fields())
+
+    def test_unset_fields(self):
+        m = self.make_model()
+        m2 = m.apply_patch(apilib.Patch(CopyTestModel, unset=['fstring', 'fchild']))
+        self.assertEqual(set(['fstring', 'fchild']), m2.get_dirty_fields())
+        self.assertFalse(m.is_dirty())
+
+    def test_nested_models(self):
+        m = self.make_model()
+        m.fchild.fstring = 'changed'
+        self.assertEqual(set(['fchild']), m.get_dirty_fields())
+        self.assertEqual(set(['fstring']), m.fchild.get_dirty_fields())
+
+        m = self.make_model()
+        m.lchild[1].fstring = 'changed'
+        self.assertEqual(set(['lchild']), m.get_dirty_fields())
+
+    def test_containers(self):
+        for mutate in [lambda m: m.lchild.append(None), lambda m: m.lchild.pop(),
+                lambda m: m.lchild.__setitem__(0, BasicChildModel(fstring='0')), lambda m: m.lchild.reverse(),
+                lambda m: m.dlint.__setitem__('b', []), lambda m: m.dlint.pop('a')]:
+            m = self.make_model()
+            mutate(m)
+            self.assertEqual(1, len(m.get_dirty_fields()))
+
+        # Lists nested in dicts aren't tracked.
+        m = self.make_model()
+        m.dlint['a'].append(3)
+        self.assertFalse(m.is_dirty())
+
+    def test_copies(self):
+        m = self.make_model()
+        m2 = m.evolve(fstring='b', lchild__0__fstring='x')
+        self.assertEqual(set(['fstring', 'lchild']), m2.get_dirty_fields())
+        self.assertFalse(m.is_dirty())
+
+        m2 = copy.deepcopy(m)
+        m2.fchild.fstring = 'x'
+        self.assertEqual(set(['fchild']), m2.get_dirty_fields())
+        self.assertFalse(m.is_dirty())
+
+        m2 = pickle.loads(pickle.dumps(m))
+        m2.lchild[0].fstring = 'x'
+        self.assertEqual(set(['lchild']), m2.get_dirty_fields())
+
+    def test_lazy_values(self):
+        m = BasicParentModel.from_json({'fchild': {'fstring': u'a'}}, lazy=True).mark_clean()
+        self.assertEqual('a', m.fchild.fstring)
+        self.assertFalse(m.is_dirty())
+
+class InternedModel(apilib.Model):
+    fenum = apilib.Field(apilib.Enum(['RED', 'GREEN']))
+    fstring = apilib.Field(apilib.String(intern=True))
+    lstring = apilib.Field(apilib.ListType(apilib.String(intern=True)))
+    fplain = apilib.Field(apilib.String())
+
+class InterningTest(unittest.TestCase):
+    def decode_twice(self, decode):
+        obj = {'fenum': u'RED', 'fstring': u'Springfield', 'lstring': [u'a', u'b'], 'fplain': u'x'}
+        # Equal strings created separately, as they would be by a parser.
+        obj2 = json.loads(json.dumps(obj))
+        self.assertIsNot(obj['fstring'], obj2['fstring'])
+        return decode(obj), decode(obj2)
+
+    def test_from_json(self):
+        m, m2 = self.decode_twice(InternedModel.from_json)
+        self.assertIs(m.fenum, m2.fenum)
+        self.assertIs(m.fstring, m2.fstring)
+        self.assertIs(m.lstring[1], m2.lstring[1])
+        self.assertIsNot(m.fplain, m2.fplain)
+        self.assertEqual('Springfield', m.fstring)
+
+    def test_binary(self):
+        m, m2 = self.decode_twice(lambda obj: InternedModel.from_bytes(InternedModel.from_json(obj).to_bytes()))
+        self.assertIs(m.fenum, m2.fenum)
+        self.assertIs(m.fstring, m2.fstring)
+        self.assertIs(m.lstring[0], m2.lstring[0])
+
+    def test_assignment(self):
+        value = u''.join([u'Spring', u'field'])
+        self.assertIs(InternedModel(fstring=u'Springfield').fstring, InternedModel(fstring=value).fstring)
+        self.assertIs(InternedModel.fenum.get_type().normalize(u''.join([u'GR', u'EEN'])),
+            InternedModel(fenum=u'GREEN').fenum)
+        # Invalid values are left for validation to report.
+        self.assertEqual(['RED'], InternedModel(fenum=['RED']).fenum)
+        self.assertEqual(3, InternedModel(fstring=3).fstring)
+
+    def test_table_bounded(self):
+        field_type = apilib.String(intern=True)
+        with mock.patch('apilib.model.STRING_INTERN_TABLE_SIZE', 2):
+            first = field_type.normalize(u''.join([u'a', u'b']))
+            field_type.normalize(u'c')
+            field_type.normalize(u'd')
+            self.assertEqual(1, len(field_type._intern_table))
+            self.assertIsNot(first, field_type.normalize(u''.join([u'a', u'b'])))
+
+    def test_subclass_without_super_init(self):
+        class Model(apilib.Model):
+            fstring = apilib.Field(StringSubclassWithoutInit())
+        self.assertEqual('x', Model(fstring='x').fstring)
+        self.assertEqual('y', Model.from_json({'fstring': 'y'}).fstring)
+
+    def test_threads(self):
+        field_type = apilib.String(intern=True)
+        values = [u'value%d' % (i % 50) for i in range(5000)]
+        results = []
+        def normalize():
+            results.append([field_type.normalize(u''.join(value)) for value in values])
+        with mock.patch('apilib.model.STRING_INTERN_TABLE_SIZE', 40):
+            threads = [threading.Thread(target=normalize) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual([values] * 4, results)
+        self.assertLessEqual(len(field_type._intern_table), 40)
+
+class StringSubclassWithoutInit(apilib.String):
+    def __init__(self):
+        pass
+
 class ArbitraryPrimitivesModel(apilib.Model):
     fany = apilib.Field(apilib.AnyPrimitive())
     lany = apilib.Field(apilib.ListType(apilib.AnyPrimitive()))
@@ -931,5 +1338,80 @@ class HashAndEqualityTest(unittest.TestCase):
         self.assertIsNotNone(hash(m))
         self.assertEqual(hash(m), hash(m2))
 
+class RawJsonChild(apilib.Model):
+    fraw = apilib.Field(apilib.RawJson())
+
+class RawJsonModel(apilib.Model):
+    fstring = apilib.Field(apilib.String())
+    fraw = apilib.Field(apilib.RawJson())
+    lchild = apilib.Field(apilib.ListType(RawJsonChild))
+    dchild = apilib.Field(apilib.DictType(RawJsonChild))
+
+class RawJsonTest(unittest.TestCase):
+    def test_instantiate(self):
+        m = RawJsonModel(fraw={'a': [1, 2]})
+        self.assertEqual(apilib.RawJsonValue('{"a": [1, 2]}'), m.fraw)
+        self.assertEqual({'fraw': {'a': [1, 2]}}, m.to_json())
+
+        m = RawJsonModel(fraw=apilib.RawJsonValue('[1,2]'))
+        self.assertEqual('[1,2]', m.fraw.text)
+        self.assertEqual([1, 2], m.fraw.loads())
+
+    def test_round_trip_preserves_text(self):
+        json_str = '{"fstring": "s", "fraw": {"b":1,  "a": [true, null]}, "lchild": [{"fraw":"x\\"y"}, null, {"fraw": 1.50}], "dchild": {"k": {"fraw": [ ]}}}'
+        m = RawJsonModel.from_json_str(json_str)
+        self.assertEqual('s', m.fstring)
+        self.assertEqual('{"b":1,  "a": [true, null]}', m.fraw.text)
+        self.assertEqual('"x\\"y"', m.lchild[0].fraw.text)
+        self.assertIsNone(m.lchild[1])
+        self.assertEqual('1.50', m.lchild[2].fraw.text)
+        self.assertEqual('[ ]', m.dchild['k'].fraw.text)
+
+        encoded = m.to_json_str()
+        self.assertIn('"fraw": {"b":1,  "a": [true, null]}', encoded)
+        self.assertIn('"fraw": 1.50', encoded)
+        self.assertEqual(RawJsonModel.from_json_str(json_str).to_json(), RawJsonModel.from_json_str(encoded).to_json())
+
+    def test_deserialize_errors(self):
+        with self.assertRaises(apilib.DeserializationError) as e:
+            RawJsonModel.from_json_str('{"lchild": [{"fraw": 1, "x": 2}], "foo": 2}')
+        self.assertEqual(['foo', 'lchild[0].x'], sorted(error.path for error in e.exception.errors))
+
+        for invalid in ['{"fraw": }', '{"fraw": 1', '{"fraw": 1} x', '{"lchild": [{"fraw": 1} {}]}']:
+            with self.assertRaises(ValueError):
+                RawJsonModel.from_json_str(invalid)
+
+    def test_models_without_raw_json(self):
+        self.assertFalse(BasicScalarModel._contains_raw_json())
+        self.assertTrue(RawJsonModel._contains_raw_json())
+        self.assertEqual('{"fstring": "a"}', BasicScalarModel(fstring='a').to_json_str())
+
+class LazyImportTest(unittest.TestCase):
+    def test_heavy_dependencies_not_imported(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(apilib.__file__)))
+        output = subprocess.check_output([sys.executable, '-c',
+            'import sys, apilib; print(sorted(set(["requests", "dateutil", "hashids"]) & set(sys.modules)))'],
+            cwd=root)
+        self.assertEqual('[]', output.decode('utf-8').strip())
+
+    def test_namespace(self):
+        import requests
+        from dateutil import parser
+        self.assertIs(requests.post, apilib.requests.post)
+        self.assertIs(requests.post, apilib.service.requests.post)
+        self.assertIs(parser.parse, apilib.dateutil_parser.parse)
+        self.assertIs(parser.parse, apilib.model.dateutil_parser.parse)
+        self.assertTrue(apilib.dateutil_parser)
+        self.assertFalse(hasattr(apilib.requests, '__wrapped__'))
+        with self.assertRaises(AttributeError):
+            apilib.not_an_attribute
+
+    def test_missing_module(self):
+        module = apilib.model._LazyModule('not_an_installed_module')
+        self.assertFalse(module)
+        with self.assertRaises(ImportError):
+            module.foo
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,104 @@
+from __future__ import absolute_import
+
+import datetime
+import decimal
+import unittest
+
+from dateutil import tz
+
+import apilib
+from apilib import msgpack_encoding
+from tests.binary_test import AllTypesModel
+from tests.binary_test import Child
+from tests.binary_test import RequiredChild
+from tests.binary_test import ValidatedModel
+
+apilib.model.ID_ENCRYPTION_KEY = 'test'
+
+msgpack = msgpack_encoding.msgpack
+
+@unittest.skipIf(msgpack is None, 'msgpack is not installed')
+class MsgpackTest(unittest.TestCase):
+    def assertRoundTrip(self, m):
+        decoded = type(m).from_msgpack(m.to_msgpack())
+        self.assertEqual(type(m).from_json(m.to_json()).to_json(), decoded.to_json())
+        return decoded
+
+    def test_all_types(self):
+        m = AllTypesModel(
+            fstring=u'héllo',
+            fbytes=b'\x00\xff',
+            fint=-1234567890123,
+            ffloat=2.5,
+            fbool=False,
+            fdatetime=datetime.datetime(2016, 3, 4, 5, 6, 7, 8910, tzinfo=tz.tzutc()),
+            fdate=datetime.date(1901, 2, 3),
+            fdecimal=decimal.Decimal('-12.340'),
+            fenum='B',
+            fid=12345,
+            fany={'a': [1, 2.0, None, True, 'x', {}]},
+            fraw=apilib.RawJsonValue('[1, 2]'),
+            fchild=Child(fstring='child'),
+            lchild=[Child(fint=1), None, Child()],
+            dint={'a': 1, 'b': None},
+            llstring=[['a', None], [], None])
+        decoded = self.assertRoundTrip(m)
+        self.assertEqual(b'\x00\xff', decoded.fbytes)
+        self.assertEqual(m.fdatetime, decoded.fdatetime)
+        self.assertEqual('-12.340', str(decoded.fdecimal))
+        self.assertEqual('[1, 2]', decoded.fraw.text)
+
+    def test_native_types(self):
+        m = AllTypesModel(fbytes=b'\x00\xff', fid=99,
+            fdatetime=datetime.datetime(2016, 1, 1, tzinfo=tz.tzutc()))
+        obj = msgpack.unpackb(m.to_msgpack(), raw=False)
+        self.assertEqual(b'\x00\xff', obj['fbytes'])
+        self.assertEqual(apilib.EncryptedId().to_json(99), obj['fid'])
+        self.assertIsInstance(obj['fdatetime'], msgpack.Timestamp)
+
+        # Timestamps are instants, so the UTC offset isn't preserved.
+        value = datetime.datetime(2016, 3, 4, 5, 6, 7, 8910, tzinfo=tz.tzoffset(None, -7 * 3600))
+        m = AllTypesModel.from_msgpack(AllTypesModel(fdatetime=value).to_msgpack())
+        self.assertEqual(value, m.fdatetime)
+        self.assertEqual(datetime.timedelta(0), m.fdatetime.utcoffset())
+
+        # Naive datetimes have no instant, so they use their JSON representation.
+        m = AllTypesModel.from_msgpack(AllTypesModel(fdatetime=datetime.datetime(2016, 1, 1)).to_msgpack())
+        self.assertEqual(datetime.datetime(2016, 1, 1), m.fdatetime)
+
+    def test_json_representations_accepted(self):
+        data = msgpack.packb({'fdatetime': '2016-01-01T00:00:00Z', 'fraw': [1]})
+        m = AllTypesModel.from_msgpack(data)
+        self.assertEqual(datetime.datetime(2016, 1, 1, tzinfo=tz.tzutc()), m.fdatetime)
+        self.assertEqual([1], m.fraw.loads())
+
+    def test_errors(self):
+        data = msgpack.packb({'fint': 'x', 'lchild': [{'foo': 1}], 'fchild': 3})
+        ec = apilib.ErrorContext()
+        self.assertIsNone(AllTypesModel.from_msgpack(data, ec))
+        self.assertEqual([('fchild', 'INVALID_TYPE'), ('fint', 'INVALID_TYPE'), ('lchild[0].foo', 'UNKNOWN_FIELD')],
+            sorted((e.path, e.code) for e in ec.all_errors()))
+
+        with self.assertRaises(ValueError):
+            Child.from_msgpack(b'\x81\xa1')
+
+    def test_validation(self):
+        ec = apilib.ErrorContext()
+        m = ValidatedModel.from_msgpack(ValidatedModel(fchild=Child(), fint=0).to_msgpack(), ec, apilib.ValidationContext())
+        self.assertIsNone(m)
+        self.assertEqual([('fchild.fstring', 'REQUIRED'), ('fint', 'VALUE_NOT_IN_RANGE')],
+            sorted((e.path, e.code) for e in ec.all_errors()))
+
+        m = ValidatedModel.from_msgpack(ValidatedModel(fchild=RequiredChild(fstring='a'), fint=1, fro='x').to_msgpack(),
+            context=apilib.ValidationContext())
+        self.assertEqual(1, m.fint)
+        self.assertIsNone(m.fro)
+
+    def test_content_codec(self):
+        codec = apilib.get_content_codec('application/x-msgpack')
+        self.assertIs(codec, apilib.get_content_codec(apilib.MSGPACK_CONTENT_TYPE))
+        self.assertIs(codec, apilib.negotiate_content_codec('application/msgpack, application/json;q=0.5'))
+        self.assertEqual(3, codec.decode(Child, codec.encode(Child(fint=3))).fint)
+
+if __name__ == '__main__':
+    unittest.main()
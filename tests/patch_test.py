@@ -0,0 +1,188 @@
+from __future__ import absolute_import
+
+import datetime
+import unittest
+
+from dateutil import tz
+
+import apilib
+
+class Address(apilib.Model):
+    street = apilib.Field(apilib.String())
+    city = apilib.Field(apilib.String())
+
+class Course(apilib.Model):
+    name = apilib.Field(apilib.String())
+    grade = apilib.Field(apilib.Integer(), validators=[apilib.Range(0, 100)])
+
+class Student(apilib.Model):
+    id = apilib.Field(apilib.String(), readonly=['mutate/UPDATE'])
+    name = apilib.Field(apilib.String(), required=True)
+    nickname = apilib.Field(apilib.String())
+    enrolled = apilib.Field(apilib.DateTime())
+    address = apilib.Field(apilib.ModelType(Address))
+    courses = apilib.Field(apilib.ListType(Course))
+    tags = apilib.Field(apilib.ListType(apilib.String()))
+
+def make_student():
+    return Student(id='s1', name='Alice', nickname='Al', enrolled=datetime.datetime(2016, 1, 1, tzinfo=tz.tzutc()),
+        address=Address(street='1 Main St', city='Springfield'),
+        courses=[Course(name='Math', grade=80), Course(name='Art', grade=90)], tags=['a'])
+
+class DiffTest(unittest.TestCase):
+    def test_no_changes(self):
+        student = make_student()
+        patch = student.diff(make_student())
+        self.assertTrue(patch.is_empty())
+        self.assertFalse(patch)
+        self.assertEqual({}, patch.to_json())
+
+    def test_diff_and_apply(self):
+        old = make_student()
+        new = old.evolve(name='Alicia', address__city='Paris', courses__1__grade=95, tags=['a', 'b'])
+        del new._data['nickname']
+        patch = old.diff(new)
+        self.assertEqual({
+            'set': {'name': 'Alicia', 'tags': ['a', 'b']},
+            'unset': ['nickname'],
+            'nested': {'address': {'set': {'city': 'Paris'}}},
+            'items': {'courses': {'1': {'set': {'grade': 95}}}},
+        }, patch.to_json())
+
+        patched = old.apply_patch(patch)
+        self.assertEqual(new, patched)
+        self.assertEqual('Springfield', old.address.city)
+        self.assertIs(old.courses[0], patched.courses[0])
+
+    def test_replaced_values(self):
+        old = make_student()
+        new = old.evolve(address=None, courses=[Course(name='Math')])
+        self.assertEqual({'set': {'address': None, 'courses': [{'name': 'Math'}]}}, old.diff(new).to_json())
+        self.assertEqual({'set': {'address': {'street': '1 Main St', 'city': 'Springfield'}}},
+            new.evolve(courses=old.courses).diff(old).to_json())
+        self.assertEqual(old, new.apply_patch(new.diff(old)))
+
+    def test_shared_values_not_compared(self):
+        old = make_student()
+        new = old.evolve(name='Bob')
+        with mock_eq(Address) as calls, mock_eq(Course):
+            old.diff(new)
+        self.assertEqual([], calls)
+
+    def test_patched_values_not_shared(self):
+        old = make_student()
+        patch = old.diff(old.evolve(courses=[Course(name='Bio')], tags=['b']))
+        patched = old.apply_patch(patch).mark_clean()
+        patched.courses[0].grade = 50
+        patched.tags.append('c')
+        self.assertEqual({'courses': [{'name': 'Bio'}], 'tags': ['b']}, patch.to_json()['set'])
+        self.assertEqual(set(['courses', 'tags']), patched.get_dirty_fields())
+
+    def test_dirty_fields(self):
+        old = make_student().mark_clean()
+        patched = old.apply_patch(old.diff(old.evolve(address__city='Paris', courses__0__grade=70)))
+        self.assertEqual(set(['address', 'courses']), patched.get_dirty_fields())
+        self.assertFalse(old.is_dirty())
+
+    def test_different_classes(self):
+        with self.assertRaises(ValueError):
+            make_student().diff(Address())
+        with self.assertRaises(ValueError):
+            Address().apply_patch(make_student().diff(make_student()))
+
+class PatchJsonTest(unittest.TestCase):
+    def test_round_trip(self):
+        old = make_student()
+        new = old.evolve(name='Alicia', address__city='Paris', courses__1__grade=95,
+            enrolled=datetime.datetime(2017, 1, 1, tzinfo=tz.tzutc()))
+        patch = old.diff(new)
+        decoded = apilib.Patch.from_json(patch.to_json(), Student)
+        self.assertEqual(patch, decoded)
+        self.assertEqual(new, old.apply_patch(decoded))
+
+    def test_errors(self):
+        ec = apilib.ErrorContext()
+        obj = {
+            'set': {'name': 1, 'foo': 'x'},
+            'unset': ['bar'],
+            'nested': {'name': {}, 'address': {'set': {'zip': '1'}}},
+            'items': {'courses': {'x': {}, '0': {'set': {'grade': 'A'}}}, 'tags': {}},
+            'other': 1,
+        }
+        self.assertIsNone(apilib.Patch.from_json(obj, Student, ec))
+        self.assertEqual(sorted([
+            ('set.name', 'INVALID_TYPE'),
+            ('set.foo', 'UNKNOWN_FIELD'),
+            ('unset[0]', 'UNKNOWN_FIELD'),
+            ('nested.name', 'INVALID_VALUE'),
+            ('nested.address.set.zip', 'UNKNOWN_FIELD'),
+            ('items.courses["x"]', 'INVALID_VALUE'),
+            ('items.courses["0"].set.grade', 'INVALID_TYPE'),
+            ('items.tags', 'INVALID_VALUE'),
+            ('other', 'UNKNOWN_FIELD'),
+        ]), sorted((e.path, e.code) for e in ec.all_errors()))
+
+        with self.assertRaises(apilib.DeserializationError):
+            apilib.Patch.from_json([], Student)
+
+    def test_validation(self):
+        context = apilib.ValidationContext(method='mutate', operator='UPDATE')
+        ec = apilib.ErrorContext()
+        apilib.Patch.from_json({'unset': ['name'], 'items': {'courses': {'0': {'set': {'grade': 101}}}}},
+            Student, ec, context)
+        self.assertEqual([('unset[0]', 'REQUIRED'), ('items.courses["0"].set.grade', 'VALUE_NOT_IN_RANGE')],
+            [(e.path, e.code) for e in ec.all_errors()])
+
+        patch = apilib.Patch.from_json({'set': {'id': 'changed', 'nickname': 'Ally'}}, Student, context=context)
+        self.assertEqual({'set': {'nickname': 'Ally'}}, patch.to_json())
+
+class StudentOperation(apilib.Operation):
+    operand = apilib.Field(apilib.ModelType(Student), required=['mutate/ADD'])
+    patch = apilib.Field(apilib.PatchType(Student), required=['mutate/UPDATE'])
+
+class MutateStudentsRequest(apilib.Request):
+    operations = apilib.Field(apilib.ListType(StudentOperation))
+
+class PatchTypeTest(unittest.TestCase):
+    def test_operation(self):
+        context = apilib.ValidationContext(method='mutate')
+        request = MutateStudentsRequest.from_json({'operations': [
+            {'operator': 'UPDATE', 'patch': {'set': {'id': 'x', 'nickname': 'Ally'}}},
+        ]}, context=context)
+        patch = request.operations[0].patch
+        self.assertEqual({'set': {'nickname': 'Ally'}}, patch.to_json())
+        self.assertEqual('Ally', make_student().apply_patch(patch).nickname)
+        self.assertEqual({'operations': [{'operator': 'UPDATE', 'operand': None, 'patch': {'set': {'nickname': 'Ally'}}}]},
+            request.to_json())
+
+        with self.assertRaises(apilib.DeserializationError) as e:
+            MutateStudentsRequest.from_json({'operations': [{'operator': 'UPDATE'}]}, context=context)
+        self.assertEqual('operations[0].patch', e.exception.errors[0].path)
+
+    def test_wrong_model_class(self):
+        with self.assertRaises(ValueError):
+            StudentOperation(patch=Address().diff(Address()))
+
+class mock_eq(object):
+    '''Records calls to __eq__ of a model class.'''
+
+    def __init__(self, model_class):
+        self.model_class = model_class
+        self.calls = []
+
+    def __enter__(self):
+        calls = self.calls
+        original = self.original = self.model_class.__dict__.get('__eq__')
+        def __eq__(self, other):
+            calls.append((self, other))
+            return apilib.Model.__eq__(self, other)
+        self.model_class.__eq__ = __eq__
+        return calls
+
+    def __exit__(self, *args):
+        del self.model_class.__eq__
+        if self.original:
+            self.model_class.__eq__ = self.original
+
+if __name__ == '__main__':
+    unittest.main()
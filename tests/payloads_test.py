@@ -0,0 +1,117 @@
+from __future__ import absolute_import
+
+import unittest
+
+import apilib
+from apilib import payloads
+from apilib import service_models
+
+apilib.model.ID_ENCRYPTION_KEY = 'test'
+
+class Course(apilib.Model):
+    name = apilib.Field(apilib.String(), required=True)
+    credits = apilib.Field(apilib.Integer(), [apilib.Range(1, 5)])
+
+class Student(apilib.Model):
+    id = apilib.Field(apilib.EncryptedId(), readonly='create', required='update')
+    name = apilib.Field(apilib.String(), required=True)
+    year = apilib.Field(apilib.Enum(['FRESHMAN', 'SOPHOMORE', 'JUNIOR', 'SENIOR']))
+    gpa = apilib.Field(apilib.Float(), [apilib.Range(0, 4)])
+    email = apilib.Field(apilib.String(), [apilib.ExactlyOneNonempty('email', 'phone')])
+    phone = apilib.Field(apilib.String(), [apilib.ExactlyOneNonempty('email', 'phone')])
+    tags = apilib.Field(apilib.ListType(apilib.String()), [apilib.Unique(), apilib.NonemptyElements()])
+    courses = apilib.Field(apilib.ListType(Course), [apilib.UniqueFields('name')])
+    grades = apilib.Field(apilib.DictType(apilib.Decimal()))
+    born = apilib.Field(apilib.Date())
+    enrolled = apilib.Field(apilib.DateTime())
+    extra = apilib.Field(apilib.AnyPrimitive())
+    mentor = apilib.Field(apilib.ModelType(Course))
+
+class StudentOperation(service_models.Operation):
+    student = apilib.Field(apilib.ModelType(Student), required='mutate/ADD')
+
+class Node(apilib.Model):
+    value = apilib.Field(apilib.Integer())
+
+Node.next = apilib.Field(apilib.ModelType(Node))
+Node.children = apilib.Field(apilib.ListType(Node))
+
+CREATE = apilib.ValidationContext(service='StudentService', method='create')
+UPDATE = apilib.ValidationContext(service='StudentService', method='update')
+
+def decode(model_class, payload, context):
+    error_context = apilib.ErrorContext()
+    model_class.from_json(payload, error_context, context)
+    return sorted(set(error.path for error in error_context.all_errors()))
+
+class PayloadGeneratorTest(unittest.TestCase):
+    def test_valid_payloads(self):
+        for context in [CREATE, UPDATE]:
+            generator = payloads.PayloadGenerator(seed=1, context=context)
+            for _ in range(200):
+                payload = generator.generate(Student)
+                self.assertEqual([], decode(Student, payload, context), payload)
+                self.assertIn('name', payload)
+                self.assertEqual(1, len([key for key in ('email', 'phone') if key in payload]))
+
+    def test_method_specific_validators(self):
+        for _ in range(20):
+            self.assertNotIn('id', payloads.PayloadGenerator(context=CREATE).generate(Student))
+            self.assertIn('id', payloads.PayloadGenerator(context=UPDATE).generate(Student))
+
+    def test_operator(self):
+        context = apilib.ValidationContext(service='StudentService', method='mutate')
+        generator = payloads.PayloadGenerator(seed=2, context=context, fill_rate=0)
+        operators = set()
+        for _ in range(50):
+            payload = generator.generate(StudentOperation)
+            self.assertEqual([], decode(StudentOperation, payload, context))
+            if payload['operator'] == 'ADD':
+                self.assertIn('student', payload)
+            operators.add(payload['operator'])
+        self.assertEqual(set(['ADD', 'UPDATE', 'DELETE']), operators)
+
+    def test_values_within_schema(self):
+        generator = payloads.PayloadGenerator(seed=3, fill_rate=1)
+        for _ in range(100):
+            payload = generator.generate(Student)
+            self.assertIn(payload['year'], Student.year.get_type().values)
+            self.assertTrue(0 <= payload['gpa'] <= 4)
+            for course in payload['courses']:
+                self.assertTrue(1 <= course['credits'] <= 5)
+
+    def test_size_limits(self):
+        generator = payloads.PayloadGenerator(seed=4, fill_rate=1, max_depth=2, min_items=2, max_items=3,
+            max_string_length=4)
+        def depth(node):
+            children = ([node['next']] if 'next' in node else []) + node.get('children', [])
+            return 1 + max([depth(child) for child in children] or [0])
+        for _ in range(20):
+            payload = generator.generate(Node)
+            self.assertEqual(3, depth(payload))
+            self.assertTrue(2 <= len(payload['children']) <= 3)
+        for tag in generator.generate(Student)['tags']:
+            self.assertTrue(1 <= len(tag) <= 4)
+
+    def test_seed(self):
+        first = payloads.PayloadGenerator(seed=5, error_rate=0.2)
+        second = payloads.PayloadGenerator(seed=5, error_rate=0.2)
+        for _ in range(10):
+            self.assertEqual(first.generate_with_errors(Student), second.generate_with_errors(Student))
+
+    def test_invalid_payloads(self):
+        generator = payloads.PayloadGenerator(seed=6, context=UPDATE, error_rate=0.2)
+        num_invalid = 0
+        for _ in range(200):
+            payload, error_paths = generator.generate_with_errors(Student)
+            self.assertEqual(error_paths, decode(Student, payload, UPDATE), payload)
+            num_invalid += bool(error_paths)
+        self.assertTrue(50 < num_invalid < 200)
+
+    def test_fuzz(self):
+        for context in [CREATE, UPDATE]:
+            self.assertEqual([], payloads.fuzz(Student, 200, seed=7, context=context, error_rate=0.3))
+        self.assertEqual([], payloads.fuzz(Node, 100, seed=8, error_rate=0.3))
+
+if __name__ == '__main__':
+    unittest.main()
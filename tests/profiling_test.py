@@ -0,0 +1,78 @@
+from __future__ import absolute_import
+
+import unittest
+
+import apilib
+from apilib import profiling
+
+class Line(apilib.Model):
+    sku = apilib.Field(apilib.String(), required=True)
+    quantity = apilib.Field(apilib.Integer())
+
+class Cart(apilib.Model):
+    owner = apilib.Field(apilib.String())
+    lines = apilib.Field(apilib.ListType(Line))
+
+CART_JSON = {'owner': 'alice', 'lines': [{'sku': 'a', 'quantity': 1}, {'sku': 'b', 'quantity': 2}]}
+
+class ProfilingTest(unittest.TestCase):
+    def tearDown(self):
+        profiling.disable()
+        profiling.profiler.reset()
+
+    def test_disabled_leaves_methods_alone(self):
+        from_json = apilib.Model.__dict__['from_json']
+        to_json = apilib.Field.__dict__['to_json']
+        with profiling.profile():
+            self.assertTrue(profiling.is_enabled())
+            self.assertIsNot(to_json, apilib.Field.__dict__['to_json'])
+        self.assertFalse(profiling.is_enabled())
+        self.assertIs(from_json, apilib.Model.__dict__['from_json'])
+        self.assertIs(to_json, apilib.Field.__dict__['to_json'])
+
+    def test_stacks(self):
+        with profiling.profile() as profiler:
+            for _ in range(3):
+                cart = Cart.from_json(CART_JSON, context=apilib.ValidationContext())
+            cart.to_dict()
+        stacks = profiler.stacks
+        self.assertEqual(3, stacks[('Cart.from_json',)].calls)
+        self.assertEqual(3, stacks[('Cart.from_json', 'Cart.lines')].calls)
+        self.assertEqual(6, stacks[('Cart.from_json', 'Cart.lines', 'Line.from_json', 'Line.sku')].calls)
+        self.assertEqual(6, stacks[('Cart.from_json', 'Cart.lines', 'Line.from_json', 'Line.sku', 'Line.sku.validators')].calls)
+        self.assertEqual(2, stacks[('Cart.to_dict', 'Cart.lines', 'Line.to_dict', 'Line.quantity')].calls)
+
+        frames = profiler.get_frames()
+        self.assertEqual(4, frames['Cart.lines'].calls)
+        self.assertEqual(8, frames['Line.sku'].calls)
+        self.assertGreaterEqual(frames['Cart.from_json'].total_time, frames['Cart.from_json'].self_time)
+        self.assertEqual(8, profiler.field_types['Integer'].calls)
+        self.assertEqual(4, profiler.field_types['ListType'].calls)
+
+    def test_nested_calls_excluded_from_self_time(self):
+        with profiling.profile() as profiler:
+            Cart.from_json(CART_JSON)
+        stacks = profiler.stacks
+        cart = stacks[('Cart.from_json',)]
+        children = [stats for path, stats in stacks.items() if len(path) == 2 and path[0] == 'Cart.from_json']
+        self.assertAlmostEqual(cart.total_time, cart.self_time + sum(stats.total_time for stats in children))
+
+    def test_validate(self):
+        with profiling.profile() as profiler:
+            Cart(owner='bob', lines=[Line(sku='a')]).validate()
+        self.assertEqual(1, profiler.stacks[('Cart.validate', 'Cart.lines', 'Line.validate', 'Line.sku')].calls)
+
+    def test_output(self):
+        with profiling.profile() as profiler:
+            Cart.from_json(CART_JSON).to_dict()
+        table = profiler.format_table()
+        self.assertIn('Line.from_json', table)
+        self.assertIn('ListType', table)
+        for line in profiler.format_collapsed(metric='time').splitlines():
+            stack, value = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith('Cart.'))
+            self.assertGreater(int(value), 0)
+        self.assertRaises(ValueError, profiler.format_collapsed, metric='bogus')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,7 @@ import mock
 import requests
 
 import apilib
+from apilib import compression
 
 class FooRequest(apilib.Request):
     request_str = apilib.Field(apilib.String(), required=True)
@@ -59,10 +60,11 @@ class BasicServiceTest(unittest.TestCase):
         self.assertEqual({'response_str': u'Your request string was: blah', 'response_code': u'SUCCESS'}, response)
 
 class MockJsonResponse(object):
-    def __init__(self, status_code, json_data, text=None):
+    def __init__(self, status_code, json_data, text=None, headers=None):
         self.status_code = status_code
         self.json_data = json_data
         self.text = text
+        self.headers = headers or {}
 
     def json(self):
         return self.json_data
@@ -82,6 +84,13 @@ class RemoteServiceTest(unittest.TestCase):
         self.assertEqual('{"request_str": "blah"}', mock_post.call_args[1]['data'])
         self.assertEqual({'Content-Type': 'application/json'}, mock_post.call_args[1]['headers'])
 
+    @mock.patch('apilib.service.requests.post')
+    def test_patch_through_service_module(self, mock_post):
+        service = RemoteFooService('http://localhost:5000')
+        mock_post.return_value = MockJsonResponse(200, {'response_str': 'this is a response', 'response_code': 'SUCCESS'})
+        self.assertEqual('SUCCESS', service.foo(FooRequest(request_str='blah')).response_code)
+        self.assertEqual(1, mock_post.call_count)
+
     @mock.patch('requests.post')
     def test_trailing_slashes_removed_from_urls(self, mock_post):
         class AltRemoteFooService(RemoteFooService):
@@ -191,6 +200,374 @@ class ServiceValidationTest(unittest.TestCase):
         self.assertIsNotNone(response)
         self.assertEqual('SUCCESS', response.get('response_code'))
 
+class EchoRequest(apilib.Request):
+    blob = apilib.Field(apilib.RawJson())
+
+class EchoResponse(apilib.Response):
+    blob = apilib.Field(apilib.RawJson())
+
+class EchoService(apilib.Service):
+    methods = apilib.servicemethods(
+        apilib.Meth('echo', EchoRequest, EchoResponse))
+    path = '/echo_service'
+
+class EchoServiceImpl(EchoService, apilib.ServiceImplementation):
+    def echo(self, request):
+        return EchoResponse(blob=request.blob)
+
+class RemoteEchoService(EchoService, apilib.RemoteServiceStub):
+    pass
+
+class RawJsonServiceTest(unittest.TestCase):
+    def test_raw_json_passed_through(self):
+        service = EchoServiceImpl()
+        response = service.invoke_with_json_str('echo', '{"blob": {"z": 1,"a":[1.0]}}')
+        self.assertIn('"blob": {"z": 1,"a":[1.0]}', response)
+        self.assertEqual({'blob': {'z': 1, 'a': [1.0]}, 'response_code': 'SUCCESS'}, json.loads(response))
+
+        self.assertEqual({'blob': [1], 'response_code': 'SUCCESS'}, service.invoke_with_json('echo', {'blob': [1]}))
+
+    @mock.patch('requests.post')
+    def test_remote_raw_json(self, mock_post):
+        service = RemoteEchoService('http://localhost:5000')
+        mock_post.return_value = MockJsonResponse(200, None, text='{"blob": {"b":2}, "response_code": "SUCCESS"}')
+        response = service.echo(EchoRequest(blob=apilib.RawJsonValue('[ 1 ]')))
+        self.assertEqual('{"blob": [ 1 ]}', mock_post.call_args[1]['data'])
+        self.assertEqual('{"b":2}', response.blob.text)
+
+class MockResponse(object):
+    def __init__(self, status_code, content, headers):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+
+class ContentTypeTest(unittest.TestCase):
+    def test_invoke_with_json_body(self):
+        service = FooServiceImpl()
+        response = service.invoke_with_body('foo', b'{"request_str": "blah"}')
+        self.assertEqual(200, response.status)
+        self.assertEqual({'Content-Type': 'application/json'}, response.headers)
+        self.assertEqual({'response_str': u'Your request string was: blah', 'response_code': u'SUCCESS'},
+            json.loads(response.body.decode('utf-8')))
+
+    def test_invoke_with_binary_body(self):
+        service = FooServiceImpl()
+        response = service.invoke_with_body('foo', FooRequest(request_str='blah').to_bytes(),
+            {'content-type': apilib.BINARY_CONTENT_TYPE})
+        self.assertEqual({'Content-Type': apilib.BINARY_CONTENT_TYPE}, response.headers)
+        foo_response = FooResponse.from_bytes(response.body)
+        self.assertEqual('SUCCESS', foo_response.response_code)
+        self.assertEqual('Your request string was: blah', foo_response.response_str)
+
+        response = service.invoke_with_body('foo', FooRequest().to_bytes(),
+            {'Content-Type': apilib.BINARY_CONTENT_TYPE, 'Accept': 'application/json'})
+        self.assertEqual({'Content-Type': 'application/json'}, response.headers)
+        response = json.loads(response.body.decode('utf-8'))
+        self.assertEqual('REQUEST_ERROR', response['response_code'])
+        self.assertEqual('request_str', response['errors'][0]['path'])
+
+    def test_malformed_body(self):
+        service = FooServiceImpl()
+        for body, content_type in [(b'{"request_str', 'application/json'), (b'\x0a\x09', apilib.BINARY_CONTENT_TYPE)]:
+            response = service.invoke_with_body('foo', body, {'Content-Type': content_type})
+            foo_response = apilib.get_content_codec(content_type).decode(FooResponse, response.body)
+            self.assertEqual('REQUEST_ERROR', foo_response.response_code)
+            self.assertEqual(apilib.CommonErrorCodes.INVALID_VALUE, foo_response.errors[0].code)
+
+    def test_unsupported_content_type(self):
+        with self.assertRaises(apilib.UnsupportedContentTypeException):
+            FooServiceImpl().invoke_with_body('foo', b'', {'Content-Type': 'text/plain'})
+
+    def test_negotiate(self):
+        json_codec = apilib.get_content_codec('application/json; charset=utf-8')
+        binary_codec = apilib.get_content_codec(apilib.BINARY_CONTENT_TYPE)
+        self.assertIs(json_codec, apilib.negotiate_content_codec(None))
+        self.assertIs(binary_codec, apilib.negotiate_content_codec(None, binary_codec))
+        self.assertIs(binary_codec, apilib.negotiate_content_codec('*/*', binary_codec))
+        self.assertIs(binary_codec, apilib.negotiate_content_codec('text/html, application/x-apilib-binary'))
+        self.assertIs(json_codec, apilib.negotiate_content_codec(
+            'application/x-apilib-binary;q=0.5, application/json', binary_codec))
+        self.assertIs(json_codec, apilib.negotiate_content_codec('application/x-apilib-binary;q=0'))
+
+    @mock.patch('requests.post')
+    def test_remote_binary_request(self, mock_post):
+        service = RemoteFooService('http://localhost:5000', content_type=apilib.BINARY_CONTENT_TYPE)
+        mock_post.return_value = MockResponse(200, FooResponse(response_str='hi', response_code='SUCCESS').to_bytes(),
+            {'Content-Type': apilib.BINARY_CONTENT_TYPE})
+        foo_response = service.foo(FooRequest(request_str='blah'))
+        self.assertEqual('SUCCESS', foo_response.response_code)
+        self.assertEqual('hi', foo_response.response_str)
+        self.assertEqual(FooRequest(request_str='blah').to_bytes(), mock_post.call_args[1]['data'])
+        self.assertEqual(apilib.BINARY_CONTENT_TYPE, mock_post.call_args[1]['headers']['Content-Type'])
+        self.assertEqual(apilib.BINARY_CONTENT_TYPE, mock_post.call_args[1]['headers']['Accept'])
+
+    @unittest.skipIf(apilib.msgpack_encoding.msgpack is None, 'msgpack is not installed')
+    @mock.patch('requests.post')
+    def test_msgpack(self, mock_post):
+        service = FooServiceImpl()
+        response = service.invoke_with_body('foo', FooRequest(request_str='blah').to_msgpack(),
+            {'Content-Type': apilib.MSGPACK_CONTENT_TYPE, 'Accept': apilib.MSGPACK_CONTENT_TYPE})
+        self.assertEqual({'Content-Type': apilib.MSGPACK_CONTENT_TYPE}, response.headers)
+        self.assertEqual('Your request string was: blah', FooResponse.from_msgpack(response.body).response_str)
+
+        remote = RemoteFooService('http://localhost:5000', content_type=apilib.MSGPACK_CONTENT_TYPE)
+        mock_post.return_value = MockResponse(200, response.body, response.headers)
+        foo_response = remote.foo(FooRequest(request_str='blah'))
+        self.assertEqual('Your request string was: blah', foo_response.response_str)
+        self.assertEqual(FooRequest(request_str='blah').to_msgpack(), mock_post.call_args[1]['data'])
+
+class CompressionTest(unittest.TestCase):
+    def test_compressed_response(self):
+        service = FooServiceImpl()
+        request_json = FooRequest(request_str='x' * 2000).to_json_str().encode('utf-8')
+        response = service.invoke_with_body('foo', request_json, {'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        self.assertEqual('gzip, deflate', response.headers['Accept-Encoding'])
+        foo_response = FooResponse.from_json(json.loads(compression.decompress(response.body, 'gzip').decode('utf-8')))
+        self.assertEqual('Your request string was: ' + 'x' * 2000, foo_response.response_str)
+
+        response = service.invoke_with_body('foo', request_json, {'Accept-Encoding': 'deflate'}, stream=True)
+        self.assertEqual('deflate', response.headers['Content-Encoding'])
+        self.assertIn(b'x' * 2000, compression.decompress(b''.join(response.body), 'deflate'))
+
+    def test_small_responses_not_compressed(self):
+        response = FooServiceImpl().invoke_with_body('foo', b'{"request_str": "blah"}', {'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual('gzip, deflate', response.headers['Accept-Encoding'])
+
+    def test_compressed_request(self):
+        service = FooServiceImpl()
+        body = compression.compress(b'{"request_str": "blah"}', 'deflate')
+        response = service.invoke_with_body('foo', body, {'Content-Encoding': 'deflate'})
+        self.assertEqual('Your request string was: blah', json.loads(response.body.decode('utf-8'))['response_str'])
+
+        response = service.invoke_with_body('foo', body, {'Content-Encoding': 'gzip'})
+        response = json.loads(response.body.decode('utf-8'))
+        self.assertEqual('REQUEST_ERROR', response['response_code'])
+        self.assertEqual(apilib.CommonErrorCodes.INVALID_VALUE, response['errors'][0]['code'])
+
+        with self.assertRaises(apilib.UnsupportedContentEncodingException):
+            service.invoke_with_body('foo', body, {'Content-Encoding': 'br'})
+
+    @mock.patch('requests.post')
+    def test_remote_requests_compressed_once_advertised(self, mock_post):
+        service = RemoteFooService('http://localhost:5000')
+        request = FooRequest(request_str='x' * 2000)
+        mock_post.return_value = MockJsonResponse(200, {'response_code': 'SUCCESS'},
+            headers={'Accept-Encoding': 'gzip, deflate'})
+        service.foo(request)
+        self.assertEqual(request.to_json_str(), mock_post.call_args[1]['data'])
+        self.assertNotIn('Content-Encoding', mock_post.call_args[1]['headers'])
+
+        service.foo(request)
+        self.assertEqual('gzip', mock_post.call_args[1]['headers']['Content-Encoding'])
+        self.assertEqual(request.to_json_str().encode('utf-8'), compression.decompress(mock_post.call_args[1]['data'], 'gzip'))
+
+        service.foo(FooRequest(request_str='small'))
+        self.assertNotIn('Content-Encoding', mock_post.call_args[1]['headers'])
+
+        service = RemoteFooService('http://localhost:5000', compress_requests=False)
+        service.foo(request)
+        service.foo(request)
+        self.assertNotIn('Content-Encoding', mock_post.call_args[1]['headers'])
+
+class SchemaFingerprintTest(unittest.TestCase):
+    def test_matching_fingerprint(self):
+        fingerprint = apilib.get_method_fingerprint(FooService.methods['foo'])
+        response = FooServiceImpl().invoke_with_body('foo', FooRequest(request_str='a').to_bytes(), {
+            'Content-Type': apilib.BINARY_CONTENT_TYPE, apilib.SCHEMA_FINGERPRINT_HEADER: fingerprint})
+        self.assertEqual(fingerprint, response.headers[apilib.SCHEMA_FINGERPRINT_HEADER])
+        self.assertEqual('SUCCESS', FooResponse.from_bytes(response.body).response_code)
+
+    def test_mismatched_fingerprint(self):
+        response = FooServiceImpl().invoke_with_body('foo', FooRequest(request_str='a').to_bytes(), {
+            'Content-Type': apilib.BINARY_CONTENT_TYPE, apilib.SCHEMA_FINGERPRINT_HEADER: 'abc'})
+        self.assertEqual('application/json', response.headers['Content-Type'])
+        response = json.loads(response.body.decode('utf-8'))
+        self.assertEqual('REQUEST_ERROR', response['response_code'])
+        self.assertEqual(apilib.CommonErrorCodes.SCHEMA_MISMATCH, response['errors'][0]['code'])
+
+    @mock.patch('requests.post')
+    def test_remote_mismatched_fingerprint(self, mock_post):
+        service = RemoteFooService('http://localhost:5000', content_type=apilib.BINARY_CONTENT_TYPE)
+        mock_post.return_value = MockResponse(200, b'{}',
+            {'Content-Type': 'application/json', apilib.SCHEMA_FINGERPRINT_HEADER: 'abc'})
+        with self.assertRaises(apilib.SchemaMismatchException):
+            service.foo(FooRequest(request_str='blah'))
+        self.assertEqual(apilib.get_method_fingerprint(FooService.methods['foo']),
+            mock_post.call_args[1]['headers'][apilib.SCHEMA_FINGERPRINT_HEADER])
+
+class LazyWidgetService(apilib.Service):
+    methods = apilib.servicemethods(
+        apilib.Meth('mutate', WidgetRequest, WidgetResponse, lazy_decode=True))
+
+class LazyWidgetServiceImpl(LazyWidgetService, apilib.ServiceImplementation):
+    def mutate(self, request):
+        self.request_was_lazy = request._has_lazy_values
+        return WidgetResponse()
+
+class LazyDecodeServiceTest(unittest.TestCase):
+    def test_lazy_decode(self):
+        service = LazyWidgetServiceImpl()
+        response = service.invoke_with_json('mutate', {'operations': [{'operator': 'ADD', 'operand': {'id': 'foo'}}]})
+        self.assertEqual('SUCCESS', response['response_code'])
+        self.assertTrue(service.request_was_lazy)
+
+    def test_errors_reported_before_invoking(self):
+        service = LazyWidgetServiceImpl()
+        response = service.invoke_with_json('mutate', {'operations': [{'operator': 'UPDATE', 'operand': {}}]})
+        self.assertEqual('REQUEST_ERROR', response['response_code'])
+        self.assertEqual('operations[0].operand.id', response['errors'][0]['path'])
+        self.assertFalse(hasattr(service, 'request_was_lazy'))
+
+class OffloadWidgetService(apilib.Service):
+    methods = apilib.servicemethods(
+        apilib.Meth('mutate', WidgetRequest, WidgetResponse, decode_in_process=True))
+
+class OffloadWidgetServiceImpl(OffloadWidgetService, apilib.ServiceImplementation):
+    def mutate(self, request):
+        self.request = request
+        return WidgetResponse()
+
+class DecodeInProcessTest(unittest.TestCase):
+    def test_decode_in_process(self):
+        service = OffloadWidgetServiceImpl()
+        obj = {'operations': [{'operator': 'ADD', 'operand': {'id': 'foo'}}, {'operator': 'DELETE', 'operand': {}}]}
+        expected = WidgetRequest.from_json(obj)
+        with mock.patch('apilib.service.get_decoding_process_pool', wraps=apilib.get_decoding_process_pool) as get_pool:
+            response = service.invoke_with_json('mutate', obj)
+        self.assertTrue(get_pool.called)
+        self.assertEqual('SUCCESS', response['response_code'])
+        self.assertEqual(expected, service.request)
+        self.assertEqual('foo', service.request.operations[0].operand.id)
+
+        response = service.invoke_with_json_str('mutate', json.dumps(obj))
+        self.assertEqual('SUCCESS', json.loads(response)['response_code'])
+        self.assertEqual(expected, service.request)
+
+        response = service.invoke_with_body('mutate', compression.compress(json.dumps(obj).encode('utf-8'), 'gzip'),
+            {'Content-Encoding': 'gzip'})
+        self.assertEqual('SUCCESS', json.loads(response.body.decode('utf-8'))['response_code'])
+        self.assertEqual(expected, service.request)
+
+    def test_errors(self):
+        service = OffloadWidgetServiceImpl()
+        response = service.invoke_with_json('mutate', {'operations': [{'operator': 'UPDATE', 'operand': {}}]})
+        self.assertEqual('REQUEST_ERROR', response['response_code'])
+        self.assertEqual([('REQUIRED', 'operations[0].operand.id')],
+            [(error['code'], error['path']) for error in response['errors']])
+
+        response = service.invoke_with_body('mutate', b'{"operations', {'Content-Type': 'application/json'})
+        response = json.loads(response.body.decode('utf-8'))
+        self.assertEqual('REQUEST_ERROR', response['response_code'])
+        self.assertEqual(apilib.CommonErrorCodes.INVALID_VALUE, response['errors'][0]['code'])
+        self.assertFalse(hasattr(service, 'request'))
+
+class Inventory(apilib.Model):
+    widgets = apilib.Field(apilib.ListType(Widget))
+    note = apilib.Field(apilib.String())
+
+class InventoryResponse(apilib.Response):
+    inventory = apilib.Field(apilib.ModelType(Inventory))
+
+class InventoryService(apilib.Service):
+    methods = apilib.servicemethods(
+        apilib.Meth('get', apilib.Request, InventoryResponse, conditional=True))
+    path = '/inventory_service'
+
+class InventoryServiceImpl(InventoryService, apilib.ServiceImplementation):
+    prefix = 'widget'
+    note = 'first'
+
+    def get(self, request):
+        widgets = [Widget(id='%s%d' % (self.prefix, i)) for i in range(100)]
+        return InventoryResponse(inventory=Inventory(widgets=widgets, note=self.note))
+
+class RemoteInventoryService(InventoryService, apilib.RemoteServiceStub):
+    pass
+
+class ConditionalResponseTest(unittest.TestCase):
+    def setUp(self):
+        apilib.service._delta_cache.clear()
+
+    def test_etag_and_not_modified(self):
+        service = InventoryServiceImpl()
+        response = service.invoke_with_body('get', b'{}')
+        self.assertEqual(200, response.status)
+        etag = response.headers['ETag']
+        self.assertEqual(etag, service.invoke_with_body('get', b'{}').headers['ETag'])
+
+        response = service.invoke_with_body('get', b'{}', {'If-None-Match': 'W/"abc", %s' % etag})
+        self.assertEqual(apilib.NOT_MODIFIED_STATUS, response.status)
+        self.assertEqual(b'', response.body)
+        self.assertEqual(etag, response.headers['ETag'])
+
+        service.note = 'second'
+        response = service.invoke_with_body('get', b'{}', {'If-None-Match': etag})
+        self.assertEqual(200, response.status)
+        self.assertNotEqual(etag, response.headers['ETag'])
+
+    def test_delta(self):
+        service = InventoryServiceImpl()
+        first = service.invoke_with_body('get', b'{}')
+        service.note = 'second'
+        response = service.invoke_with_body('get', b'{}', {apilib.DELTA_BASE_HEADER: first.headers['ETag']})
+        self.assertEqual(apilib.DELTA_STATUS, response.status)
+        self.assertEqual(first.headers['ETag'], response.headers[apilib.DELTA_BASE_HEADER])
+        self.assertEqual({'nested': {'inventory': {'set': {'note': 'second'}}}}, json.loads(response.body.decode('utf-8')))
+
+        # Unknown bases get the full response.
+        response = service.invoke_with_body('get', b'{}', {apilib.DELTA_BASE_HEADER: '"unknown"'})
+        self.assertEqual(200, response.status)
+        self.assertEqual('second', json.loads(response.body.decode('utf-8'))['inventory']['note'])
+
+    def test_large_delta_sends_full_response(self):
+        service = InventoryServiceImpl()
+        first = service.invoke_with_body('get', b'{}')
+        service.prefix = 'gadget'
+        response = service.invoke_with_body('get', b'{}', {apilib.DELTA_BASE_HEADER: first.headers['ETag']})
+        self.assertEqual(200, response.status)
+
+    def test_cache_bounded(self):
+        service = InventoryServiceImpl()
+        with mock.patch('apilib.service.DELTA_CACHE_SIZE', 2):
+            first = service.invoke_with_body('get', b'{}')
+            for note in ('second', 'third'):
+                service.note = note
+                service.invoke_with_body('get', b'{}')
+            response = service.invoke_with_body('get', b'{}', {apilib.DELTA_BASE_HEADER: first.headers['ETag']})
+        self.assertEqual(200, response.status)
+
+    def test_errors_not_tagged(self):
+        response = FooServiceImpl().invoke_with_body('foo', b'{}')
+        self.assertNotIn('ETag', response.headers)
+
+    @mock.patch('requests.post')
+    def test_remote_conditional_requests(self, mock_post):
+        server = InventoryServiceImpl()
+        statuses = []
+        def post(url, data, headers):
+            response = server.invoke_with_body('get', data, headers)
+            statuses.append(response.status)
+            return MockResponse(response.status, response.body, response.headers)
+        mock_post.side_effect = post
+
+        client = RemoteInventoryService('http://localhost:5000', content_type=apilib.BINARY_CONTENT_TYPE,
+            conditional_requests=True)
+        first = client.get(apilib.Request())
+        self.assertEqual(100, len(first.inventory.widgets))
+        self.assertNotIn('If-None-Match', mock_post.call_args[1]['headers'])
+
+        first.inventory.note = 'modified by the caller'
+        second = client.get(apilib.Request())
+        self.assertEqual('first', second.inventory.note)
+
+        server.note = 'third'
+        third = client.get(apilib.Request())
+        self.assertEqual([200, apilib.NOT_MODIFIED_STATUS, apilib.DELTA_STATUS], statuses)
+        self.assertEqual('third', third.inventory.note)
+        self.assertEqual(100, len(third.inventory.widgets))
+        self.assertEqual(server.get(None).inventory, third.inventory)
 
 if __name__ == '__main__':
     unittest.main()
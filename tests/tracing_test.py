@@ -0,0 +1,138 @@
+from __future__ import absolute_import
+
+import json
+import unittest
+
+import mock
+
+import apilib
+from apilib import tracing
+from tests.service_test import FooRequest
+from tests.service_test import FooResponse
+from tests.service_test import FooServiceImpl
+from tests.service_test import MockResponse
+from tests.service_test import RemoteFooService
+
+TRACE_ID = '4bf92f3577b34da6a3ce929d0e0e4736'
+PARENT_ID = '00f067aa0ba902b7'
+TRACEPARENT = '00-%s-%s-01' % (TRACE_ID, PARENT_ID)
+
+class BarService(apilib.Service):
+    methods = apilib.servicemethods(
+        apilib.Meth('bar', FooRequest, FooResponse))
+    path = '/bar_service'
+
+class BarServiceImpl(BarService, apilib.ServiceImplementation):
+    def bar(self, request):
+        return RemoteFooService('http://foo').foo(request)
+
+class JsonMockResponse(MockResponse):
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+def post_to_foo_service(url, data, headers):
+    response = FooServiceImpl().invoke_with_body('foo', data, headers)
+    return JsonMockResponse(response.status, response.body, response.headers)
+
+class SpanContextTest(unittest.TestCase):
+    def test_traceparent(self):
+        context = tracing.SpanContext.from_traceparent(TRACEPARENT)
+        self.assertEqual(TRACE_ID, context.trace_id)
+        self.assertEqual(PARENT_ID, context.span_id)
+        self.assertTrue(context.sampled)
+        self.assertEqual(TRACEPARENT, context.to_traceparent())
+        self.assertFalse(tracing.SpanContext.from_traceparent(TRACEPARENT[:-2] + '00').sampled)
+        # Later versions may add fields.
+        self.assertEqual(context, tracing.SpanContext.from_traceparent('01' + TRACEPARENT[2:] + '-extra'))
+
+    def test_invalid_traceparent(self):
+        for header in [None, '', 'garbage', TRACEPARENT + '-extra', 'ff' + TRACEPARENT[2:],
+                '00-%s-%s-01' % ('0' * 32, PARENT_ID), '00-%s-%s-01' % (TRACE_ID, '0' * 16)]:
+            self.assertIsNone(tracing.SpanContext.from_traceparent(header), header)
+
+class TracerTest(unittest.TestCase):
+    def test_disabled(self):
+        span = tracing.Tracer().start_span('foo')
+        self.assertIs(tracing.NOOP_SPAN, span)
+        with span:
+            self.assertIsNone(tracing.get_current_span())
+
+    def test_nested_spans(self):
+        tracer = tracing.InMemoryTracer()
+        with tracer.start_span('outer') as outer:
+            self.assertIs(outer, tracing.get_current_span())
+            with tracer.start_span('inner'):
+                pass
+            with self.assertRaises(ValueError):
+                with tracer.start_span('failing'):
+                    raise ValueError('boom')
+        self.assertIsNone(tracing.get_current_span())
+        self.assertEqual(['inner', 'failing', 'outer'], [span.name for span in tracer.spans])
+        inner, failing, _ = tracer.spans
+        self.assertIsNone(outer.parent_id)
+        self.assertEqual(outer.context.span_id, inner.parent_id)
+        self.assertEqual(outer.context.trace_id, inner.context.trace_id)
+        self.assertNotEqual(outer.context.span_id, inner.context.span_id)
+        self.assertEqual('ValueError: boom', failing.attributes['error'])
+        self.assertGreaterEqual(outer.duration, inner.duration)
+
+class ServiceTracingTest(unittest.TestCase):
+    def setUp(self):
+        self.tracer = tracing.InMemoryTracer()
+        patcher = mock.patch('apilib.tracing.TRACER', self.tracer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('requests.post', side_effect=post_to_foo_service)
+    def test_propagation_across_services(self, mock_post):
+        response = BarServiceImpl().invoke_with_body('bar', b'{"request_str": "a"}', {'Traceparent': TRACEPARENT})
+        self.assertEqual(200, response.status)
+
+        spans = self.tracer.spans
+        self.assertEqual(set([TRACE_ID]), set(span.context.trace_id for span in spans))
+        by_id = {span.context.span_id: span for span in spans}
+        def parent_name(span):
+            return by_id[span.parent_id].name if span.parent_id in by_id else span.parent_id
+
+        bar_server, = self.tracer.get_spans('BarService.bar', kind=tracing.SERVER)
+        self.assertEqual(PARENT_ID, bar_server.parent_id)
+        self.assertEqual(200, bar_server.attributes['status'])
+        foo_client, = self.tracer.get_spans('FooService.foo', kind=tracing.CLIENT)
+        foo_server, = self.tracer.get_spans('FooService.foo', kind=tracing.SERVER)
+        self.assertEqual(foo_client.context.span_id, foo_server.parent_id)
+        self.assertEqual(foo_client.context.to_traceparent(), mock_post.call_args[1]['headers']['traceparent'])
+        self.assertEqual('handler', parent_name(foo_client))
+
+        self.assertEqual(
+            sorted([('decode', 'BarService.bar'), ('handler', 'BarService.bar'), ('encode', 'BarService.bar'),
+                ('decode', 'FooService.foo'), ('handler', 'FooService.foo'), ('encode', 'FooService.foo')]),
+            sorted((span.name, parent_name(span)) for span in spans if span.kind == tracing.INTERNAL))
+        handlers = self.tracer.get_spans('handler')
+        self.assertEqual(['SUCCESS', 'SUCCESS'], [span.attributes['response_code'] for span in handlers])
+
+    @mock.patch('requests.post', side_effect=post_to_foo_service)
+    def test_not_sampled(self, mock_post):
+        traceparent = TRACEPARENT[:-2] + '00'
+        response = BarServiceImpl().invoke_with_body('bar', b'{"request_str": "a"}', {'traceparent': traceparent})
+        self.assertEqual(200, response.status)
+        self.assertEqual([], self.tracer.spans)
+        # The decision is passed on to the services called.
+        sent = tracing.SpanContext.from_traceparent(mock_post.call_args[1]['headers']['traceparent'])
+        self.assertEqual(TRACE_ID, sent.trace_id)
+        self.assertFalse(sent.sampled)
+
+    def test_new_trace_without_traceparent(self):
+        FooServiceImpl().invoke_with_body('foo', b'{"request_str": "a"}')
+        server, = self.tracer.get_spans(kind=tracing.SERVER)
+        self.assertIsNone(server.parent_id)
+        self.assertEqual(4, len(self.tracer.get_spans(trace_id=server.context.trace_id)))
+
+    @mock.patch('requests.post')
+    def test_no_header_when_disabled(self, mock_post):
+        mock_post.return_value = JsonMockResponse(200, b'{"response_code": "SUCCESS"}', {})
+        with mock.patch('apilib.tracing.TRACER', tracing.Tracer()):
+            RemoteFooService('http://foo').foo(FooRequest(request_str='a'))
+        self.assertNotIn('traceparent', mock_post.call_args[1]['headers'])
+
+if __name__ == '__main__':
+    unittest.main()
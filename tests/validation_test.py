@@ -3,6 +3,8 @@ from __future__ import absolute_import
 import datetime
 import unittest
 
+import mock
+
 from dateutil import parser as dateutil_parser
 from dateutil import tz
 
@@ -882,5 +884,87 @@ class TestValidatorErrorFieldPaths(unittest.TestCase):
         self.assertEqual('dchild["foo"].fstring', errors[0].path)
 
 
+class LazyReadonlyChild(apilib.Model):
+    fstring = apilib.Field(apilib.String(), readonly=True)
+    fevil = apilib.Field(apilib.String(), validators=[NotEvilValidator()])
+
+class LazyValidationTest(unittest.TestCase):
+    class Parent(apilib.Model):
+        fchild = apilib.Field(apilib.ModelType(SimpleRequiredParent))
+        lchild = apilib.Field(apilib.ListType(SimpleRequiredChild), validators=[apilib.UniqueFields('fstring')])
+        dchild = apilib.Field(apilib.DictType(apilib.ModelType(SimpleValidationModel)))
+
+    class ReadonlyParent(apilib.Model):
+        lchild = apilib.Field(apilib.ListType(apilib.ModelType(LazyReadonlyChild)))
+
+    def run_test(self, model_type, obj, lazy):
+        ec = apilib.ErrorContext()
+        m = model_type.from_json(obj, ec, apilib.ValidationContext(), lazy=lazy)
+        return m, [(e.path, e.code) for e in ec.all_errors()]
+
+    def test_same_errors_as_eager_decoding(self):
+        objs = [
+            {'fchild': {}},
+            {'fchild': {'fchild': {}}},
+            {'fchild': {'fchild': {'fstring': 3}}},
+            {'lchild': [{'fstring': 'a'}, {'fstring': 'a'}]},
+            {'lchild': [{}, {'fstring': 'a'}]},
+            {'dchild': {'foo': {'fstring': 'evil'}, 'bar': {'unknown': 1}}},
+        ]
+        for obj in objs:
+            m, errors = self.run_test(self.Parent, obj, lazy=True)
+            self.assertIsNone(m)
+            self.assertTrue(errors)
+            self.assertEqual(self.run_test(self.Parent, obj, lazy=False)[1], errors)
+
+    def test_validators_applied_on_access(self):
+        m, errors = self.run_test(self.ReadonlyParent, {'lchild': [{'fstring': 'foo', 'fevil': 'good'}]}, lazy=True)
+        self.assertEqual([], errors)
+        self.assertTrue(m._has_lazy_values)
+        self.assertIsNone(m.lchild[0].fstring)
+        self.assertEqual('good', m.lchild[0].fevil)
+
+        m, errors = self.run_test(self.ReadonlyParent, {'lchild': [{'fevil': 'evil'}]}, lazy=True)
+        self.assertIsNone(m)
+        self.assertEqual([('lchild[0].fevil', 'EVIL_VALUE')], errors)
+
+class ParentRecordingValidator(apilib.Validator):
+    def __init__(self):
+        self.parents = []
+
+    def validate(self, value, error_context, context):
+        self.parents.append(context.parent)
+        return value
+
+class ParentContextModel(apilib.Model):
+    fdate = apilib.Field(apilib.Date())
+    fchild = apilib.Field(apilib.ModelType(SimpleChild))
+    fstring = apilib.Field(apilib.String(), validators=[ParentRecordingValidator()])
+
+class ParentContextParent(apilib.Model):
+    fchild = apilib.Field(apilib.ModelType(ParentContextModel))
+
+class ParentContextGrandparent(apilib.Model):
+    fchildren = apilib.Field(apilib.ListType(ParentContextParent))
+
+class ValidateParentContextTest(unittest.TestCase):
+    def test_parent_is_json_as_in_from_json(self):
+        validator = ParentContextModel.fstring.get_validators()[0]
+        obj = {'fdate': '2016-02-03', 'fchild': {'fstring': 'a'}, 'fstring': 'b'}
+        m = ParentContextModel.from_json(obj, apilib.ErrorContext(), apilib.ValidationContext())
+        m.validate(apilib.ErrorContext(), apilib.ValidationContext())
+        self.assertEqual([obj, obj], validator.parents)
+
+    def test_models_encoded_once(self):
+        validator = ParentContextModel.fstring.get_validators()[0]
+        del validator.parents[:]
+        self.addCleanup(validator.parents.__delitem__, slice(None))
+        m = ParentContextGrandparent(fchildren=[
+            ParentContextParent(fchild=ParentContextModel(fstring='a', fchild=SimpleChild(fstring='b')))])
+        with mock.patch.object(apilib.Model, 'to_dict', autospec=True, side_effect=apilib.Model.to_dict) as to_dict:
+            m.validate(apilib.ErrorContext(), apilib.ValidationContext())
+        self.assertEqual(4, to_dict.call_count)
+        self.assertEqual([{'fstring': 'a', 'fchild': {'fstring': 'b'}}], validator.parents)
+
 if __name__ == '__main__':
     unittest.main()
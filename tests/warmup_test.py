@@ -0,0 +1,90 @@
+from __future__ import absolute_import
+
+import gc
+import unittest
+
+import apilib
+from apilib import binary
+from apilib import meta
+from apilib import warmup
+
+class Address(apilib.Model):
+    street = apilib.Field(apilib.String(), required=True)
+    moved_in = apilib.Field(apilib.DateTime())
+
+class Person(apilib.Model):
+    name = apilib.Field(apilib.String())
+    addresses = apilib.Field(apilib.ListType(Address))
+
+class GetPersonRequest(apilib.Request):
+    name = apilib.Field(apilib.String(), required=True)
+
+class GetPersonResponse(apilib.Response):
+    person = apilib.Field(apilib.ModelType(Person))
+
+class PersonService(apilib.Service):
+    methods = apilib.servicemethods(
+        apilib.Meth('get_person', GetPersonRequest, GetPersonResponse))
+
+class PersonServiceImpl(PersonService, apilib.ServiceImplementation):
+    def get_person(self, request):
+        return GetPersonResponse(person=Person(name=request.name))
+
+class RecordingValidator(apilib.Validator):
+    calls = []
+
+    def validate(self, value, error_context, context):
+        self.calls.append(value)
+        return value
+
+class ValidatedRequest(apilib.Request):
+    name = apilib.Field(apilib.String(), validators=[RecordingValidator()])
+
+class ValidatedService(apilib.Service):
+    methods = apilib.servicemethods(
+        apilib.Meth('get', ValidatedRequest, GetPersonResponse))
+
+class ValidatedServiceImpl(ValidatedService, apilib.ServiceImplementation):
+    def get(self, request):
+        raise AssertionError('Handlers must not run during the warm-up')
+
+class WarmUpTest(unittest.TestCase):
+    def test_warm_up(self):
+        report = warmup.warm_up([PersonServiceImpl()])
+        for model_class in [GetPersonRequest, GetPersonResponse, Person, Address, apilib.ApiError]:
+            for attr in ['_field_to_attr_name', '_numbered_fields', '_has_raw_json', '_state_layout']:
+                self.assertIn(attr, model_class.__dict__, '%s.%s' % (model_class.__name__, attr))
+            self.assertIsNotNone(binary.get_model_codec(model_class)._fields)
+        self.assertEqual('PersonService', PersonServiceImpl.__dict__['_name'])
+        self.assertIn(PersonService.methods['get_person'], meta._method_fingerprints)
+
+        self.assertEqual(5, report.num_models)
+        self.assertEqual(1, report.num_methods)
+        self.assertEqual(['models', 'services', 'fingerprints', 'codecs', 'exercise'],
+            [name for name, _ in report.steps])
+        self.assertIn('Warmed up 5 models of 1 methods', report.format_report())
+
+    def test_service_definitions_and_stubs(self):
+        class RemotePersonService(PersonService, apilib.RemoteServiceStub):
+            pass
+        report = warmup.warm_up([PersonService, RemotePersonService], exercise=False)
+        self.assertEqual(['models', 'services', 'fingerprints', 'codecs'], [name for name, _ in report.steps])
+        self.assertNotIn('_name', PersonService.__dict__)
+        self.assertEqual('PersonService', RemotePersonService.__dict__['_name'])
+
+    def test_exercise_runs_no_validators_or_handlers(self):
+        del RecordingValidator.calls[:]
+        report = warmup.warm_up([ValidatedServiceImpl])
+        self.assertEqual('exercise', report.steps[-1][0])
+        self.assertEqual([], RecordingValidator.calls)
+        self.assertIsNotNone(binary.get_model_codec(ValidatedRequest)._fields)
+
+    @unittest.skipUnless(hasattr(gc, 'freeze'), 'gc.freeze() requires Python 3.7')
+    def test_freeze(self):
+        self.addCleanup(gc.unfreeze)
+        report = warmup.warm_up([PersonServiceImpl], freeze=True)
+        self.assertEqual('freeze', report.steps[-1][0])
+        self.assertGreater(gc.get_freeze_count(), 0)
+
+if __name__ == '__main__':
+    unittest.main()